@@ -1,20 +1,90 @@
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
 from django.contrib.auth.models import Permission
-from .models import ExpiringLink, Image
+from django.core.cache import cache
+from django.utils import timezone
+from .links import EXPIRED_LINK
+from .models import ExpiringLink, Image, ImageBlob
+from .signed_links import revoke_link
 
 admin.site.register(Permission)
 
 
 @admin.register(Image)
 class ImageAdmin(admin.ModelAdmin):
-    list_display = ("user", "original_file", "uploaded_at")
-    list_filter = ("user", "uploaded_at")
+    list_display = ("user", "original_file", "uploaded_at", "format", "size")
+    list_filter = ("user", "uploaded_at", "format")
     search_fields = ("user__username",)
 
 
+@admin.register(ImageBlob)
+class ImageBlobAdmin(admin.ModelAdmin):
+    readonly_fields = ("content_hash", "name", "size", "ref_count")
+    list_display = ("content_hash", "name", "size", "ref_count")
+    search_fields = ("content_hash", "name")
+
+
+class ExpiredFilter(admin.SimpleListFilter):
+    """Filters links by whether they have expired, in the database."""
+
+    title = "expired"
+    parameter_name = "expired"
+
+    def lookups(self, request, model_admin):
+        return (("yes", "Yes"), ("no", "No"))
+
+    def queryset(self, request, queryset):
+        if self.value() == "yes":
+            return queryset.expired()
+        if self.value() == "no":
+            return queryset.active()
+        return queryset
+
+
 @admin.register(ExpiringLink)
 class ExpiringLinkAdmin(admin.ModelAdmin):
-    readonly_fields = ("image", "created_at", "expires_in", "is_expired")
-    list_display = ("alias", "image", "created_at", "expires_in", "is_expired")
-    list_filter = ("created_at",)
+    readonly_fields = ("image", "created_at", "expires_in", "expires_at", "is_expired")
+    list_display = (
+        "alias",
+        "image",
+        "created_at",
+        "expires_at",
+        "delivery",
+        "is_expired",
+    )
+    list_filter = (ExpiredFilter, "created_at", "delivery")
     search_fields = ("image__user__username",)
+    actions = ("revoke",)
+
+    @admin.display(boolean=True, ordering="expires_at")
+    def is_expired(self, obj):
+        return obj.is_expired
+
+    @admin.action(description="Revoke selected links")
+    def revoke(self, request, queryset):
+        """Revokes links, expiring them in the database before putting signed links on the revocation list and
+        expiring cached aliases.
+
+        The expiry is persisted first, so that alias links stay revoked when their cache entries are evicted or
+        invalidated. Signed links are validated without the database, and are only rejected if
+        `EXPIRING_LINK_REVOCATION_CHECK` is enabled.
+        """
+        links = list(queryset.active())
+        queryset.filter(pk__in=[link.pk for link in links]).update(
+            expires_at=timezone.now()
+        )
+        for link in links:
+            revoke_link(link.alias, link.remaining_seconds)
+            cache.set(
+                str(link.alias),
+                EXPIRED_LINK,
+                timeout=max(link.remaining_seconds, 1),
+            )
+
+        self.message_user(request, f"Revoked {len(links)} links.", messages.SUCCESS)
+        if links and not settings.EXPIRING_LINK_REVOCATION_CHECK:
+            self.message_user(
+                request,
+                "Signed links among them stay valid until they expire, as EXPIRING_LINK_REVOCATION_CHECK is disabled.",
+                messages.WARNING,
+            )
@@ -0,0 +1,95 @@
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.cache import get_conditional_response
+from rest_framework import status
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from lib.views import AsyncAPIView
+from .links import acache_link_record, aget_link_record, build_link_record
+from .models import ExpiringLink, Image
+from .signed_links import audit_link, sign_link
+from .views import ExpiringLinkRedirectView, GenerateExpiringLinkView, UserImagesView
+
+
+class AsyncUserImagesView(AsyncAPIView, UserImagesView):
+    """Async variant of `UserImagesView`.
+
+    The page is fetched with the async ORM interface. Serializing it, which resolves the user's permissions and the
+    thumbnail URLs through the cache, runs in a worker thread.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        etag = await sync_to_async(self.get_etag)(request)
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            return self.set_etag(response, etag)
+
+        page = await self.paginator.apaginate_queryset(
+            self.get_queryset(), request, view=self
+        )
+        data = await sync_to_async(lambda: self.get_serializer(page, many=True).data)()
+        return self.set_etag(self.get_paginated_response(data), etag)
+
+    def get_streaming_content(self, response):
+        """Returns an async iterator over the rendered chunks, so the ASGI handler streams them as they come."""
+        chunks = super().get_streaming_content(response)
+
+        async def aiter_chunks():
+            for chunk in chunks:
+                yield chunk
+
+        return aiter_chunks()
+
+
+class AsyncGenerateExpiringLinkView(AsyncAPIView, GenerateExpiringLinkView):
+    """Async variant of `GenerateExpiringLinkView`, using the async ORM and cache interfaces."""
+
+    async def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        expires_in = serializer.validated_data["expires_in"]
+
+        try:
+            image = await Image.objects.aget(id=self.kwargs.get("image_id"))
+        except Image.DoesNotExist:
+            raise NotFound()
+
+        if settings.EXPIRING_LINK_FORMAT == "signed":
+            token, alias = sign_link(image.id, int(time.time()) + expires_in)
+            await sync_to_async(audit_link)(alias, image.id, expires_in)
+            url = reverse(
+                "images:signed-image-link", kwargs={"token": token}, request=request
+            )
+        else:
+            link = await ExpiringLink.objects.acreate(
+                image=image, **serializer.validated_data
+            )
+            record = await sync_to_async(build_link_record, thread_sensitive=False)(
+                link, image
+            )
+            await acache_link_record(link.alias, record)
+            url = reverse(
+                "images:image-link", kwargs={"alias": link.alias}, request=request
+            )
+        return Response({"url": url}, status=status.HTTP_201_CREATED)
+
+
+class AsyncExpiringLinkRedirectView(AsyncAPIView, ExpiringLinkRedirectView):
+    """Async variant of `ExpiringLinkRedirectView`.
+
+    Links are resolved with the async cache and ORM interfaces, and proxied files are streamed from the storage in
+    worker threads, so a single process can serve many concurrent downloads.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        record = await aget_link_record(self.kwargs.get("alias"))
+        if record is None:
+            return self.expired()
+
+        if self.get_delivery(record) == ExpiringLink.Delivery.REDIRECT:
+            return self.redirect(record)
+        return await self.aserve(
+            request, record.name, record.content_type, metadata=record._asdict()
+        )
@@ -1,9 +1,45 @@
 import boto3
+import time
 from django.conf import settings
+from django.core.cache import cache
 from botocore.config import Config
+from lib.instrumentation import timed
+from .metrics import THUMBNAIL_URLS
 
 s3_client = boto3.client("s3", config=Config(signature_version="s3v4"))
 
+THUMBNAIL_URL_CACHE_KEY = "thumbnail-url:{period}:{resource}@{height}"
+
+# URLs signed by this process in the current reuse period, keyed by (resource, height)
+_signed_thumbnail_urls = {"period": None, "urls": {}}
+SIGNED_THUMBNAIL_URLS_LIMIT = 10000
+
+
+def get_thumbnail_url_period(now=None):
+    """Return the current reuse period of signed thumbnail URLs and its boundaries.
+
+    A signed URL is handed out until `THUMBNAIL_URL_REUSE_FRACTION` of `THUMBNAIL_URL_EXPIRES_IN` has passed. Time is
+    divided into periods of that length and all URLs signed within a period expire at the same moment, so that every
+    URL handed out still has at least the remaining fraction of its lifetime left.
+
+    Args:
+        now (float, optional): current UNIX timestamp
+
+    Returns:
+        tuple: period number, UNIX timestamp of the period end and UNIX timestamp at which URLs of the period expire
+    """
+    now = time.time() if now is None else now
+    reuse_for = (
+        settings.THUMBNAIL_URL_EXPIRES_IN * settings.THUMBNAIL_URL_REUSE_FRACTION
+    )
+    period = int(now // reuse_for)
+    period_end = (period + 1) * reuse_for
+    return (
+        period,
+        period_end,
+        period_end + settings.THUMBNAIL_URL_EXPIRES_IN - reuse_for,
+    )
+
 
 def generate_thumbnail_url(resource, thumbnail_height):
     """Invoke AWS Lambda for thumbnail generation of an image stored in S3 Bucket and retrieve resource URL.
@@ -15,6 +51,70 @@ def generate_thumbnail_url(resource, thumbnail_height):
     Returns:
         str: URL for the generated thumbnail
     """
+    return generate_thumbnail_urls([(resource, thumbnail_height)])[
+        (resource, thumbnail_height)
+    ]
+
+
+@timed("sign")
+def generate_thumbnail_urls(resources):
+    """Retrieve URLs for many thumbnails at once, signing only those not signed in the current reuse period.
+
+    Signed URLs are looked up in process memory first, then in the configured cache with a single batch call, and the
+    remaining ones are signed and stored in cache with a single batch call as well. This keeps URLs byte-identical
+    across requests and processes for the whole reuse period, so they can be cached by browsers and CDNs.
+
+    Args:
+        resources (iterable): pairs of path for a resource in S3 Bucket and height of the thumbnail
+
+    Returns:
+        dict: URLs for the thumbnails keyed by `(resource, thumbnail_height)` pairs
+    """
+    now = time.time()
+    period, period_end, expires_at = get_thumbnail_url_period(now)
+    if (
+        _signed_thumbnail_urls["period"] != period
+        or len(_signed_thumbnail_urls["urls"]) > SIGNED_THUMBNAIL_URLS_LIMIT
+    ):
+        _signed_thumbnail_urls.update(period=period, urls={})
+    signed_urls = _signed_thumbnail_urls["urls"]
+
+    urls = {}
+    missing = {}
+    for resource, thumbnail_height in resources:
+        pair = (resource, thumbnail_height)
+        if pair in signed_urls:
+            urls[pair] = signed_urls[pair]
+        else:
+            cache_key = THUMBNAIL_URL_CACHE_KEY.format(
+                period=period, resource=resource, height=thumbnail_height
+            )
+            missing[cache_key] = pair
+
+    if urls:
+        THUMBNAIL_URLS.inc(len(urls), source="memory")
+    if missing:
+        cached_urls = cache.get_many(missing.keys())
+        signed = {}
+        for cache_key, (resource, thumbnail_height) in missing.items():
+            url = cached_urls.get(cache_key)
+            if url is None:
+                url = _sign_thumbnail_url(
+                    resource, thumbnail_height, int(expires_at - now)
+                )
+                signed[cache_key] = url
+            urls[(resource, thumbnail_height)] = url
+            signed_urls[(resource, thumbnail_height)] = url
+
+        THUMBNAIL_URLS.inc(len(missing) - len(signed), source="cache")
+        if signed:
+            THUMBNAIL_URLS.inc(len(signed), source="signed")
+            cache.set_many(signed, timeout=max(int(period_end - now), 1))
+
+    return urls
+
+
+def _sign_thumbnail_url(resource, thumbnail_height, expires_in):
     resource_key = f"{resource}@{thumbnail_height}"
     params = {
         "Bucket": settings.AWS_THUMBNAIL_ACCESS_POINT_ARN,
@@ -24,4 +124,5 @@ def generate_thumbnail_url(resource, thumbnail_height):
     return s3_client.generate_presigned_url(
         ClientMethod="get_object",
         Params=params,
+        ExpiresIn=expires_in,
     )
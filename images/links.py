@@ -0,0 +1,270 @@
+from asgiref.sync import sync_to_async
+import time
+from collections import namedtuple
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import connections
+from django.utils import timezone
+from .metrics import LINK_CACHE_LOOKUPS
+from .models import ExpiringLink, Image
+
+# Cache value of links known to be expired or not to exist
+EXPIRED_LINK = "expired"
+
+IMAGE_FILE_CACHE_KEY = "image-file:{image_id}"
+
+LinkRecord = namedtuple(
+    "LinkRecord",
+    ["name", "content_type", "size", "etag", "last_modified", "expires_at", "delivery"],
+)
+LinkRecord.__doc__ = """Everything needed to serve an expiring link, cached under the alias of the link.
+
+    Attributes:
+        name (str): name of the original image file in the default storage
+        content_type (str): media type of the original image file
+        size (int): size of the original image file in bytes
+        etag (str): strong ETag of the original image file
+        last_modified (int): UNIX timestamp of the last modification of the original image file
+        expires_at (float): UNIX timestamp at which the link expires
+        delivery (str): delivery mode of the link, empty for the default one
+    """
+
+
+def get_image_file(image):
+    """Retrieve what is needed to serve the original file of an image.
+
+    Images with a stored size are served from their fields alone, with the upload time as the last modification of
+    the file. The content hash is its strong ETag; images uploaded directly or in chunks have none, and since original
+    files never change after the upload, their ETag is derived from the image id and upload time instead. Only the
+    metadata of images uploaded before sizes were stored is read from the storage.
+
+    Args:
+        image (Image): image
+
+    Returns:
+        dict: `name`, `content_type`, `size`, `etag` and `last_modified` of the original image file
+    """
+    if image.size is not None:
+        uploaded_at = image.uploaded_at.timestamp()
+        tag = image.content_hash or f"{image.id.hex}-{int(uploaded_at * 1e6):x}"
+        metadata = {
+            "size": image.size,
+            "etag": f'"{tag}"',
+            "last_modified": int(uploaded_at),
+        }
+    else:
+        metadata = default_storage.get_object_metadata(image.original_file.name)
+    return {
+        "name": image.original_file.name,
+        "content_type": image.media_type,
+        **metadata,
+    }
+
+
+def get_cached_image_file(image_id):
+    """Retrieve what is needed to serve the original file of an image by the image id, caching the result.
+
+    Args:
+        image_id (UUID): id of the image
+
+    Returns:
+        dict: see `get_image_file`, or None if the image does not exist
+    """
+    key = IMAGE_FILE_CACHE_KEY.format(image_id=image_id)
+    image_file = cache.get(key)
+    if image_file is None:
+        image = Image.objects.filter(id=image_id).first()
+        if image is None:
+            return None
+        image_file = get_image_file(image)
+        cache.set(key, image_file, timeout=settings.IMAGE_FILE_CACHE_TIMEOUT)
+    return image_file
+
+
+def get_cached_image_files(images):
+    """Retrieve what is needed to serve the original files of several images with a single cache round trip.
+
+    Files missing in cache have their metadata read from the storage and are cached in one batch.
+
+    Args:
+        images (list): images
+
+    Returns:
+        dict: image id to the dict described in `get_image_file`
+    """
+    keys = {IMAGE_FILE_CACHE_KEY.format(image_id=image.id): image for image in images}
+    cached = cache.get_many(keys)
+    missing = {
+        key: get_image_file(image) for key, image in keys.items() if key not in cached
+    }
+    if missing:
+        cache.set_many(missing, timeout=settings.IMAGE_FILE_CACHE_TIMEOUT)
+    return {image.id: {**cached, **missing}[key] for key, image in keys.items()}
+
+
+def build_link_record(link, image):
+    """Build the cache record of an expiring link, reading the file metadata from the storage.
+
+    Args:
+        link (ExpiringLink): expiring link
+        image (Image): image the link points to
+
+    Returns:
+        LinkRecord: record of the link
+    """
+    image_file = get_image_file(image)
+    return LinkRecord(
+        expires_at=link.expires_at.timestamp(),
+        delivery=link.delivery,
+        **image_file,
+    )
+
+
+def cache_link_record(alias, record):
+    """Store the record of an expiring link in cache until the link expires."""
+    timeout = int(record.expires_at - time.time())
+    if timeout > 0:
+        cache.set(str(alias), tuple(record), timeout=timeout)
+
+
+def cache_link_records(records):
+    """Store the records of several expiring links in cache in one batch.
+
+    All links are expected to expire at the same time, the records are stored with a single `set_many` call, which
+    the Redis cache backend sends as one pipeline.
+
+    Args:
+        records (dict): alias of the link to its record
+    """
+    if not records:
+        return
+    timeout = int(min(record.expires_at for record in records.values()) - time.time())
+    if timeout > 0:
+        cache.set_many(
+            {str(alias): tuple(record) for alias, record in records.items()},
+            timeout=timeout,
+        )
+
+
+def get_link_record(alias):
+    """Resolve an expiring link into its record.
+
+    A cached record resolves the link with a single cache lookup. Links missing in cache, e.g. evicted ones or those
+    cached by older versions, are looked up in the database and cached again. Expired and unknown links are cached
+    for `EXPIRING_LINK_NEGATIVE_CACHE_TIMEOUT` seconds, so repeated requests for them do not reach the database.
+
+    Args:
+        alias (str): alias of the link
+
+    Returns:
+        LinkRecord: record of the link, or None if the link has expired or does not exist
+    """
+    alias = str(alias)
+    value = cache.get(alias)
+    LINK_CACHE_LOOKUPS.inc(result="miss" if value is None else "hit")
+    if value == EXPIRED_LINK:
+        return None
+    if isinstance(value, tuple):
+        record = LinkRecord._make(value)
+    else:
+        link = ExpiringLink.objects.select_related("image").filter(alias=alias).first()
+        if link is None or link.remaining_seconds <= 0:
+            cache.set(
+                alias,
+                EXPIRED_LINK,
+                timeout=settings.EXPIRING_LINK_NEGATIVE_CACHE_TIMEOUT,
+            )
+            return None
+        record = build_link_record(link, link.image)
+        cache_link_record(alias, record)
+
+    if record.expires_at <= time.time():
+        return None
+    return record
+
+
+async def acache_link_record(alias, record):
+    """Async variant of `cache_link_record`."""
+    timeout = int(record.expires_at - time.time())
+    if timeout > 0:
+        await cache.aset(str(alias), tuple(record), timeout=timeout)
+
+
+async def aget_link_record(alias):
+    """Async variant of `get_link_record`, using the async cache and ORM interfaces.
+
+    Reading the file metadata of a link missing in cache is a blocking storage request, it is made in a worker thread.
+
+    Args:
+        alias (str): alias of the link
+
+    Returns:
+        LinkRecord: record of the link, or None if the link has expired or does not exist
+    """
+    alias = str(alias)
+    value = await cache.aget(alias)
+    LINK_CACHE_LOOKUPS.inc(result="miss" if value is None else "hit")
+    if value == EXPIRED_LINK:
+        return None
+    if isinstance(value, tuple):
+        record = LinkRecord._make(value)
+    else:
+        link = (
+            await ExpiringLink.objects.select_related("image")
+            .filter(alias=alias)
+            .afirst()
+        )
+        if link is None or link.remaining_seconds <= 0:
+            await cache.aset(
+                alias,
+                EXPIRED_LINK,
+                timeout=settings.EXPIRING_LINK_NEGATIVE_CACHE_TIMEOUT,
+            )
+            return None
+        record = await sync_to_async(build_link_record, thread_sensitive=False)(
+            link, link.image
+        )
+        await acache_link_record(alias, record)
+
+    if record.expires_at <= time.time():
+        return None
+    return record
+
+
+def purge_expired_links(before=None, batch_size=1000, pause=0):
+    """Delete expired links in batches of at most `batch_size` rows.
+
+    Every batch is deleted by primary key in its own short transaction, so the purge never holds locks on many rows at
+    once and replicas can keep up with it. Batches are deleted with a raw `DELETE` rather than `QuerySet.delete()`,
+    which would load every row and send `post_delete` signals for the links: records of expired links have already
+    expired in cache, there is nothing to invalidate, and no other model references links that would need cascading.
+
+    Args:
+        before (datetime, optional): time the links have expired by, now if not given
+        batch_size (int, optional): maximum number of links deleted per batch
+        pause (float, optional): seconds to sleep between batches
+
+    Returns:
+        int: number of deleted links
+    """
+    links = ExpiringLink.objects.expired(before or timezone.now())
+    connection = connections[links.db]
+    table = connection.ops.quote_name(ExpiringLink._meta.db_table)
+    column = connection.ops.quote_name(ExpiringLink._meta.pk.column)
+    count = 0
+    while True:
+        pks = list(links.values_list("pk", flat=True)[:batch_size])
+        if not pks:
+            return count
+        placeholders = ", ".join(["%s"] * len(pks))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {table} WHERE {column} IN ({placeholders})",
+                [ExpiringLink._meta.pk.get_db_prep_value(pk, connection) for pk in pks],
+            )
+            count += cursor.rowcount
+        if len(pks) < batch_size:
+            return count
+        if pause:
+            time.sleep(pause)
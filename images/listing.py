@@ -0,0 +1,52 @@
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+from .models import Image
+
+IMAGE_LIST_VERSION_CACHE_KEY = "image-list-version:{user_id}"
+
+
+def get_image_list_version(user_id):
+    """Return the version stamp of a user's images, which changes whenever an image of the user is added, changed or
+    deleted.
+
+    The stamp is kept in cache. A missing one is derived from the number of images and the latest upload time with a
+    single aggregate query over the `image_user_uploaded_idx` index, and only stored if no change has bumped it in the
+    meantime, so a stamp computed from a stale read never replaces a newer one.
+
+    Args:
+        user_id (int): id of the user
+
+    Returns:
+        str: version stamp
+    """
+    key = IMAGE_LIST_VERSION_CACHE_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        stats = Image.objects.filter(user_id=user_id).aggregate(
+            count=Count("id"), latest=Max("uploaded_at")
+        )
+        latest = stats["latest"].timestamp() if stats["latest"] else 0
+        version = f"{stats['count']}-{latest}"
+        if not cache.add(
+            key, version, timeout=settings.IMAGE_LIST_VERSION_CACHE_TIMEOUT
+        ):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_image_list_versions(*user_ids):
+    """Give the images of the given users new version stamps once the current transaction commits.
+
+    Bumping on commit keeps requests that still read the old images from being answered under the new stamp.
+    """
+    version = uuid.uuid4().hex
+    keys = {
+        IMAGE_LIST_VERSION_CACHE_KEY.format(user_id=user_id): version
+        for user_id in user_ids
+    }
+    transaction.on_commit(
+        lambda: cache.set_many(keys, timeout=settings.IMAGE_LIST_VERSION_CACHE_TIMEOUT)
+    )
@@ -0,0 +1,93 @@
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from lib.uploadhandler import hash_file
+from images.links import IMAGE_FILE_CACHE_KEY
+from images.listing import bump_image_list_versions
+from images.models import ExpiringLink, Image, blob_path
+from images.uploads import acquire_blobs, delete_stored_file, register_blob
+
+
+class Command(BaseCommand):
+    help = (
+        "Hashes original files of images uploaded before content deduplication and points them at the blob of their "
+        "content, storing a copy of the file as the blob if there is none yet. The own copy of each image is removed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of images loaded per query.",
+        )
+
+    def handle(self, *args, **options):
+        hashed = deduplicated = missing = 0
+        last_pk = None
+        while True:
+            queryset = Image.objects.filter(content_hash="").order_by("pk")
+            if last_pk is not None:
+                queryset = queryset.filter(pk__gt=last_pk)
+            batch = list(queryset[: options["batch_size"]])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            for image in batch:
+                try:
+                    with default_storage.open(image.original_file.name) as file:
+                        content_hash = hash_file(file)
+                        size = file.size
+                except OSError:
+                    missing += 1
+                    self.stderr.write(f"Missing file of image {image.pk}")
+                    continue
+
+                if self.backfill(image, content_hash, size):
+                    deduplicated += 1
+                hashed += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Hashed {hashed} images, {deduplicated} deduplicated, {missing} missing files"
+            )
+        )
+
+    @transaction.atomic
+    def backfill(self, image, content_hash, size):
+        """Points an image at the blob of its content, storing a copy of its file as the blob if there is none yet.
+
+        Blobs are stored under content-addressed names (see `blob_path`), so the file of the image is removed either
+        way.
+
+        Returns:
+            bool: whether the image has been pointed at a blob stored before
+        """
+        name = image.original_file.name
+        blob_name = acquire_blobs({content_hash: 1}).get(content_hash)
+        deduplicated = blob_name is not None
+        if blob_name is None:
+            with default_storage.open(name) as file:
+                blob_name = register_blob(
+                    content_hash,
+                    default_storage.save(blob_path(content_hash, name), file),
+                    size,
+                )
+        delete_stored_file.delay(name)
+
+        Image.objects.filter(pk=image.pk).update(
+            original_file=blob_name, content_hash=content_hash
+        )
+
+        # listed URLs and cached records of the image's links point at the removed file
+        bump_image_list_versions(image.user_id)
+        keys = [IMAGE_FILE_CACHE_KEY.format(image_id=image.pk)] + [
+            str(alias)
+            for alias in ExpiringLink.objects.filter(image=image).values_list(
+                "alias", flat=True
+            )
+        ]
+        transaction.on_commit(lambda: cache.delete_many(keys))
+        return deduplicated
@@ -0,0 +1,74 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from images.listing import bump_image_list_versions
+from images.models import Image
+from images.validators import IMAGE_PROBE_MAX_BYTES, probe_image
+
+FILE_METADATA_FIELDS = ("format", "width", "height", "size", "orientation")
+
+
+class Command(BaseCommand):
+    help = (
+        "Reads format, dimensions, orientation and size of original files of images uploaded before they were stored "
+        "on the image. Only the header of every file is read from the storage."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of images loaded and updated per query.",
+        )
+
+    def handle(self, *args, **options):
+        updated = unsupported = missing = 0
+        last_pk = None
+        while True:
+            queryset = (
+                Image.objects.filter(size__isnull=True)
+                .order_by("pk")
+                .only("pk", "user", "original_file")
+            )
+            if last_pk is not None:
+                queryset = queryset.filter(pk__gt=last_pk)
+            batch = list(queryset[: options["batch_size"]])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            images = []
+            for image in batch:
+                name = image.original_file.name
+                try:
+                    size = default_storage.get_object_metadata(name)["size"]
+                    header = default_storage.open_range(
+                        name, 0, IMAGE_PROBE_MAX_BYTES - 1
+                    )
+                    try:
+                        image_info = probe_image(header)
+                    finally:
+                        header.close()
+                except OSError:
+                    missing += 1
+                    self.stderr.write(f"Missing file of image {image.pk}")
+                    continue
+
+                if image_info is None:
+                    # the size is stored anyway, so the image is not probed again
+                    unsupported += 1
+                    self.stderr.write(f"Unsupported file of image {image.pk}")
+                    image.size = size
+                else:
+                    image.set_file_metadata(image_info, size)
+                images.append(image)
+
+            Image.objects.bulk_update(images, FILE_METADATA_FIELDS)
+            bump_image_list_versions(*{image.user_id for image in images})
+            updated += len(images)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Updated {updated} images, {unsupported} unsupported, {missing} missing files"
+            )
+        )
@@ -0,0 +1,312 @@
+import json
+import shutil
+import subprocess
+import tempfile
+import uuid
+from contextlib import contextmanager
+from io import BytesIO
+from pathlib import Path
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image as PILImage
+from rest_framework.test import APIClient
+from lib.benchmark import PERCENTILES, compare, measure
+from images.models import ExpiringLink, Image
+
+# width and height of the images uploaded by the upload benchmarks
+UPLOAD_SIZES = {"small": (64, 64), "large": (1920, 1080)}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the images API against sqlite, the local file system storage and the local memory cache. "
+        "Reports latency percentiles, database queries and memory allocated per request, and flags regressions "
+        "against a saved baseline. Latencies include the overhead of the test client."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "benchmarks",
+            nargs="*",
+            help="Names or name prefixes of the benchmarks to run (all by default), e.g. list or upload-png.",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=30,
+            help="Number of measured requests per benchmark.",
+        )
+        parser.add_argument(
+            "--list-sizes",
+            default="10,1000,100000",
+            help="Comma-separated numbers of images owned by the user in the list benchmarks.",
+        )
+        parser.add_argument(
+            "--baseline",
+            default=".benchmarks/baseline.json",
+            help="Path of the baseline the results are compared with.",
+        )
+        parser.add_argument(
+            "--save-baseline",
+            action="store_true",
+            help="Save the results as the new baseline.",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.2,
+            help="Tolerated relative growth of median latency and allocations over the baseline.",
+        )
+        parser.add_argument(
+            "--fail-on-regression",
+            action="store_true",
+            help="Exit with an error when a regression is found.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            list_sizes = [int(size) for size in options["list_sizes"].split(",")]
+        except ValueError:
+            raise CommandError("--list-sizes must be a list of integers")
+
+        results = {}
+        with self.environment():
+            for name, func in self.get_benchmarks(list_sizes, options["benchmarks"]):
+                self.stdout.write(f"Running {name}...")
+                results[name] = measure(func, options["iterations"])
+
+        self.report(results)
+
+        baseline_path = Path(options["baseline"])
+        regressions = []
+        if baseline_path.exists():
+            baseline = json.loads(baseline_path.read_text())
+            regressions = compare(baseline["results"], results, options["threshold"])
+            self.stdout.write(
+                f"\nCompared with baseline of commit {baseline.get('commit') or 'unknown'}:"
+            )
+            for regression in regressions:
+                self.stdout.write(self.style.WARNING(f"  {regression}"))
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS("  no regressions"))
+
+        if options["save_baseline"]:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline = {
+                "commit": get_commit(),
+                "created_at": timezone.now().isoformat(),
+                "results": results,
+            }
+            baseline_path.write_text(json.dumps(baseline, indent=2))
+            self.stdout.write(self.style.SUCCESS(f"Saved baseline to {baseline_path}"))
+
+        if regressions and options["fail_on_regression"]:
+            raise CommandError(f"{len(regressions)} regressions found")
+
+    @contextmanager
+    def environment(self):
+        """Sets up a fresh database, media directory and cache, torn down once the benchmarks are done."""
+        media_root = tempfile.mkdtemp(prefix="imagify-benchmark-")
+        setup_test_environment(debug=False)
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            with override_settings(MEDIA_ROOT=media_root):
+                cache.clear()
+                yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+
+    def get_benchmarks(self, list_sizes, names):
+        """Yields the benchmarks matching the given names, setting up the data each of them needs.
+
+        Returns:
+            Iterator[tuple]: `(name, func)` pairs, `func` sending a single request
+        """
+
+        def selected(name):
+            return not names or any(name.startswith(prefix) for prefix in names)
+
+        user = create_user("benchmark")
+        client = APIClient()
+        client.force_authenticate(user)
+        image = create_images(user, 1)[0]
+
+        for size in list_sizes:
+            name = f"list-{format_count(size)}"
+            if selected(name):
+                list_user = create_user(name)
+                create_images(list_user, size)
+                list_client = APIClient()
+                list_client.force_authenticate(list_user)
+                yield name, request(list_client, "get", reverse("images:images-list"))
+
+        for image_format in ("jpeg", "png"):
+            for size_name, size in UPLOAD_SIZES.items():
+                name = f"upload-{image_format}-{size_name}"
+                if selected(name):
+                    yield name, upload_request(client, image_format, size)
+
+        if selected("generate-link"):
+            yield "generate-link", request(
+                client,
+                "post",
+                reverse("images:generate-link", args=[image.id]),
+                data={"expires_in": 300},
+                format="json",
+                expected_status=201,
+            )
+
+        if selected("link-redirect"):
+            link = ExpiringLink.objects.create(image=image, expires_in=30000)
+            yield "link-redirect", request(
+                client, "get", reverse("images:image-link", args=[link.alias])
+            )
+
+    def report(self, results):
+        columns = [f"p{percentile}" for percentile in PERCENTILES] + ["mean"]
+        self.stdout.write(
+            f"\n{'benchmark':<22}"
+            + "".join(f"{column + ' ms':>10}" for column in columns)
+            + f"{'queries':>10}{'peak KiB':>11}"
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<22}"
+                + "".join(f"{result[column]:>10.2f}" for column in columns)
+                + f"{result['queries']:>10}{result['peak_kib']:>11.1f}"
+            )
+
+
+def create_user(username):
+    """Creates an Enterprise tier user, allowed to see all thumbnails and generate expiring links."""
+    user = get_user_model().objects.create_user(username=username)
+    Group.objects.get(name="EnterpriseTierUsers").user_set.add(user)
+    return user
+
+
+def create_images(user, count, batch_size=1000):
+    """Creates images of a user, all sharing one stored file.
+
+    Returns:
+        list: created images
+    """
+    width, height = UPLOAD_SIZES["small"]
+    content = image_bytes("jpeg", (width, height))
+    name = default_storage.save(
+        f"{user.id}/original/benchmark.jpg", ContentFile(content)
+    )
+    return Image.objects.bulk_create(
+        (
+            Image(
+                user=user,
+                original_file=name,
+                content_type="image/jpeg",
+                format="JPEG",
+                width=width,
+                height=height,
+                size=len(content),
+                orientation=1,
+            )
+            for _ in range(count)
+        ),
+        batch_size=batch_size,
+    )
+
+
+def image_bytes(image_format, size):
+    """Returns an encoded image of random noise, which compresses about as badly as a photo."""
+    image = PILImage.effect_noise(size, 64).convert("RGB")
+    buffer = BytesIO()
+    image.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def request(client, method, url, expected_status=200, data=None, **kwargs):
+    """Returns a function sending a request with the client and reading the whole response.
+
+    Args:
+        data (Callable[[], dict] | dict, optional): request data, or a function returning fresh data for every request
+
+    Raises:
+        CommandError: If the response status differs from the expected one.
+    """
+
+    def send():
+        response = getattr(client, method)(
+            url, data() if callable(data) else data, **kwargs
+        )
+        if response.status_code != expected_status:
+            raise CommandError(
+                f"{method.upper()} {url} responded with {response.status_code}, expected {expected_status}"
+            )
+        if response.streaming:
+            b"".join(response.streaming_content)
+            response.close()
+
+    return send
+
+
+def upload_request(client, image_format, size):
+    """Returns a function uploading an image of the given format and size.
+
+    Every upload gets distinct content, by bytes appended after the image data, so that it is stored rather than
+    deduplicated.
+    """
+    content = image_bytes(image_format, size)
+    extension = "jpg" if image_format == "jpeg" else image_format
+
+    def data():
+        file = SimpleUploadedFile(
+            f"benchmark.{extension}",
+            content + uuid.uuid4().bytes,
+            content_type=f"image/{image_format}",
+        )
+        return {"original_file": file}
+
+    return request(
+        client,
+        "post",
+        reverse("images:image-upload"),
+        data=data,
+        format="multipart",
+        expected_status=201,
+    )
+
+
+def format_count(count):
+    """Formats a number of images for benchmark names, e.g. 1000 as `1k`."""
+    if count >= 1000 and count % 1000 == 0:
+        return f"{count // 1000}k"
+    return str(count)
+
+
+def get_commit():
+    """Returns the hash of the checked out git commit, or None outside of a git checkout."""
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=settings.BASE_DIR,
+        )
+    except OSError:
+        return None
+    return result.stdout.strip() or None
@@ -0,0 +1,39 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from images.links import purge_expired_links
+
+
+class Command(BaseCommand):
+    help = "Deletes expired expiring links in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Maximum number of links deleted per batch.",
+        )
+        parser.add_argument(
+            "--keep-days",
+            type=int,
+            default=0,
+            help="Keep links that expired less than this many days ago.",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0,
+            help="Seconds to sleep between batches.",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+
+        count = purge_expired_links(
+            before=timezone.now() - timedelta(days=options["keep_days"]),
+            batch_size=options["batch_size"],
+            pause=options["pause"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Deleted {count} expired links"))
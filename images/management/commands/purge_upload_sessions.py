@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from images.models import UploadSession
+from images.uploads import purge_upload_sessions
+
+
+class Command(BaseCommand):
+    help = "Aborts expired upload sessions, discarding their chunks from the storage."
+
+    def handle(self, *args, **options):
+        count = purge_upload_sessions(
+            UploadSession.objects.filter(expires_at__lte=timezone.now())
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Aborted {count} expired upload sessions")
+        )
@@ -0,0 +1,18 @@
+from lib.metrics import Counter, Histogram
+
+# upload size buckets from 64 KiB to 256 MiB, in bytes
+UPLOAD_SIZE_BUCKETS = tuple(64 * 1024 * 4**exponent for exponent in range(7))
+
+LINK_CACHE_LOOKUPS = Counter(
+    "imagify_expiring_link_cache_total",
+    "Lookups of expiring link records in cache by result (hit or miss); cached expired links count as hits.",
+)
+THUMBNAIL_URLS = Counter(
+    "imagify_thumbnail_urls_total",
+    "Thumbnail URLs handed out by source: process memory, cache or newly signed.",
+)
+UPLOAD_SIZE = Histogram(
+    "imagify_upload_size_bytes",
+    "Size of uploaded images by upload method (form, direct or resumable).",
+    buckets=UPLOAD_SIZE_BUCKETS,
+)
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0002_auto_20230922_1008'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(fields=['user', 'uploaded_at', 'id'], name='image_user_uploaded_idx'),
+        ),
+    ]
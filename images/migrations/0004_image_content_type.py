@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0003_image_user_uploaded_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='content_type',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0004_image_content_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expiringlink',
+            name='delivery',
+            field=models.CharField(blank=True, choices=[('', 'Default'), ('proxy', 'Proxy the file'), ('redirect', 'Redirect to a presigned storage URL')], default='', max_length=10),
+        ),
+    ]
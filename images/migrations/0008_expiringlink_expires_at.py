@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:10
+
+from datetime import timedelta
+from django.db import migrations, models
+
+
+def set_expires_at(apps, schema_editor, batch_size=1000):
+    ExpiringLink = apps.get_model("images", "ExpiringLink")
+    db_alias = schema_editor.connection.alias
+    links = ExpiringLink.objects.using(db_alias).filter(expires_at__isnull=True)
+    while True:
+        batch = list(links.only("pk", "created_at", "expires_in")[:batch_size])
+        if not batch:
+            break
+        for link in batch:
+            link.expires_at = link.created_at + timedelta(seconds=link.expires_in)
+        ExpiringLink.objects.using(db_alias).bulk_update(batch, ["expires_at"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0007_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expiringlink',
+            name='expires_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(set_expires_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='expiringlink',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0008_expiringlink_expires_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='format',
+            field=models.CharField(blank=True, db_index=True, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='height',
+            field=models.PositiveIntegerField(db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='orientation',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='size',
+            field=models.PositiveBigIntegerField(db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='width',
+            field=models.PositiveIntegerField(db_index=True, null=True),
+        ),
+    ]
@@ -1,10 +1,13 @@
+import mimetypes
 import os
+from datetime import timedelta
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.urls import reverse
 from django.utils import timezone
 import uuid
+from .validators import IMAGE_CONTENT_TYPES
 
 
 def original_image_path(instance, filename):
@@ -15,6 +18,15 @@ def original_image_path(instance, filename):
     return os.path.join(f"{instance.user.id}/original/", filename)
 
 
+def blob_path(content_hash, filename):
+    """Generate the content-addressed file path of a blob, e.g. `blobs/<sha256>.jpg`.
+
+    Blobs are shared by every user uploading the same content, so their path does not reveal who uploaded it first.
+    """
+    extension = filename.split(".")[-1]
+    return os.path.join("blobs", f"{content_hash}.{extension}")
+
+
 class Image(models.Model):
     """Model representing an image uploaded by a user.
 
@@ -26,6 +38,16 @@ class Image(models.Model):
         user (ForeignKey): Reference to the user who uploaded the image.
         original_file (ImageField): The uploaded image file.
         uploaded_at (DateTimeField): The time at which the image was uploaded.
+        content_type (CharField): The media type of the image file, determined at upload time.
+        content_hash (CharField): SHA-256 hex digest of the image file, identifying the `ImageBlob` it shares.
+        format (CharField): The format of the image file, e.g. `JPEG`, read from its header at upload time.
+        width (PositiveIntegerField): The width of the stored pixels.
+        height (PositiveIntegerField): The height of the stored pixels.
+        size (PositiveBigIntegerField): The size of the image file in bytes.
+        orientation (PositiveSmallIntegerField): The EXIF orientation of the image, 1 for upright images.
+
+    The file metadata fields are empty for images uploaded before they were introduced and not backfilled yet, see the
+    `backfill_image_metadata` command.
     """
 
     class Meta:
@@ -34,20 +56,91 @@ class Image(models.Model):
             ("thumbnail:200", "can access 200px thumbnail"),
             ("thumbnail:400", "can access 400px thumbnail"),
         ]
+        indexes = [
+            models.Index(
+                fields=["user", "uploaded_at", "id"], name="image_user_uploaded_idx"
+            ),
+        ]
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     original_file = models.ImageField(upload_to=original_image_path)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    format = models.CharField(max_length=10, blank=True, db_index=True)
+    width = models.PositiveIntegerField(null=True, db_index=True)
+    height = models.PositiveIntegerField(null=True, db_index=True)
+    size = models.PositiveBigIntegerField(null=True, db_index=True)
+    orientation = models.PositiveSmallIntegerField(null=True)
 
     @property
     def filename(self):
         return self.original_file.name.split("/")[-1]
 
+    @property
+    def media_type(self):
+        """Media type of the image file, by its format, or guessed from the file name for images without a stored one."""
+        return (
+            IMAGE_CONTENT_TYPES.get(self.format)
+            or self.content_type
+            or mimetypes.guess_type(self.original_file.name)[0]
+            or "application/octet-stream"
+        )
+
+    def set_file_metadata(self, image_info, size):
+        """Sets the file metadata fields from the probed header and the size of the image file.
+
+        Args:
+            image_info (ImageInfo): format, dimensions and orientation of the image
+            size (int): size of the image file in bytes
+        """
+        self.format = image_info.format
+        self.width = image_info.width
+        self.height = image_info.height
+        self.orientation = image_info.orientation
+        self.size = size
+
     def __str__(self):
         return f"Image by {self.user.username} - {self.filename} - {self.uploaded_at}"
 
 
+class ImageBlob(models.Model):
+    """Model representing a stored image file shared by all images with identical content.
+
+    Uploads are hashed as they stream in. An upload matching an existing blob references the stored file instead of
+    storing another copy, and the file is removed from the storage once the last image referencing it is deleted.
+
+    Attributes:
+        content_hash (CharField): SHA-256 hex digest of the file.
+        name (CharField): The name of the file in the default storage.
+        size (PositiveBigIntegerField): The size of the file in bytes.
+        ref_count (PositiveIntegerField): The number of images referencing the file.
+    """
+
+    content_hash = models.CharField(max_length=64, primary_key=True)
+    name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} references)"
+
+
+class ExpiringLinkQuerySet(models.QuerySet):
+    def active(self):
+        """Filters links that have not expired yet."""
+        return self.filter(expires_at__gt=timezone.now())
+
+    def expired(self, before=None):
+        """Filters links that have expired, by the given time if set.
+
+        Args:
+            before (datetime, optional): time the links have expired by, now if not given
+        """
+        return self.filter(expires_at__lte=before or timezone.now())
+
+
 class ExpiringLink(models.Model):
     """Model representing an expiring link for an image.
 
@@ -58,6 +151,9 @@ class ExpiringLink(models.Model):
         image (ForeignKey): Reference to the associated image for this link.
         created_at (DateTimeField): The time at which the expiring link was generated.
         expires_in (IntegerField): The lifespan of the link in seconds.
+        expires_at (DateTimeField): The time at which the link expires, set from `expires_in` on save unless given
+            (links inserted with `bulk_create` have to be given it).
+        delivery (CharField): How the image is delivered, overriding the `EXPIRING_LINK_DELIVERY` setting if set.
     """
 
     class Meta:
@@ -65,6 +161,11 @@ class ExpiringLink(models.Model):
             ("can_generate_expiring_link", "Can generate expiring link"),
         ]
 
+    class Delivery(models.TextChoices):
+        DEFAULT = "", "Default"
+        PROXY = "proxy", "Proxy the file"
+        REDIRECT = "redirect", "Redirect to a presigned storage URL"
+
     alias = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     image = models.ForeignKey(Image, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -74,10 +175,63 @@ class ExpiringLink(models.Model):
             MaxValueValidator(30000),
         ]
     )
+    expires_at = models.DateTimeField(db_index=True)
+    delivery = models.CharField(
+        max_length=10, choices=Delivery.choices, default=Delivery.DEFAULT, blank=True
+    )
+
+    objects = ExpiringLinkQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        if self.expires_at is None:
+            self.expires_at = timezone.now() + timedelta(seconds=self.expires_in)
+        super().save(*args, **kwargs)
+
+    @property
+    def remaining_seconds(self):
+        """Number of whole seconds until the link expires, 0 if it has already expired."""
+        return max(int((self.expires_at - timezone.now()).total_seconds()), 0)
 
     @property
     def is_expired(self):
-        return (timezone.now() - self.created_at).seconds > self.expires_in
+        return self.expires_at <= timezone.now()
 
     def __str__(self):
         return reverse("images:image-link", kwargs={"alias": self.alias})
+
+
+class UploadSession(models.Model):
+    """Model representing a resumable upload of an image in numbered chunks.
+
+    The session maps onto a multipart upload of the default storage. Clients PUT chunks to presigned part URLs, can
+    query which chunks have arrived to resume after a failure, and finalize the session once all chunks are uploaded.
+    Sessions left unfinished are aborted after `expires_at`.
+
+    Attributes:
+        id (UUIDField): A unique identifier for each upload session.
+        user (ForeignKey): Reference to the user uploading the image.
+        name (CharField): The name the image file is stored under.
+        content_type (CharField): The media type of the image file.
+        size (PositiveBigIntegerField): The size of the image file in bytes.
+        chunk_size (PositiveIntegerField): The size of all chunks but the last one in bytes.
+        upload_id (CharField): The id of the multipart upload in the storage.
+        created_at (DateTimeField): The time at which the session was created.
+        expires_at (DateTimeField): The time after which the session is aborted.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    name = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    upload_id = models.CharField(max_length=1024)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    @property
+    def chunk_count(self):
+        return -(-self.size // self.chunk_size)
+
+    def __str__(self):
+        return f"Upload of {self.name} by {self.user.username}"
@@ -0,0 +1,166 @@
+from asgiref.sync import sync_to_async
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+import uuid
+
+
+class ImagePagination(BasePagination):
+    """Keyset pagination for images ordered by upload time, newest first.
+
+    Pages are addressed by an opaque cursor encoding the `(uploaded_at, id)` pair of the last image on the previous page,
+    so fetching a deep page costs the same as fetching the first one. Clients passing `offset` get classic
+    limit/offset pagination instead, which is convenient for small libraries.
+    """
+
+    ordering = ("-uploaded_at", "-id")
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    offset_query_param = LimitOffsetPagination.offset_query_param
+    invalid_cursor_message = "Invalid cursor"
+
+    def __init__(self):
+        self.page_size = settings.IMAGES_PAGE_SIZE
+        self.max_page_size = settings.IMAGES_MAX_PAGE_SIZE
+        self.offset_pagination = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Returns a single page of images for the given request.
+
+        Returns:
+            list: images on the requested page
+        """
+        queryset = queryset.order_by(*self.ordering)
+        if self.offset_query_param in request.query_params:
+            return self.paginate_offset(queryset, request, view)
+        return self.set_page(list(self.get_page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Async variant of `paginate_queryset`, fetching the page through the async ORM interface.
+
+        Returns:
+            list: images on the requested page
+        """
+        queryset = queryset.order_by(*self.ordering)
+        if self.offset_query_param in request.query_params:
+            return await sync_to_async(self.paginate_offset)(queryset, request, view)
+        page_queryset = self.get_page_queryset(queryset, request)
+        return self.set_page([image async for image in page_queryset])
+
+    def paginate_offset(self, queryset, request, view=None):
+        """Returns a single page of images using limit/offset pagination."""
+        self.offset_pagination = LimitOffsetPagination()
+        self.offset_pagination.default_limit = self.page_size
+        self.offset_pagination.max_limit = self.max_page_size
+        return self.offset_pagination.paginate_queryset(queryset, request, view)
+
+    def get_page_queryset(self, queryset, request):
+        """Narrows the ordered queryset down to the requested page, plus one image telling if there is a next page.
+
+        Returns:
+            QuerySet: images on the requested page
+        """
+        self.request = request
+        self.current_page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+        if position is not None:
+            uploaded_at, image_id = position
+            queryset = queryset.filter(
+                Q(uploaded_at__lt=uploaded_at)
+                | Q(uploaded_at=uploaded_at, id__lt=image_id)
+            )
+        return queryset[: self.current_page_size + 1]
+
+    def set_page(self, results):
+        """Stores the fetched page, dropping the extra image fetched to tell if there is a next page.
+
+        Returns:
+            list: images on the page
+        """
+        self.has_next = len(results) > self.current_page_size
+        self.page = results[: self.current_page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        if self.offset_pagination is not None:
+            return self.offset_pagination.get_paginated_response(data)
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(last)
+        )
+
+    def encode_cursor(self, image):
+        """Encodes the position of an image as an opaque cursor.
+
+        Args:
+            image (Image): last image of the page
+
+        Returns:
+            str: cursor pointing right after the image
+        """
+        position = f"{image.uploaded_at.isoformat()}|{image.id.hex}"
+        return urlsafe_b64encode(position.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, request):
+        """Decodes the cursor given in the request.
+
+        Raises:
+            NotFound: If the cursor is malformed.
+
+        Returns:
+            tuple: `(uploaded_at, id)` position, or None if no cursor was given
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            padding = "=" * (-len(encoded) % 4)
+            position = urlsafe_b64decode(encoded + padding).decode()
+            uploaded_at, image_id = position.split("|")
+            uploaded_at = parse_datetime(uploaded_at)
+            image_id = uuid.UUID(hex=image_id)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if uploaded_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return uploaded_at, image_id
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results to return per page.",
+                "schema": {"type": "integer"},
+            },
+        ] + LimitOffsetPagination().get_schema_operation_parameters(view)
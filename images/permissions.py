@@ -1,4 +1,5 @@
 from rest_framework import permissions
+from lib.shared import UserGroupPermissions
 
 
 class HasExpiringLinkPermission(permissions.IsAuthenticated):
@@ -7,4 +8,10 @@ class HasExpiringLinkPermission(permissions.IsAuthenticated):
     required_permission = "images.can_generate_expiring_link"
 
     def has_permission(self, request, view):
-        return request.user.has_perm(self.required_permission)
+        if not super().has_permission(request, view) or not request.user.is_active:
+            return False
+        if request.user.is_superuser:
+            return True
+        return UserGroupPermissions.for_request(request).has_perm(
+            self.required_permission
+        )
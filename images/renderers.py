@@ -1,20 +1,224 @@
+from json.encoder import encode_basestring, encode_basestring_ascii
 from rest_framework.renderers import JSONRenderer
-import json
+from lib.instrumentation import timed
+import math
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 class NonNullJSONRenderer(JSONRenderer):
+    """JSON renderer omitting keys with `None` values from objects.
+
+    Nulls are dropped while the data is being encoded, in a single walk over the data and without copying it. When
+    `orjson` is installed, values are encoded with it instead, each from a copy without the nulls as orjson has no
+    option to omit them itself; that is still faster than the standard library encoder. Indented output (e.g. for the
+    browsable API) is rendered by `JSONRenderer` from a copy of the data without the nulls.
+
+    Large lists can be rendered incrementally with `iter_render`, see `StreamingRenderMixin`.
+    """
+
+    # size in bytes of the chunks yielded by `iter_render`
+    chunk_size = 64 * 1024
+
+    @timed("render")
     def render(self, data, accepted_media_type=None, renderer_context=None):
-        data = self.omit_null_values(data)
-        renderer_context["response"].data = data
-        return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b""
+        renderer_context = renderer_context or {}
+        if not self.is_compact(accepted_media_type, renderer_context):
+            data = self.omit_null_values(data)
+            return super().render(data, accepted_media_type, renderer_context)
+        return b"".join(self.iter_encode(data))
 
-    def omit_null_values(self, data):
+    def iter_render(self, data, accepted_media_type=None, renderer_context=None):
+        """Renders the data incrementally, in chunks of roughly `chunk_size` bytes.
+
+        Returns:
+            Iterator[bytes]: chunks of the rendered data
+        """
+        renderer_context = renderer_context or {}
         if data is None:
-            return data
-        if isinstance(data, list):
-            return [self.omit_null_values(v) for v in data]
+            return
+        if not self.is_compact(accepted_media_type, renderer_context):
+            yield self.render(data, accepted_media_type, renderer_context)
+            return
+
+        buffer = []
+        size = 0
+        for part in self.iter_encode(data):
+            buffer.append(part)
+            size += len(part)
+            if size >= self.chunk_size:
+                yield b"".join(buffer)
+                buffer = []
+                size = 0
+        if buffer:
+            yield b"".join(buffer)
+
+    def is_compact(self, accepted_media_type, renderer_context):
+        """Tells if the output is compact, which is the output the single-pass encoder produces."""
+        return self.compact and not self.get_indent(
+            accepted_media_type, renderer_context
+        )
+
+    def iter_encode(self, data):
+        """Encodes the data, yielding top-level lists, and lists directly under a top-level object, item by item.
+
+        Returns:
+            Iterator[bytes]: parts of the encoded data
+        """
+        encode = self.get_value_encoder()
+        if isinstance(data, dict):
+            yield b"{"
+            separator = b""
+            for key, value in data.items():
+                if value is None:
+                    continue
+                yield separator + self.encode_key(key).encode() + b":"
+                separator = b","
+                if isinstance(value, (list, tuple)):
+                    yield from self.iter_encode_list(value, encode)
+                else:
+                    yield encode(value)
+            yield b"}"
+        elif isinstance(data, (list, tuple)):
+            yield from self.iter_encode_list(data, encode)
+        else:
+            yield encode(data)
+
+    def iter_encode_list(self, data, encode):
+        yield b"["
+        separator = b""
+        for item in data:
+            yield separator + encode(item)
+            separator = b","
+        yield b"]"
+
+    def get_value_encoder(self):
+        """Returns the function encoding a single value to bytes, using `orjson` when it can be used.
+
+        `orjson` only produces UTF-8 output, so it is not used when ASCII output is required. Unlike the standard
+        library encoder, it writes non-finite floats as `null` rather than failing in strict mode.
+        """
+        default = self.encoder_class().default
+        if orjson is not None and not self.ensure_ascii:
+            # datetimes are left to the encoder class, which formats them its own way
+            option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+            def encode(value):
+                return orjson.dumps(self.omit_null_values(value), default, option)
+
+            return encode
+
+        encode_value = self.make_encoder(default)
+
+        def encode(value):
+            parts = []
+            encode_value(value, parts.append)
+            return "".join(parts).encode()
+
+        return encode
+
+    def encode_key(self, key):
+        """Encodes a key of an object, converting keys of other types to strings the way `json` does."""
+        if not isinstance(key, str):
+            if key is True:
+                key = "true"
+            elif key is False:
+                key = "false"
+            elif key is None:
+                key = "null"
+            elif isinstance(key, (int, float)):
+                key = self.encode_number(key)
+            else:
+                raise TypeError(
+                    f"keys must be str, int, float, bool or None, not {type(key).__name__}"
+                )
+        if self.ensure_ascii:
+            return encode_basestring_ascii(key)
+        return encode_basestring(key)
+
+    def encode_number(self, value):
+        """Encodes a number, rejecting non-finite floats in strict mode the way `json` does."""
+        if isinstance(value, int):
+            return int.__repr__(value)
+        if not math.isfinite(value):
+            if self.strict:
+                raise ValueError(
+                    f"Out of range float values are not JSON compliant: {value!r}"
+                )
+            return (
+                "NaN" if value != value else ("Infinity" if value > 0 else "-Infinity")
+            )
+        return float.__repr__(value)
+
+    def make_encoder(self, default):
+        """Builds the function encoding a value with the standard library, dropping nulls in the same walk over it.
+
+        Args:
+            default (Callable): function converting values of other types to encodable ones
+
+        Returns:
+            Callable[[Any, Callable[[str], None]], None]: function encoding a value, writing its parts with the given
+                function
+        """
+        encode_string = (
+            encode_basestring_ascii if self.ensure_ascii else encode_basestring
+        )
+        encode_key = self.encode_key
+        encode_number = self.encode_number
+
+        def encode(value, write):
+            if isinstance(value, str):
+                write(encode_string(value))
+            elif value is None:
+                write("null")
+            elif value is True:
+                write("true")
+            elif value is False:
+                write("false")
+            elif isinstance(value, (int, float)):
+                write(encode_number(value))
+            elif isinstance(value, dict):
+                separator = "{"
+                for key, item in value.items():
+                    if item is None:
+                        continue
+                    key = encode_string(key) if type(key) is str else encode_key(key)
+                    if type(item) is str:
+                        write(f"{separator}{key}:{encode_string(item)}")
+                    else:
+                        write(f"{separator}{key}:")
+                        encode(item, write)
+                    separator = ","
+                write("{}" if separator == "{" else "}")
+            elif isinstance(value, (list, tuple)):
+                separator = "["
+                for item in value:
+                    write(separator)
+                    encode(item, write)
+                    separator = ","
+                write("[]" if separator == "[" else "]")
+            else:
+                encode(default(value), write)
+
+        return encode
+
+    def omit_null_values(self, data):
+        """Returns a copy of the data without `None` values in objects, only copying containers."""
+        containers = (dict, list, tuple)
         if isinstance(data, dict):
             return {
-                k: self.omit_null_values(v) for k, v in data.items() if v is not None
+                k: self.omit_null_values(v) if isinstance(v, containers) else v
+                for k, v in data.items()
+                if v is not None
             }
+        if isinstance(data, (list, tuple)):
+            return [
+                self.omit_null_values(v) if isinstance(v, containers) else v
+                for v in data
+            ]
         return data
@@ -1,18 +1,48 @@
 from rest_framework import serializers
-from .aws import generate_thumbnail_url
+from rest_framework.permissions import SAFE_METHODS
+from .thumbnails import get_thumbnail_backend
+from .uploads import store_originals
+from .metrics import UPLOAD_SIZE
 from .models import ExpiringLink, Image
-import os
-from django.conf import settings
+from django.db import models, transaction
 from lib.shared import UserGroupPermissions
 from django.core.exceptions import PermissionDenied
-from .validators import validate_image_file_extension
+from .validators import (
+    IMAGE_CONTENT_TYPES,
+    IMAGE_EXTENSIONS,
+    validate_image_content,
+    validate_image_file_extension,
+    validate_stored_image,
+)
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+import os
+
+DIRECT_UPLOAD_SALT = "images.direct-upload"
+
+
+class ImageListSerializer(serializers.ListSerializer):
+    """List serializer for the Image model retrieving thumbnail URLs of all listed images in one batch."""
+
+    def to_representation(self, data):
+        images = list(data.all() if isinstance(data, models.Manager) else data)
+        thumbnails = [
+            pair for image in images for pair in self.child.get_thumbnails(image)
+        ]
+        if thumbnails:
+            self.child.thumbnail_urls = self.child.thumbnail_backend.get_urls(
+                thumbnails
+            )
+        return super().to_representation(images)
 
 
 class ImageSerializer(serializers.ModelSerializer):
     """Serializer for the Image model."""
 
-    original_file = serializers.ImageField(
-        write_only=True, validators=[validate_image_file_extension]
+    original_file = serializers.FileField(
+        write_only=True,
+        validators=[validate_image_file_extension, validate_image_content],
     )
 
     class Meta:
@@ -21,7 +51,14 @@ class ImageSerializer(serializers.ModelSerializer):
             "id",
             "uploaded_at",
             "original_file",
+            "format",
+            "width",
+            "height",
+            "size",
+            "orientation",
         )
+        read_only_fields = ("format", "width", "height", "size", "orientation")
+        list_serializer_class = ImageListSerializer
 
     def __init__(self, *args, **kwargs):
         """Initializes the serializer, checks user authentication and retrieves user permissions (also derived from groups).
@@ -36,17 +73,124 @@ class ImageSerializer(serializers.ModelSerializer):
             raise PermissionDenied("User not authenticated")
 
         self.user = request.user
-        self.user.all_permissions = UserGroupPermissions.get_user_permissions(
-            request.user
-        )
+        self.user.all_permissions = UserGroupPermissions.for_request(request)
 
         if self.user.all_permissions.contains("can_access_original_image"):
             self.fields["original_file"].write_only = False
 
+        self.thumbnail_backend = get_thumbnail_backend()
+        self.thumbnail_urls = {}
+        self.selected_heights = None
+        if request.method in SAFE_METHODS:
+            self.select_fields(request.query_params)
+
+    def select_fields(self, query_params):
+        """Prunes the fields to those selected with the `fields` and `thumbnails` query parameters.
+
+        `fields` selects fields by name, thumbnails included as `thumbnail_{height}`, and `thumbnails` selects
+        thumbnails by height, e.g. `?fields=id,uploaded_at&thumbnails=200,400`. With `thumbnails` alone all fields are
+        kept, without either parameter all fields and all thumbnails the user can access. URLs of pruned files and
+        thumbnails are never retrieved, so they are not signed either.
+
+        Raises:
+            ValidationError: If an unknown field or an invalid thumbnail height is selected.
+        """
+        names = _get_list_param(query_params, "fields")
+        heights = _get_list_param(query_params, "thumbnails")
+        if names is None and heights is None:
+            return
+
+        heights = heights or set()
+        for name in list(names or ()):
+            if name.startswith("thumbnail_"):
+                names.remove(name)
+                heights.add(name[len("thumbnail_") :])
+
+        unknown = sorted((names or set()) - set(self.fields))
+        if unknown:
+            raise serializers.ValidationError(
+                {"fields": [f"Unknown field: {name}" for name in unknown]}
+            )
+        invalid = sorted(height for height in heights if not height.isdigit())
+        if invalid:
+            raise serializers.ValidationError(
+                {"thumbnails": [f"Invalid thumbnail height: {h}" for h in invalid]}
+            )
+
+        if names is not None:
+            for name in set(self.fields) - names:
+                self.fields.pop(name)
+        self.selected_heights = heights
+
+    def get_loaded_fields(self):
+        """Retrieves names of the model fields needed to represent images, for loading only them with `only()`.
+
+        The primary key and the upload time, by which images are paginated, are always included.
+
+        Returns:
+            set: model field names
+        """
+        names = {"id", "uploaded_at"}
+        names.update(
+            field.source for field in self.fields.values() if not field.write_only
+        )
+        if self.get_thumbnail_heights():
+            names.add("original_file")
+        return names
+
+    def create(self, validated_data):
+        """Creates the image, storing the content type of the format detected while validating the uploaded file.
+
+        The content type declared by the client is ignored. The file is stored deduplicated by content, see
+        `store_originals`, in the transaction saving the image.
+        """
+        file = validated_data.pop("original_file")
+        image = Image(
+            content_type=IMAGE_CONTENT_TYPES[file.image_info.format], **validated_data
+        )
+        with transaction.atomic():
+            (error,) = store_originals([(image, file)])
+            if error is not None:
+                raise error
+            image.save()
+        return image
+
+    def get_thumbnail_heights(self):
+        """Retrieves thumbnail heights the user can access, derived from `thumbnail:{height}` permissions, and selected
+        with `select_fields`.
+
+        Raises:
+            ValueError: If an invalid permission codename is encountered.
+
+        Returns:
+            list: thumbnail heights, ascending
+        """
+        heights = []
+        for codename in self.user.all_permissions.startswith("thumbnail:"):
+            perm_data = codename.split(":")
+            if len(perm_data) < 2:
+                raise ValueError(f"Invalid permission codename: {codename}")
+
+            _, height = perm_data
+            if self.selected_heights is None or height in self.selected_heights:
+                heights.append(height)
+
+        # permissions are unordered, thumbnails are listed smallest first
+        return sorted(heights, key=int)
+
+    def get_thumbnails(self, instance):
+        """Retrieves `(file name, height)` pairs of thumbnails accessible for the image instance.
+
+        Returns:
+            list: pairs of file name of the original image and thumbnail height
+        """
+        name = instance.original_file.name
+        return [(name, height) for height in self.get_thumbnail_heights()]
+
     def to_representation(self, instance):
         """Converts the image instance to a dictionary representation including links to accessible thumbnails.
 
-        This method iterates over the user's permissions, checking for any permissions that indicate allowable thumbnail sizes. It then generates URLs for these thumbnails.
+        This method iterates over the user's permissions, checking for any permissions that indicate allowable thumbnail sizes. It then retrieves URLs for these thumbnails from the configured thumbnail backend, unless they were already retrieved for the whole list.
 
         Raises:
             ValueError: If an invalid permission codename is encountered.
@@ -57,25 +201,155 @@ class ImageSerializer(serializers.ModelSerializer):
 
         representation = super().to_representation(instance)
 
-        for permission in self.user.all_permissions.startswith("thumbnail:"):
-            perm_data = permission.codename.split(":")
-            if len(perm_data) < 2:
-                raise ValueError(f"Invalid permission codename: {permission.codename}")
+        thumbnails = self.get_thumbnails(instance)
+        if any(pair not in self.thumbnail_urls for pair in thumbnails):
+            self.thumbnail_urls = self.thumbnail_backend.get_urls(thumbnails)
 
-            _, height = perm_data
-            s3_object_key = os.path.join(
-                settings.PUBLIC_MEDIA_LOCATION, instance.original_file.name
-            )
-            representation[f"thumbnail_{height}"] = generate_thumbnail_url(
-                s3_object_key, height
-            )
+        for pair in thumbnails:
+            _, height = pair
+            representation[f"thumbnail_{height}"] = self.thumbnail_urls[pair]
 
         return representation
 
 
+def _get_list_param(query_params, name):
+    """Parses a query parameter holding a comma-separated list, which may be repeated.
+
+    Returns:
+        set: listed values, or None if the parameter is not given
+    """
+    if name not in query_params:
+        return None
+    return {
+        value.strip()
+        for param in query_params.getlist(name)
+        for value in param.split(",")
+        if value.strip()
+    }
+
+
 class ExpiringLinkSerializer(serializers.ModelSerializer):
     """Serializer for the ExpiringLink model."""
 
     class Meta:
         model = ExpiringLink
         exclude = ("image",)
+        read_only_fields = ("expires_at", "delivery")
+
+
+class BulkExpiringLinkSerializer(serializers.Serializer):
+    """Serializer for generating expiring links to several images at once."""
+
+    image_ids = serializers.ListField(
+        child=serializers.UUIDField(),
+        allow_empty=False,
+        max_length=settings.EXPIRING_LINK_BULK_MAX_IMAGES,
+    )
+    expires_in = serializers.IntegerField(
+        validators=ExpiringLink._meta.get_field("expires_in").validators
+    )
+
+    def validate_image_ids(self, value):
+        """Removes duplicate ids, keeping the order of the request."""
+        return list(dict.fromkeys(value))
+
+
+class DirectUploadSerializer(serializers.Serializer):
+    """Serializer for requesting a direct upload of an image to the storage."""
+
+    filename = serializers.CharField(max_length=255)
+    content_type = serializers.ChoiceField(choices=list(IMAGE_CONTENT_TYPES.values()))
+
+    def validate(self, data):
+        """Checks that the file extension is supported and matches the content type."""
+        ext = os.path.splitext(data["filename"])[1].lower()
+        if ext not in IMAGE_EXTENSIONS:
+            raise serializers.ValidationError(
+                {
+                    "filename": "Unsupported file extension. Supported file extensions are .jpg, .jpeg, .png"
+                }
+            )
+        if IMAGE_CONTENT_TYPES[IMAGE_EXTENSIONS[ext]] != data["content_type"]:
+            raise serializers.ValidationError(
+                {"content_type": "Content type does not match the file extension."}
+            )
+        return data
+
+
+class UploadSessionSerializer(DirectUploadSerializer):
+    """Serializer for starting a resumable upload of an image."""
+
+    size = serializers.IntegerField(min_value=1)
+
+    def validate_size(self, value):
+        if value > settings.RESUMABLE_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f"Ensure this value is less than or equal to {settings.RESUMABLE_UPLOAD_MAX_SIZE}."
+            )
+        return value
+
+
+class DirectUploadCompleteSerializer(serializers.Serializer):
+    """Serializer for finalizing a direct upload of an image to the storage.
+
+    The token identifies the uploaded object. The object is checked for its size and header bytes before the `Image`
+    is created, and removed from the storage if it is not a valid image.
+    """
+
+    token = serializers.CharField()
+
+    def validate_token(self, value):
+        """Resolves the token into the name of the uploaded object.
+
+        Raises:
+            ValidationError: If the token is invalid, expired or issued to another user.
+
+        Returns:
+            str: name of the uploaded object
+        """
+        try:
+            upload = signing.loads(
+                value,
+                salt=DIRECT_UPLOAD_SALT,
+                max_age=settings.DIRECT_UPLOAD_EXPIRES_IN * 2,
+            )
+        except signing.BadSignature:
+            raise serializers.ValidationError("Invalid or expired upload token.")
+
+        if upload["user"] != self.context["request"].user.pk:
+            raise serializers.ValidationError("Invalid or expired upload token.")
+        return upload["name"]
+
+    def validate(self, data):
+        name = data["token"]
+        if not default_storage.exists(name):
+            raise serializers.ValidationError({"token": "File has not been uploaded."})
+
+        try:
+            image_info, size = validate_stored_image(
+                name, settings.DIRECT_UPLOAD_MAX_SIZE
+            )
+        except serializers.ValidationError as e:
+            raise serializers.ValidationError({"token": e.detail})
+
+        UPLOAD_SIZE.observe(size, method="direct")
+
+        return {
+            "name": name,
+            "content_type": IMAGE_CONTENT_TYPES[image_info.format],
+            "image_info": image_info,
+            "size": size,
+        }
+
+    def create(self, validated_data):
+        image = Image.objects.filter(original_file=validated_data["name"]).first()
+        if image is not None:
+            return image
+        image = Image(
+            user=validated_data["user"],
+            original_file=validated_data["name"],
+            content_type=validated_data["content_type"],
+        )
+        image.set_file_metadata(validated_data["image_info"], validated_data["size"])
+        image.save()
+        return image
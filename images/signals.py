@@ -0,0 +1,92 @@
+from django.contrib.auth.models import Group, Permission, User
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.conf import settings
+from django.core.cache import cache
+from lib.shared import UserGroupPermissions
+from .links import EXPIRED_LINK, IMAGE_FILE_CACHE_KEY
+from .listing import bump_image_list_versions
+from .models import ExpiringLink, Image
+from .uploads import release_blob
+
+
+def _invalidate_related_users(instance, action, reverse, pk_set):
+    """Invalidates cached permissions of users affected by a change of a `User` m2m relation."""
+    if not reverse:
+        if action.startswith("post_"):
+            UserGroupPermissions.invalidate(instance.pk)
+    elif action in ("post_add", "post_remove"):
+        UserGroupPermissions.invalidate(*pk_set)
+    elif action == "pre_clear":
+        UserGroupPermissions.invalidate(
+            *instance.user_set.values_list("pk", flat=True)
+        )
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    _invalidate_related_users(instance, action, reverse, pk_set)
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def user_permissions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    _invalidate_related_users(instance, action, reverse, pk_set)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def group_permissions_changed(sender, action, **kwargs):
+    if action.startswith("post_"):
+        UserGroupPermissions.invalidate_all()
+
+
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def group_or_permission_deleted(sender, **kwargs):
+    UserGroupPermissions.invalidate_all()
+
+
+@receiver(post_save, sender=Permission)
+def permission_saved(sender, instance, created, **kwargs):
+    # tiers are cached by codename, a renamed permission changes them
+    if not created:
+        UserGroupPermissions.invalidate_all()
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, **kwargs):
+    if created:
+        UserGroupPermissions.invalidate(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    UserGroupPermissions.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=ExpiringLink)
+def expiring_link_changed(sender, instance, created, **kwargs):
+    if not created:
+        # The cached record is rebuilt from the database on the next access
+        cache.delete(str(instance.alias))
+
+
+@receiver(post_delete, sender=ExpiringLink)
+def expiring_link_deleted(sender, instance, **kwargs):
+    cache.set(
+        str(instance.alias),
+        EXPIRED_LINK,
+        timeout=settings.EXPIRING_LINK_NEGATIVE_CACHE_TIMEOUT,
+    )
+
+
+@receiver(post_save, sender=Image)
+def image_saved(sender, instance, **kwargs):
+    bump_image_list_versions(instance.user_id)
+
+
+@receiver(post_delete, sender=Image)
+def image_deleted(sender, instance, **kwargs):
+    bump_image_list_versions(instance.user_id)
+    cache.delete(IMAGE_FILE_CACHE_KEY.format(image_id=instance.id))
+    if instance.content_hash:
+        release_blob(instance.content_hash)
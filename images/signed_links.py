@@ -0,0 +1,165 @@
+import hashlib
+import hmac
+import struct
+import time
+import uuid
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from lib.instrumentation import timed
+from tasks.base import task
+from .models import ExpiringLink
+
+REVOKED_LINK_CACHE_KEY = "revoked-link:{alias}"
+
+
+class InvalidSignedLink(Exception):
+    """Raised when a signed link is malformed, forged, signed with an unknown key or revoked."""
+
+
+class ExpiredSignedLink(InvalidSignedLink):
+    """Raised when a signed link has expired."""
+
+
+def _b64encode(data):
+    return urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def _b64decode(data):
+    return urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _digest(key_id, payload):
+    key = settings.EXPIRING_LINK_SIGNING_KEYS[key_id]
+    message = f"{key_id}.{payload}".encode()
+    return hmac.new(key.encode(), message, hashlib.sha256).digest()[:16]
+
+
+@timed("sign")
+def sign_link(image_id, expires_at, key_id=None):
+    """Build the token of a stateless expiring link.
+
+    The token consists of the key id, the payload with image id and expiry, and a truncated HMAC-SHA256 signature of
+    both, separated by dots. The signature doubles as the alias of the link in the audit log.
+
+    Args:
+        image_id (UUID): id of the image
+        expires_at (int): UNIX timestamp at which the link expires
+        key_id (str, optional): id of the signing key, `EXPIRING_LINK_SIGNING_KEY_ID` by default
+
+    Returns:
+        tuple: token of the link and its alias
+    """
+    key_id = key_id or settings.EXPIRING_LINK_SIGNING_KEY_ID
+    payload = _b64encode(image_id.bytes + struct.pack(">I", expires_at))
+    digest = _digest(key_id, payload)
+    return f"{key_id}.{payload}.{_b64encode(digest)}", uuid.UUID(bytes=digest)
+
+
+@timed("sign")
+def verify_link(token):
+    """Validate the token of a stateless expiring link.
+
+    Validation is pure CPU work unless `EXPIRING_LINK_REVOCATION_CHECK` is enabled, in which case the revocation list
+    in cache is consulted with a single lookup.
+
+    Args:
+        token (str): token of the link
+
+    Raises:
+        ExpiredSignedLink: If the link has expired.
+        InvalidSignedLink: If the link is invalid or has been revoked.
+
+    Returns:
+        tuple: id of the image, UNIX timestamp at which the link expires and alias of the link
+    """
+    try:
+        key_id, payload, signature = token.split(".")
+        data = _b64decode(payload)
+        signature = _b64decode(signature)
+    except ValueError:
+        raise InvalidSignedLink()
+
+    if key_id not in settings.EXPIRING_LINK_SIGNING_KEYS or len(data) != 20:
+        raise InvalidSignedLink()
+    if not hmac.compare_digest(signature, _digest(key_id, payload)):
+        raise InvalidSignedLink()
+
+    (expires_at,) = struct.unpack(">I", data[16:])
+    if expires_at <= time.time():
+        raise ExpiredSignedLink()
+
+    alias = uuid.UUID(bytes=signature)
+    if settings.EXPIRING_LINK_REVOCATION_CHECK and cache.get(
+        REVOKED_LINK_CACHE_KEY.format(alias=alias)
+    ):
+        raise InvalidSignedLink()
+
+    return uuid.UUID(bytes=data[:16]), expires_at, alias
+
+
+def revoke_link(alias, expires_in):
+    """Add a link to the revocation list until it would expire anyway.
+
+    Args:
+        alias (UUID): alias of the link
+        expires_in (int): number of seconds until the link expires
+    """
+    if expires_in > 0:
+        cache.set(REVOKED_LINK_CACHE_KEY.format(alias=alias), True, timeout=expires_in)
+
+
+def audit_link(alias, image_id, expires_in):
+    """Record a signed link in the `ExpiringLink` audit log off the request path, once the transaction commits.
+
+    Args:
+        alias (UUID): alias of the link
+        image_id (UUID): id of the image
+        expires_in (int): lifespan of the link in seconds
+    """
+    audit_links({alias: image_id}, expires_in)
+
+
+def audit_links(links, expires_in):
+    """Record signed links in the `ExpiringLink` audit log with a single INSERT, see `audit_link`.
+
+    Args:
+        links (dict): alias of the link to the id of its image
+        expires_in (int): lifespan of the links in seconds
+    """
+    if not settings.EXPIRING_LINK_AUDIT or not links:
+        return
+
+    expires_at = timezone.now() + timedelta(seconds=expires_in)
+    record_signed_links.delay(
+        {str(alias): str(image_id) for alias, image_id in links.items()},
+        expires_in,
+        expires_at,
+    )
+
+
+@task
+def record_signed_links(links, expires_in, expires_at):
+    """Background task inserting signed links into the `ExpiringLink` audit log, see `audit_links`.
+
+    Links recorded by an earlier attempt are skipped, so that a retried task does not fail on duplicate aliases.
+
+    Args:
+        links (dict): alias of the link to the id of its image
+        expires_in (int): lifespan of the links in seconds
+        expires_at (str): ISO 8601 time at which the links expire
+    """
+    ExpiringLink.objects.bulk_create(
+        (
+            ExpiringLink(
+                alias=alias,
+                image_id=image_id,
+                expires_in=expires_in,
+                expires_at=expires_at,
+            )
+            for alias, image_id in links.items()
+        ),
+        ignore_conflicts=True,
+    )
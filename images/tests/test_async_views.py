@@ -0,0 +1,111 @@
+import asyncio
+import shutil
+import uuid
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, force_authenticate
+from images.async_views import (
+    AsyncExpiringLinkRedirectView,
+    AsyncGenerateExpiringLinkView,
+    AsyncUserImagesView,
+)
+from images.models import ExpiringLink
+from .shared import sample_image
+
+
+class AsyncViewsTests(TestCase):
+    """Test async variants of the images views"""
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = get_user_model().objects.create_user(
+            username="testuser", email="test@test.com", password="testpass"
+        )
+        Group.objects.get(name="EnterpriseTierUsers").user_set.add(self.user)
+        self.image = sample_image(user=self.user)
+
+    def tearDown(self):
+        """Remove media files after each test"""
+        path = default_storage.path(f"./{self.user.id}")
+        if default_storage.exists(path):
+            shutil.rmtree(path)
+
+    async def call(self, view_class, request, **kwargs):
+        force_authenticate(request, self.user)
+        response = await view_class.as_view()(request, **kwargs)
+        if hasattr(response, "render"):
+            response.render()
+        return response
+
+    def test_views_are_async(self):
+        """Test that Django runs the views as coroutines"""
+        for view_class in (
+            AsyncUserImagesView,
+            AsyncGenerateExpiringLinkView,
+            AsyncExpiringLinkRedirectView,
+        ):
+            self.assertTrue(asyncio.iscoroutinefunction(view_class.as_view()))
+
+    async def test_list_images(self):
+        """Test listing images with the async view"""
+        request = self.factory.get("/images/", {"page_size": 1})
+
+        res = await self.call(AsyncUserImagesView, request)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["results"][0]["id"], str(self.image.id))
+        self.assertTrue(res.data["results"][0].get("thumbnail_400"))
+
+    async def test_list_images_not_modified(self):
+        """Test that the async view answers conditional requests for an unchanged list with 304"""
+        res = await self.call(AsyncUserImagesView, self.factory.get("/images/"))
+        request = self.factory.get("/images/", HTTP_IF_NONE_MATCH=res["ETag"])
+
+        res2 = await self.call(AsyncUserImagesView, request)
+
+        self.assertEqual(res2.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res2["ETag"], res["ETag"])
+
+    async def test_list_images_invalid_selection_with_etag(self):
+        """Test that the async view rejects an invalid selection even if the ETag matches"""
+        request = self.factory.get(
+            "/images/", {"fields": "unknown"}, HTTP_IF_NONE_MATCH="*"
+        )
+
+        res = await self.call(AsyncUserImagesView, request)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_generate_and_serve_link(self):
+        """Test generating an expiring link and streaming a byte range of the image through it"""
+        request = self.factory.post("/", {"expires_in": 300}, format="json")
+
+        res = await self.call(
+            AsyncGenerateExpiringLinkView, request, image_id=self.image.id
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        link = await ExpiringLink.objects.aget()
+        self.assertIsNotNone(await cache.aget(str(link.alias)))
+
+        request = self.factory.get("/", HTTP_RANGE="bytes=0-3")
+        res = await self.call(AsyncExpiringLinkRedirectView, request, alias=link.alias)
+
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(res["Content-Range"], "bytes 0-3/12")
+        content = b"".join([chunk async for chunk in res.streaming_content])
+        self.assertEqual(content, b"file")
+
+    async def test_unknown_link(self):
+        """Test that an unknown link is gone"""
+        request = self.factory.get("/")
+
+        res = await self.call(
+            AsyncExpiringLinkRedirectView, request, alias=uuid.uuid4()
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_410_GONE)
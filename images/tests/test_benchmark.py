@@ -0,0 +1,53 @@
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from lib.benchmark import compare, measure, percentiles
+
+
+class BenchmarkTests(TestCase):
+    """Test measuring benchmarks"""
+
+    def test_measure(self):
+        """Test that latency, queries and allocations of calls are measured"""
+        calls = []
+
+        def func():
+            calls.append(bytearray(64 * 1024))
+            get_user_model().objects.exists()
+
+        result = measure(func, iterations=5, warmup=2, traced_iterations=3)
+
+        self.assertEqual(len(calls), 10)
+        self.assertEqual(result["queries"], 1)
+        self.assertGreaterEqual(result["peak_kib"], 64)
+        self.assertLessEqual(result["p50"], result["p90"])
+        self.assertLessEqual(result["p90"], result["p99"])
+
+
+class CompareBenchmarksTests(SimpleTestCase):
+    """Test flagging regressions against a baseline"""
+
+    baseline = {"list": {"p50": 10.0, "peak_kib": 100.0, "queries": 2}}
+
+    def test_percentiles(self):
+        """Test that percentiles are interpolated between values"""
+        self.assertEqual(percentiles(list(range(101))), [50, 90, 99])
+        self.assertEqual(percentiles([3.0]), [3.0, 3.0, 3.0])
+
+    def test_no_regressions(self):
+        """Test that growth within the threshold and new benchmarks are not regressions"""
+        results = {
+            "list": {"p50": 11.5, "peak_kib": 90.0, "queries": 2},
+            "upload": {"p50": 50.0, "peak_kib": 100.0, "queries": 6},
+        }
+
+        self.assertEqual(compare(self.baseline, results, threshold=0.2), [])
+
+    def test_regressions(self):
+        """Test that latency and allocations growing past the threshold and any additional query are flagged"""
+        results = {"list": {"p50": 12.5, "peak_kib": 130.0, "queries": 3}}
+
+        regressions = compare(self.baseline, results, threshold=0.2)
+
+        self.assertEqual(len(regressions), 3)
+        self.assertIn("list: p50 10.00 -> 12.50 (+25%)", regressions)
+        self.assertIn("list: queries 2 -> 3", regressions)
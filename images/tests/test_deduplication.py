@@ -0,0 +1,138 @@
+import hashlib
+import shutil
+from io import BytesIO, StringIO
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image as PILImage
+from rest_framework import status
+from rest_framework.test import APIClient
+from images.models import Image, ImageBlob
+from images.uploads import register_blob
+from .shared import sample_image
+
+UPLOAD_IMAGE_URL = reverse("images:image-upload")
+
+
+class ContentDeduplicationTests(TestCase):
+    """Test deduplication of uploaded original files by content"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="testuser", email="test@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+        buffer = BytesIO()
+        PILImage.new("RGB", (10, 10)).save(buffer, format="JPEG")
+        self.content = buffer.getvalue()
+
+    def tearDown(self):
+        """Remove media files after each test"""
+        for directory in (f"./{self.user.id}", "./blobs"):
+            path = default_storage.path(directory)
+            if default_storage.exists(path):
+                shutil.rmtree(path)
+
+    def upload(self):
+        buffer = BytesIO(self.content)
+        buffer.name = "test.jpg"
+        res = self.client.post(
+            UPLOAD_IMAGE_URL, {"original_file": buffer}, format="multipart"
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return Image.objects.get(id=res.data["id"])
+
+    def test_identical_uploads_share_blob(self):
+        """Test that re-uploading the same content references the stored file"""
+        first = self.upload()
+        second = self.upload()
+
+        self.assertEqual(first.content_hash, hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(first.content_hash, second.content_hash)
+        self.assertEqual(first.original_file.name, second.original_file.name)
+        blob = ImageBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(blob.size, len(self.content))
+
+    def test_blob_name_does_not_reveal_uploader(self):
+        """Test that files shared between users are stored under a content-addressed name"""
+        first = self.upload()
+        other = get_user_model().objects.create_user(username="other", password="pass")
+        self.client.force_authenticate(other)
+        second = self.upload()
+
+        self.assertEqual(second.original_file.name, first.original_file.name)
+        self.assertEqual(first.original_file.name, f"blobs/{first.content_hash}.jpg")
+
+    def test_concurrent_registration_keeps_shared_file(self):
+        """Test that an upload losing the race to register a blob stored under the same name keeps the file"""
+        image = self.upload()
+        name = image.original_file.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            blob_name = register_blob(image.content_hash, name, len(self.content))
+
+        self.assertEqual(blob_name, name)
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(ImageBlob.objects.get().ref_count, 2)
+
+    def test_failed_save_drops_blob_reference(self):
+        """Test that references added for an image that could not be saved are rolled back"""
+        self.upload()
+
+        with mock.patch.object(Image, "save", side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.upload()
+
+        self.assertEqual(ImageBlob.objects.get().ref_count, 1)
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=1)
+    def test_large_upload_hashed_while_streaming(self):
+        """Test that files spooled to a temporary file are hashed as well"""
+        image = self.upload()
+
+        self.assertEqual(image.content_hash, hashlib.sha256(self.content).hexdigest())
+
+    def test_file_removed_with_last_reference(self):
+        """Test that the stored file is removed only once the last image referencing it is deleted"""
+        first = self.upload()
+        second = self.upload()
+        name = first.original_file.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(ImageBlob.objects.get().ref_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(ImageBlob.objects.exists())
+
+    def test_backfill_content_hashes(self):
+        """Test that existing images are hashed and pointed at a single content-addressed file"""
+        first = sample_image(user=self.user)
+        second = sample_image(user=self.user)
+        other = sample_image(user=self.user, original_file=self.upload().original_file)
+        names = {first.original_file.name, second.original_file.name}
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("backfill_content_hashes", batch_size=1, stdout=StringIO())
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(
+            first.content_hash, hashlib.sha256(b"file_content").hexdigest()
+        )
+        self.assertEqual(second.original_file.name, first.original_file.name)
+        self.assertEqual(first.original_file.name, f"blobs/{first.content_hash}.jpg")
+        self.assertTrue(default_storage.exists(first.original_file.name))
+        self.assertFalse([name for name in names if default_storage.exists(name)])
+        self.assertEqual(ImageBlob.objects.get(pk=first.content_hash).ref_count, 2)
+        self.assertEqual(ImageBlob.objects.get(pk=other.content_hash).ref_count, 2)
@@ -0,0 +1,167 @@
+from unittest import mock
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.test import APIClient
+from rest_framework import status
+from PIL import Image as PILImage
+from io import BytesIO
+import shutil
+from images.links import get_image_file
+from images.models import Image
+
+DIRECT_UPLOAD_URL = reverse("images:direct-upload")
+DIRECT_UPLOAD_COMPLETE_URL = reverse("images:direct-upload-complete")
+
+
+def sample_jpeg_file(name="test.jpg", content_type="image/jpeg"):
+    """Create and return a sample uploaded JPEG file"""
+    output = BytesIO()
+    PILImage.new("RGB", (10, 10)).save(output, format="JPEG")
+    return SimpleUploadedFile(name, output.getvalue(), content_type=content_type)
+
+
+class DirectUploadsApiTests(TestCase):
+    """Test uploading images directly to the storage"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="testuser", email="test@test.com", password="testpass"
+        )
+        Group.objects.get(name="BasicTierUsers").user_set.add(self.user)
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        """Remove media files after each test"""
+        path = default_storage.path(f"./{self.user.id}")
+        if default_storage.exists(path):
+            shutil.rmtree(path)
+
+    def request_upload(self, filename="test.jpg", content_type="image/jpeg"):
+        res = self.client.post(
+            DIRECT_UPLOAD_URL, {"filename": filename, "content_type": content_type}
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return res.data
+
+    def upload(self, upload, file):
+        return self.client.post(
+            upload["url"], {**upload["fields"], "file": file}, format="multipart"
+        )
+
+    def test_direct_upload(self):
+        """Test uploading an image to the storage and finalizing the upload"""
+        upload = self.request_upload()
+
+        res = self.upload(upload, sample_jpeg_file())
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+        res = self.client.post(DIRECT_UPLOAD_COMPLETE_URL, {"token": upload["token"]})
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(res.data.get("thumbnail_200"))
+
+        image = Image.objects.get(id=res.data.get("id"))
+        self.assertEqual(image.user, self.user)
+        self.assertTrue(default_storage.exists(image.original_file.name))
+
+    def test_direct_upload_prewarms_thumbnails(self):
+        """Test that finalizing an upload pre-warms thumbnails of all heights the uploader can access"""
+        upload = self.request_upload()
+        self.upload(upload, sample_jpeg_file())
+
+        with mock.patch("images.views.prewarm_thumbnails") as prewarm:
+            res = self.client.post(
+                DIRECT_UPLOAD_COMPLETE_URL, {"token": upload["token"]}
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        name = Image.objects.get(id=res.data["id"]).original_file.name
+        prewarm.assert_called_once_with([(name, "200")])
+
+    def test_direct_upload_file_from_metadata(self):
+        """Test that a directly uploaded image is served without reading the storage"""
+        upload = self.request_upload()
+        file = sample_jpeg_file()
+        self.upload(upload, file)
+        res = self.client.post(DIRECT_UPLOAD_COMPLETE_URL, {"token": upload["token"]})
+        image = Image.objects.get(id=res.data["id"])
+
+        with mock.patch.object(
+            default_storage, "get_object_metadata", side_effect=AssertionError
+        ):
+            image_file = get_image_file(image)
+
+        self.assertEqual(image_file["size"], file.size)
+        self.assertEqual(image_file["content_type"], "image/jpeg")
+        self.assertTrue(image_file["etag"].startswith(f'"{image.id.hex}-'))
+        self.assertEqual(
+            get_image_file(Image.objects.get())["etag"], image_file["etag"]
+        )
+
+    def test_direct_upload_complete_twice(self):
+        """Test that finalizing an upload twice does not create another image"""
+        upload = self.request_upload()
+        self.upload(upload, sample_jpeg_file())
+
+        res = self.client.post(DIRECT_UPLOAD_COMPLETE_URL, {"token": upload["token"]})
+        res2 = self.client.post(DIRECT_UPLOAD_COMPLETE_URL, {"token": upload["token"]})
+
+        self.assertEqual(res.data.get("id"), res2.data.get("id"))
+        self.assertEqual(Image.objects.filter(user=self.user).count(), 1)
+
+    def test_direct_upload_invalid_extension(self):
+        """Test requesting an upload of a file with unsupported extension"""
+        res = self.client.post(
+            DIRECT_UPLOAD_URL, {"filename": "test.pdf", "content_type": "image/jpeg"}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Unsupported file extension", str(res.data.get("filename")))
+
+    def test_direct_upload_content_type_mismatch(self):
+        """Test uploading a file with another content type than requested"""
+        upload = self.request_upload()
+
+        res = self.upload(upload, sample_jpeg_file(content_type="image/png"))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_direct_upload_not_image(self):
+        """Test that a non-image upload is rejected and removed from the storage"""
+        upload = self.request_upload()
+        self.upload(
+            upload,
+            SimpleUploadedFile("test.jpg", b"file_content", content_type="image/jpeg"),
+        )
+
+        res = self.client.post(DIRECT_UPLOAD_COMPLETE_URL, {"token": upload["token"]})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Image.objects.filter(user=self.user).exists())
+        self.assertEqual(default_storage.listdir(f"{self.user.id}/original")[1], [])
+
+    def test_direct_upload_not_uploaded(self):
+        """Test finalizing an upload before the file has been uploaded"""
+        upload = self.request_upload()
+
+        res = self.client.post(DIRECT_UPLOAD_COMPLETE_URL, {"token": upload["token"]})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_direct_upload_other_user_token(self):
+        """Test finalizing an upload requested by another user"""
+        upload = self.request_upload()
+        self.upload(upload, sample_jpeg_file())
+        other_user = get_user_model().objects.create_user(
+            username="otheruser", email="other@test.com", password="testpass"
+        )
+        self.client.force_authenticate(other_user)
+
+        res = self.client.post(DIRECT_UPLOAD_COMPLETE_URL, {"token": upload["token"]})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Image.objects.exists())
@@ -1,4 +1,4 @@
-from django.test import TestCase
+from django.test import Client, TestCase
 from rest_framework.test import APIClient
 from rest_framework import status
 import uuid
@@ -7,6 +7,18 @@ from django.contrib.auth.models import Permission
 from .shared import generate_expiring_link_url, sample_image
 from django.http import FileResponse
 import time
+import shutil
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.utils import timezone
+from django.core.files.storage import default_storage
+from django.test import override_settings
+from django.urls import reverse
+from images.links import purge_expired_links
+from images.models import ExpiringLink
+from images.signed_links import revoke_link, sign_link
+from django.core.cache import cache
 
 
 class PublicExpiringLinksApiTests(TestCase):
@@ -40,6 +52,12 @@ class PrivateExpiringLinksApiTests(TestCase):
         self.user.user_permissions.add(perm_expiring_link)
         self.client.force_authenticate(self.user)
 
+    def tearDown(self):
+        """Remove media files after each test"""
+        path = default_storage.path(f"./{self.user.id}")
+        if default_storage.exists(path):
+            shutil.rmtree(path)
+
     def test_generate_expiring_link_invalid_image(self):
         """Test generating an expiring link for an invalid image id"""
         random_uuid = uuid.uuid4()
@@ -90,3 +108,350 @@ class PrivateExpiringLinksApiTests(TestCase):
         res2 = self.client.get(res.data.get("url"))
         self.assertEqual(res2.status_code, status.HTTP_410_GONE)
         self.assertEqual(res2.data.get("msg"), "Link has expired")
+
+    def generate_link(self):
+        res = self.client.post(
+            generate_expiring_link_url(self.image.id), {"expires_in": 300}
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return res.data.get("url")
+
+    def test_expiring_link_etag(self):
+        """Test that the original image is served with an ETag and revalidated with 304"""
+        url = self.generate_link()
+
+        res = self.client.get(url)
+        self.assertTrue(res.has_header("ETag"))
+        self.assertEqual(res["Content-Type"], "image/jpeg")
+
+        res2 = self.client.get(url, HTTP_IF_NONE_MATCH=res["ETag"])
+        self.assertEqual(res2.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res2["ETag"], res["ETag"])
+
+    def test_expiring_link_range(self):
+        """Test serving a byte range of the original image"""
+        url = self.generate_link()
+
+        res = self.client.get(url, HTTP_RANGE="bytes=5-8")
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b"".join(res.streaming_content), b"cont")
+        self.assertEqual(res["Content-Range"], "bytes 5-8/12")
+        self.assertEqual(res["Content-Length"], "4")
+
+        res = self.client.get(url, HTTP_RANGE="bytes=-3")
+        self.assertEqual(b"".join(res.streaming_content), b"ent")
+
+        res = self.client.get(url, HTTP_RANGE="bytes=5-", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(res.streaming_content), b"file_content")
+
+    def test_expiring_link_range_not_satisfiable(self):
+        """Test requesting a byte range outside of the original image"""
+        url = self.generate_link()
+
+        res = self.client.get(url, HTTP_RANGE="bytes=100-")
+
+        self.assertEqual(
+            res.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+        )
+        self.assertEqual(res["Content-Range"], "bytes */12")
+
+    @override_settings(EXPIRING_LINK_DELIVERY="redirect")
+    def test_expiring_link_redirect(self):
+        """Test that the link redirects to a presigned storage URL in redirect mode"""
+        url = self.generate_link()
+
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_302_FOUND)
+
+        res2 = self.client.get(res["Location"])
+        self.assertEqual(res2.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(res2.streaming_content), b"file_content")
+
+    @override_settings(EXPIRING_LINK_DELIVERY="redirect")
+    def test_expiring_link_redirect_expired_link(self):
+        """Test that an expired link is not redirected even if still cached"""
+        url = self.generate_link()
+        link = ExpiringLink.objects.get()
+        ExpiringLink.objects.update(expires_at="2000-01-01T00:00:30Z")
+        cache.delete(str(link.alias))
+
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_410_GONE)
+
+    @override_settings(EXPIRING_LINK_DELIVERY="redirect")
+    def test_expiring_link_delivery_override(self):
+        """Test that the delivery mode of a link overrides the default one"""
+        url = self.generate_link()
+        link = ExpiringLink.objects.get()
+        link.delivery = ExpiringLink.Delivery.PROXY
+        link.save()
+
+        res = self.client.get(url)
+
+        self.assertIsInstance(res, FileResponse)
+
+    def test_expiring_link_resolved_from_cache(self):
+        """Test that a valid link is served without database queries"""
+        url = self.generate_link()
+
+        with self.assertNumQueries(0):
+            res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_expiring_link_evicted_from_cache(self):
+        """Test that a valid link missing in cache is resolved from the database and cached again"""
+        url = self.generate_link()
+        link = ExpiringLink.objects.get()
+        cache.set(str(link.alias), "valid")
+
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_unknown_link_negative_cache(self):
+        """Test that an unknown link reaches the database only once"""
+        url = reverse("images:image-link", kwargs={"alias": uuid.uuid4()})
+
+        with self.assertNumQueries(1):
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_410_GONE)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_410_GONE)
+
+    def test_admin_revoke(self):
+        """Test that links revoked in the admin stay revoked when their cache entries go away"""
+        url = self.generate_link()
+        link = ExpiringLink.objects.get()
+        admin = get_user_model().objects.create_superuser("admin", password="pass")
+        admin_client = Client()
+        admin_client.force_login(admin)
+
+        res = admin_client.post(
+            reverse("admin:images_expiringlink_changelist"),
+            {"action": "revoke", "_selected_action": [link.pk]},
+            follow=True,
+        )
+
+        notes = [str(message) for message in res.context["messages"]]
+        self.assertEqual(notes[0], "Revoked 1 links.")
+        self.assertIn("EXPIRING_LINK_REVOCATION_CHECK", notes[1])
+        link.refresh_from_db()
+        self.assertTrue(link.is_expired)
+        link.save()
+        cache.clear()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_410_GONE)
+
+
+@override_settings(EXPIRING_LINK_FORMAT="signed")
+class SignedExpiringLinksApiTests(TestCase):
+    """Test stateless signed expiring links"""
+
+    setUp = PrivateExpiringLinksApiTests.setUp
+    tearDown = PrivateExpiringLinksApiTests.tearDown
+    generate_link = PrivateExpiringLinksApiTests.generate_link
+
+    def test_signed_link_generated(self):
+        """Test that a signed link is audited after commit instead of being written on the request path"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            url = self.generate_link()
+
+        self.assertIn("/link/s/", url)
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(ExpiringLink.objects.exists())
+
+    def test_signed_link_served_without_queries(self):
+        """Test that a signed link with cached file metadata is served without database queries"""
+        url = self.generate_link()
+        self.client.get(url)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_signed_link_tampered(self):
+        """Test that a signed link with a modified payload is rejected"""
+        url = self.generate_link()
+        key_id, payload, signature = url.rstrip("/").rsplit("/", 1)[1].split(".")
+        payload = ("A" if payload[0] != "A" else "B") + payload[1:]
+        token = ".".join((key_id, payload, signature))
+
+        res = self.client.get(
+            reverse("images:signed-image-link", kwargs={"token": token})
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_signed_link_expired(self):
+        """Test that an expired signed link is gone"""
+        token, _ = sign_link(self.image.id, int(time.time()) - 1)
+
+        res = self.client.get(
+            reverse("images:signed-image-link", kwargs={"token": token})
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_410_GONE)
+
+    def test_signed_link_revoked(self):
+        """Test that a revoked signed link is rejected when the revocation list is checked"""
+        token, alias = sign_link(self.image.id, int(time.time()) + 300)
+        revoke_link(alias, 300)
+        url = reverse("images:signed-image-link", kwargs={"token": token})
+
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        with self.settings(EXPIRING_LINK_REVOCATION_CHECK=True):
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_signed_link_key_rotation(self):
+        """Test that links signed with a retired key stay valid until the key is removed"""
+        keys = {"1": "old-key", "2": "new-key"}
+        with self.settings(
+            EXPIRING_LINK_SIGNING_KEYS=keys, EXPIRING_LINK_SIGNING_KEY_ID="2"
+        ):
+            token, _ = sign_link(self.image.id, int(time.time()) + 300, key_id="1")
+            url = reverse("images:signed-image-link", kwargs={"token": token})
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+        with self.settings(EXPIRING_LINK_SIGNING_KEYS={"2": "new-key"}):
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BulkExpiringLinksApiTests(TestCase):
+    """Test generating expiring links for several images at once"""
+
+    setUp = PrivateExpiringLinksApiTests.setUp
+    tearDown = PrivateExpiringLinksApiTests.tearDown
+    url = reverse("images:generate-links")
+
+    def test_generate_links(self):
+        """Test that links for all images are generated with a constant number of queries and served from cache"""
+        images = [self.image] + [sample_image(user=self.user) for _ in range(4)]
+        image_ids = [str(image.id) for image in images]
+
+        # permissions, ownership check and a single insert
+        with self.assertNumQueries(3):
+            res = self.client.post(
+                self.url, {"image_ids": image_ids, "expires_in": 300}, format="json"
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(list(res.data["urls"]), image_ids)
+        self.assertEqual(ExpiringLink.objects.count(), len(images))
+        for url in res.data["urls"].values():
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+    def test_generate_links_foreign_image(self):
+        """Test that no links are generated when any of the images belongs to another user"""
+        other = get_user_model().objects.create_user(username="other", password="pass")
+        foreign = sample_image(user=other)
+
+        res = self.client.post(
+            self.url,
+            {"image_ids": [str(self.image.id), str(foreign.id)], "expires_in": 300},
+            format="json",
+        )
+        shutil.rmtree(default_storage.path(f"./{other.id}"))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["image_ids"]["not_found"], [str(foreign.id)])
+        self.assertFalse(ExpiringLink.objects.exists())
+
+    def test_generate_links_invalid_expires_in(self):
+        """Test that the lifespan of the links is validated like for a single link"""
+        res = self.client.post(
+            self.url,
+            {"image_ids": [str(self.image.id)], "expires_in": 0},
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(EXPIRING_LINK_FORMAT="signed")
+    def test_generate_signed_links(self):
+        """Test that signed links are generated without writing on the request path"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            res = self.client.post(
+                self.url,
+                {"image_ids": [str(self.image.id)], "expires_in": 300},
+                format="json",
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertIn("/link/s/", res.data["urls"][str(self.image.id)])
+        self.assertEqual(len(callbacks), 1)
+
+
+class ExpiringLinkExpiryTests(TestCase):
+    """Test the expiry of links stored in the database and their purge"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="testuser", email="test@test.com", password="testpass"
+        )
+        self.image = sample_image(user=self.user)
+
+    tearDown = PrivateExpiringLinksApiTests.tearDown
+
+    def create_link(self, expires_at):
+        return ExpiringLink.objects.create(
+            image=self.image, expires_in=300, expires_at=expires_at
+        )
+
+    def test_expires_at_set_on_save(self):
+        """Test that the expiry time is set from the lifespan of the link"""
+        link = ExpiringLink.objects.create(image=self.image, expires_in=300)
+
+        self.assertAlmostEqual(
+            (link.expires_at - timezone.now()).total_seconds(), 300, delta=5
+        )
+        self.assertFalse(link.is_expired)
+
+    def test_is_expired_days_ago(self):
+        """Test that a link that expired days ago is expired"""
+        link = self.create_link(timezone.now() - timedelta(days=2))
+
+        self.assertTrue(link.is_expired)
+        self.assertEqual(link.remaining_seconds, 0)
+
+    def test_active_and_expired_querysets(self):
+        """Test that links are filtered by expiry in the database"""
+        active = self.create_link(timezone.now() + timedelta(minutes=5))
+        expired = self.create_link(timezone.now() - timedelta(days=2))
+
+        self.assertEqual(list(ExpiringLink.objects.active()), [active])
+        self.assertEqual(list(ExpiringLink.objects.expired()), [expired])
+
+    def test_purge_expired_links_in_batches(self):
+        """Test that expired links are deleted in batches, keeping active ones"""
+        active = self.create_link(timezone.now() + timedelta(minutes=5))
+        for _ in range(5):
+            self.create_link(timezone.now() - timedelta(minutes=5))
+
+        # a select and a delete per batch, the last batch being partial
+        with self.assertNumQueries(6):
+            count = purge_expired_links(batch_size=2)
+
+        self.assertEqual(count, 5)
+        self.assertEqual(list(ExpiringLink.objects.all()), [active])
+
+    def test_purge_expiring_links_command(self):
+        """Test that the command keeps links expired within the grace period"""
+        recent = self.create_link(timezone.now() - timedelta(hours=1))
+        self.create_link(timezone.now() - timedelta(days=2))
+        out = StringIO()
+
+        call_command("purge_expiring_links", keep_days=1, stdout=out)
+
+        self.assertIn("Deleted 1 expired links", out.getvalue())
+        self.assertEqual(list(ExpiringLink.objects.all()), [recent])
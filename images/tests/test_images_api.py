@@ -1,15 +1,23 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from io import BytesIO
+from unittest import mock
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group, Permission
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from images.listing import IMAGE_LIST_VERSION_CACHE_KEY
 from images.models import Image
+from lib.shared import USER_PERMISSIONS_GENERATION_CACHE_KEY, UserGroupPermissions
 from rest_framework.test import APIClient
 from rest_framework import status
 import tempfile
 from PIL import Image as PILImage
 import shutil
 from django.core.files.storage import default_storage
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from .shared import generate_expiring_link_url, sample_image
 
 IMAGES_URL = reverse("images:images-list")
@@ -96,11 +104,11 @@ class BasicUserImagesApiTests(TestCase):
         image.refresh_from_db()
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data["results"]), 1)
 
-        self.assertTrue(res.data[0].get("thumbnail_200"))
-        self.assertFalse(res.data[0].get("thumbnail_400"))
-        self.assertFalse(res.data[0].get("original_file"))
+        self.assertTrue(res.data["results"][0].get("thumbnail_200"))
+        self.assertFalse(res.data["results"][0].get("thumbnail_400"))
+        self.assertFalse(res.data["results"][0].get("original_file"))
 
     def test_upload_image(self):
         """Test uploading an image. Output should contain only 200px thumbnail."""
@@ -122,6 +130,7 @@ class BasicUserImagesApiTests(TestCase):
         self.assertFalse(res.data.get("original_file"))
 
         self.assertTrue(default_storage.exists(image.original_file.path))
+        self.assertEqual(image.content_type, "image/jpeg")
 
     def test_generate_expiring_link(self):
         """Test generating an expiring link with Basic Tier"""
@@ -161,11 +170,11 @@ class PremiumUserImagesApiTests(TestCase):
         image.refresh_from_db()
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data["results"]), 1)
 
-        self.assertTrue(res.data[0].get("thumbnail_200"))
-        self.assertTrue(res.data[0].get("thumbnail_400"))
-        self.assertFalse(res.data[0].get("original_file"))
+        self.assertTrue(res.data["results"][0].get("thumbnail_200"))
+        self.assertTrue(res.data["results"][0].get("thumbnail_400"))
+        self.assertFalse(res.data["results"][0].get("original_file"))
 
     def test_upload_image(self):
         """Test uploading an image. Output should contain 200px and 400px thumbnails."""
@@ -225,12 +234,14 @@ class EnterpriseUserImagesApiTests(TestCase):
         image.refresh_from_db()
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data["results"]), 1)
 
-        self.assertTrue(res.data[0].get("thumbnail_200"))
-        self.assertTrue(res.data[0].get("thumbnail_400"))
-        self.assertTrue(res.data[0].get("original_file"))
-        self.assertIn(image.original_file.name, res.data[0].get("original_file"))
+        self.assertTrue(res.data["results"][0].get("thumbnail_200"))
+        self.assertTrue(res.data["results"][0].get("thumbnail_400"))
+        self.assertTrue(res.data["results"][0].get("original_file"))
+        self.assertIn(
+            image.original_file.name, res.data["results"][0].get("original_file")
+        )
 
     def test_upload_image(self):
         """Test uploading an image. Output should contain original image, 200px and 400px thumbnails."""
@@ -310,11 +321,11 @@ class CustomTierUserImagesApiTests(TestCase):
         image.refresh_from_db()
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data["results"]), 1)
 
-        self.assertTrue(res.data[0].get("thumbnail_200"))
-        self.assertTrue(res.data[0].get("thumbnail_600"))
-        self.assertFalse(res.data[0].get("original_file"))
+        self.assertTrue(res.data["results"][0].get("thumbnail_200"))
+        self.assertTrue(res.data["results"][0].get("thumbnail_600"))
+        self.assertFalse(res.data["results"][0].get("original_file"))
 
     def test_upload_image(self):
         """Test uploading an image. Output should contain 200px and 600px thumbnails."""
@@ -354,3 +365,429 @@ class CustomTierUserImagesApiTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
         self.assertIn("url", res.data)
+
+
+class UserTierCacheTests(TestCase):
+    """Test resolving user tiers from cache"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="testuser", email="test@test.com", password="testpass"
+        )
+        self.basic_tier_group = Group.objects.get(name="BasicTierUsers")
+        self.basic_tier_group.user_set.add(self.user)
+        self.client.force_authenticate(self.user)
+        sample_image(user=self.user)
+
+    def tearDown(self):
+        """Remove media files after each test"""
+        path = default_storage.path(f"./{self.user.id}")
+        if default_storage.exists(path):
+            shutil.rmtree(path)
+
+    def test_warm_request_makes_no_permission_queries(self):
+        """Test that permissions are not queried once the tier is cached"""
+        self.client.get(IMAGES_URL)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(IMAGES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(
+            [q for q in queries.captured_queries if "auth_permission" in q["sql"]]
+        )
+
+    def test_user_groups_change_invalidates_tier(self):
+        """Test that adding the user to a group is reflected immediately"""
+        res = self.client.get(IMAGES_URL)
+        self.assertFalse(res.data["results"][0].get("thumbnail_400"))
+
+        Group.objects.get(name="PremiumTierUsers").user_set.add(self.user)
+
+        res = self.client.get(IMAGES_URL)
+        self.assertTrue(res.data["results"][0].get("thumbnail_400"))
+
+    def test_group_permissions_change_invalidates_tier(self):
+        """Test that changing permissions of a group is reflected immediately"""
+        res = self.client.get(IMAGES_URL)
+        self.assertFalse(res.data["results"][0].get("thumbnail_400"))
+
+        self.basic_tier_group.permissions.add(
+            Permission.objects.get(codename="thumbnail:400")
+        )
+
+        res = self.client.get(IMAGES_URL)
+        self.assertTrue(res.data["results"][0].get("thumbnail_400"))
+
+    def test_permissions_loaded_before_change_not_used(self):
+        """Test that permissions loaded before a tier change and cached after it are not used"""
+        load_permissions = UserGroupPermissions.load_permissions
+
+        def load_then_change(user):
+            permissions = load_permissions(user)
+            Group.objects.get(name="PremiumTierUsers").user_set.add(self.user)
+            return permissions
+
+        with mock.patch.object(
+            UserGroupPermissions, "load_permissions", side_effect=load_then_change
+        ):
+            UserGroupPermissions.get_user_permissions(self.user)
+
+        permissions = UserGroupPermissions.get_user_permissions(self.user)
+        self.assertTrue(permissions.has_perm("images.thumbnail:400"))
+
+    def test_evicted_generation_invalidates_tier(self):
+        """Test that group permission changes are reflected after the generation counter was evicted"""
+        self.client.get(IMAGES_URL)
+        cache.delete(USER_PERMISSIONS_GENERATION_CACHE_KEY)
+
+        self.basic_tier_group.permissions.add(
+            Permission.objects.get(codename="thumbnail:400")
+        )
+
+        res = self.client.get(IMAGES_URL)
+        self.assertTrue(res.data["results"][0].get("thumbnail_400"))
+
+    def test_permission_rename_invalidates_tier(self):
+        """Test that renaming a permission is reflected immediately"""
+        self.client.get(IMAGES_URL)
+        permission = Permission.objects.get(codename="thumbnail:200")
+
+        permission.codename = "thumbnail:250"
+        permission.save()
+
+        res = self.client.get(IMAGES_URL)
+        self.assertNotIn("thumbnail_200", res.data["results"][0])
+        self.assertTrue(res.data["results"][0].get("thumbnail_250"))
+
+
+class ImagesPaginationTests(TestCase):
+    """Test pagination of the images list"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="testuser", email="test@test.com", password="testpass"
+        )
+        Group.objects.get(name="BasicTierUsers").user_set.add(self.user)
+        self.client.force_authenticate(self.user)
+        self.images = [sample_image(user=self.user) for _ in range(5)]
+
+    def tearDown(self):
+        """Remove media files after each test"""
+        path = default_storage.path(f"./{self.user.id}")
+        if default_storage.exists(path):
+            shutil.rmtree(path)
+
+    def test_cursor_pagination(self):
+        """Test walking all pages with cursors returns every image once, newest first"""
+        ids = []
+        url = f"{IMAGES_URL}?page_size=2"
+        while url:
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(res.data["results"]), 2)
+            ids.extend(image["id"] for image in res.data["results"])
+            url = res.data.get("next")
+
+        expected = Image.objects.filter(user=self.user).order_by("-uploaded_at", "-id")
+        self.assertEqual(ids, [str(image.id) for image in expected])
+
+    def test_cursor_pagination_same_upload_time(self):
+        """Test that images uploaded at the same time are not skipped between pages"""
+        Image.objects.filter(user=self.user).update(
+            uploaded_at=self.images[0].uploaded_at
+        )
+
+        res = self.client.get(f"{IMAGES_URL}?page_size=3")
+        res2 = self.client.get(res.data["next"])
+        ids = {image["id"] for image in res.data["results"] + res2.data["results"]}
+
+        self.assertEqual(ids, {str(image.id) for image in self.images})
+        self.assertIsNone(res2.data.get("next"))
+
+    def test_invalid_cursor(self):
+        """Test that a malformed cursor is rejected"""
+        res = self.client.get(f"{IMAGES_URL}?cursor=invalid")
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_offset_pagination(self):
+        """Test that offset pagination is available when requested"""
+        res = self.client.get(f"{IMAGES_URL}?offset=1&limit=2")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["count"], 5)
+        self.assertEqual(len(res.data["results"]), 2)
+
+
+class ImagesListConditionalTests(TestCase):
+    """Test conditional requests for the images list"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="testuser", email="test@test.com", password="testpass"
+        )
+        Group.objects.get(name="BasicTierUsers").user_set.add(self.user)
+        self.client.force_authenticate(self.user)
+        self.image = sample_image(user=self.user)
+
+    def tearDown(self):
+        """Remove media files after each test"""
+        path = default_storage.path(f"./{self.user.id}")
+        if default_storage.exists(path):
+            shutil.rmtree(path)
+
+    def get_etag(self, url=IMAGES_URL):
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res["ETag"]
+
+    def test_not_modified(self):
+        """Test that an unchanged list is answered with 304 without any query"""
+        etag = self.get_etag()
+
+        with self.assertNumQueries(0):
+            res = self.client.get(IMAGES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res["ETag"], etag)
+        self.assertFalse(res.content)
+
+    def test_stale_etag(self):
+        """Test that a list is returned for an ETag that does not match"""
+        res = self.client.get(IMAGES_URL, HTTP_IF_NONE_MATCH='"stale"')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["results"]), 1)
+
+    def test_etag_changes_on_upload_and_delete(self):
+        """Test that uploading and deleting images changes the ETag once committed"""
+        etag = self.get_etag()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            image = sample_image(user=self.user)
+        etag2 = self.get_etag()
+        with self.captureOnCommitCallbacks(execute=True):
+            image.delete()
+        etag3 = self.get_etag()
+
+        self.assertEqual(len({etag, etag2, etag3}), 3)
+
+    def test_etag_changes_on_tier_change(self):
+        """Test that changing the tier of the user changes the ETag"""
+        etag = self.get_etag()
+
+        Group.objects.get(name="PremiumTierUsers").user_set.add(self.user)
+
+        self.assertNotEqual(self.get_etag(), etag)
+
+    def test_etag_survives_cache_eviction(self):
+        """Test that a version stamp missing in cache is derived from the images again"""
+        etag = self.get_etag()
+
+        cache.delete(IMAGE_LIST_VERSION_CACHE_KEY.format(user_id=self.user.pk))
+
+        self.assertEqual(self.get_etag(), etag)
+
+    def test_etag_depends_on_page(self):
+        """Test that pages of the list have distinct ETags"""
+        self.assertNotEqual(self.get_etag(), self.get_etag(f"{IMAGES_URL}?offset=0"))
+
+    def test_etag_depends_on_selection(self):
+        """Test that lists of different fields and thumbnails have distinct ETags, and equal selections equal ones"""
+        etags = [
+            self.get_etag(f"{IMAGES_URL}?fields=id,thumbnail_200"),
+            self.get_etag(f"{IMAGES_URL}?fields=id"),
+            self.get_etag(f"{IMAGES_URL}?thumbnails=200"),
+        ]
+
+        self.assertEqual(len(set(etags)), 3)
+        self.assertNotIn(self.get_etag(), etags)
+
+    def test_invalid_selection_with_etag(self):
+        """Test that an invalid selection is rejected even if the ETag matches"""
+        url = f"{IMAGES_URL}?fields=id,unknown"
+        etag = self.get_etag()
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        res2 = self.client.get(url, HTTP_IF_NONE_MATCH="*")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res2.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("fields", res2.data)
+
+
+class ImagesSparseFieldsetsTests(TestCase):
+    """Test selecting fields and thumbnails of listed images"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="testuser", email="test@test.com", password="testpass"
+        )
+        Group.objects.get(name="EnterpriseTierUsers").user_set.add(self.user)
+        self.client.force_authenticate(self.user)
+        sample_image(user=self.user)
+
+    def tearDown(self):
+        """Remove media files after each test"""
+        path = default_storage.path(f"./{self.user.id}")
+        if default_storage.exists(path):
+            shutil.rmtree(path)
+
+    def test_select_fields(self):
+        """Test that only selected fields are listed, without signing thumbnail URLs or loading other columns"""
+        with mock.patch(
+            "images.thumbnails.generate_thumbnail_urls"
+        ) as generate_thumbnail_urls, CaptureQueriesContext(connection) as queries:
+            res = self.client.get(f"{IMAGES_URL}?fields=id,uploaded_at")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(res.data["results"][0]), {"id", "uploaded_at"})
+        generate_thumbnail_urls.assert_not_called()
+        select = next(
+            q["sql"] for q in queries.captured_queries if "images_image" in q["sql"]
+        )
+        self.assertNotIn('"images_image"."original_file"', select)
+        self.assertNotIn('"images_image"."width"', select)
+
+    def test_select_thumbnails(self):
+        """Test that only selected thumbnails are listed, along with all fields"""
+        res = self.client.get(f"{IMAGES_URL}?thumbnails=400")
+
+        image = res.data["results"][0]
+        self.assertTrue(image.get("thumbnail_400"))
+        self.assertNotIn("thumbnail_200", image)
+        self.assertTrue(image.get("original_file"))
+
+    def test_select_thumbnails_as_fields(self):
+        """Test that thumbnails can be selected as fields"""
+        res = self.client.get(f"{IMAGES_URL}?fields=id,thumbnail_200")
+
+        self.assertEqual(set(res.data["results"][0]), {"id", "thumbnail_200"})
+
+    def test_select_unknown_field(self):
+        """Test that selecting an unknown field is rejected"""
+        res = self.client.get(f"{IMAGES_URL}?fields=id,user")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("fields", res.data)
+
+    def test_select_invalid_thumbnail(self):
+        """Test that selecting a thumbnail by an invalid height is rejected"""
+        res = self.client.get(f"{IMAGES_URL}?thumbnails=small")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("thumbnails", res.data)
+
+
+class BatchUploadApiTests(TestCase):
+    """Test uploading several images with a single request"""
+
+    url = reverse("images:batch-upload")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="testuser", email="test@test.com", password="testpass"
+        )
+        Group.objects.get(name="BasicTierUsers").user_set.add(self.user)
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        """Remove media files after each test"""
+        path = default_storage.path(f"./{self.user.id}")
+        if default_storage.exists(path):
+            shutil.rmtree(path)
+
+    def image_file(self, name="test.jpg", color="black"):
+        buffer = BytesIO()
+        PILImage.new("RGB", (10, 10), color).save(buffer, format="JPEG")
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+    def test_batch_upload(self):
+        """Test that all images of a batch are stored and inserted with a single query"""
+        files = [self.image_file(f"test{i}.jpg") for i in range(3)]
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(
+                self.url, {"original_files": files}, format="multipart"
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [result["filename"] for result in res.data["results"]],
+            ["test0.jpg", "test1.jpg", "test2.jpg"],
+        )
+        inserts = [
+            q for q in queries if q["sql"].startswith('INSERT INTO "images_image"')
+        ]
+        self.assertEqual(len(inserts), 1)
+        for result in res.data["results"]:
+            self.assertEqual(result["status"], status.HTTP_201_CREATED)
+            self.assertTrue(result["image"].get("thumbnail_200"))
+            image = Image.objects.get(id=result["image"]["id"])
+            self.assertTrue(default_storage.exists(image.original_file.name))
+            self.assertEqual(image.content_type, "image/jpeg")
+
+    def test_batch_upload_ignores_declared_content_type(self):
+        """Test that images of a batch store the content type of their detected format"""
+        file = self.image_file()
+        file.content_type = "text/html"
+
+        res = self.client.post(self.url, {"original_files": [file]}, format="multipart")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Image.objects.get().content_type, "image/jpeg")
+
+    def test_batch_upload_partial_failure(self):
+        """Test that invalid files do not abort the rest of the batch"""
+        files = [
+            self.image_file(),
+            SimpleUploadedFile("test.pdf", b"%PDF-1.4", content_type="application/pdf"),
+        ]
+
+        res = self.client.post(self.url, {"original_files": files}, format="multipart")
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        valid, invalid = res.data["results"]
+        self.assertEqual(valid["status"], status.HTTP_201_CREATED)
+        self.assertEqual(invalid["status"], status.HTTP_400_BAD_REQUEST)
+        self.assertIn("original_file", invalid["errors"])
+        self.assertEqual(Image.objects.count(), 1)
+
+    def test_batch_upload_storage_failure(self):
+        """Test that a failed storage write is reported for its file only"""
+        save = default_storage.save
+
+        def flaky_save(name, content, *args, **kwargs):
+            if content.name == "broken.jpg":
+                raise OSError("Storage unavailable")
+            return save(name, content, *args, **kwargs)
+
+        files = [self.image_file(), self.image_file("broken.jpg", color="white")]
+        with mock.patch.object(default_storage, "save", flaky_save):
+            res = self.client.post(
+                self.url, {"original_files": files}, format="multipart"
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(
+            [result["status"] for result in res.data["results"]],
+            [status.HTTP_201_CREATED, status.HTTP_502_BAD_GATEWAY],
+        )
+        self.assertEqual(Image.objects.count(), 1)
+
+    @override_settings(BATCH_UPLOAD_MAX_FILES=2)
+    def test_batch_upload_too_many_files(self):
+        """Test that batches over the limit are rejected"""
+        files = [self.image_file() for _ in range(3)]
+
+        res = self.client.post(self.url, {"original_files": files}, format="multipart")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Image.objects.exists())
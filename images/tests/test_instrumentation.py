@@ -0,0 +1,124 @@
+import shutil
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.files.storage import default_storage
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from lib.instrumentation import (
+    RequestTimings,
+    ServerTimingMiddleware,
+    _request_timings,
+    span,
+)
+from .shared import sample_image
+
+IMAGES_URL = reverse("images:images-list")
+
+
+def parse_server_timing(header):
+    """Parses a `Server-Timing` header into a dict of metric parameters by metric name"""
+    metrics = {}
+    for metric in header.split(", "):
+        name, *params = metric.split(";")
+        metrics[name] = dict(param.split("=", 1) for param in params)
+    return metrics
+
+
+class SpanTests(TestCase):
+    """Test recording spans"""
+
+    def test_span_outside_request(self):
+        """Test that spans are no-ops when the request is not sampled"""
+        with span("db"):
+            pass
+
+        self.assertIsNone(_request_timings.get())
+
+    def test_nested_spans(self):
+        """Test that spans nested in a span of the same name are not recorded twice"""
+        timings = RequestTimings()
+        token = _request_timings.set(timings)
+        try:
+            with span("cache"):
+                with span("cache"):
+                    pass
+                with span("db"):
+                    pass
+            with span("cache"):
+                pass
+        finally:
+            _request_timings.reset(token)
+
+        self.assertEqual(timings.spans["cache"][1], 2)
+        self.assertEqual(timings.spans["db"][1], 1)
+
+
+@override_settings(SERVER_TIMING_SAMPLE_RATE=1.0, SERVER_TIMING_HEADER=True)
+class ServerTimingMiddlewareTests(TestCase):
+    """Test timing requests with the Server-Timing middleware"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="testuser", email="test@test.com", password="testpass"
+        )
+        Group.objects.get(name="EnterpriseTierUsers").user_set.add(self.user)
+        self.client.force_authenticate(self.user)
+        sample_image(user=self.user)
+
+    def tearDown(self):
+        """Remove media files after each test"""
+        path = default_storage.path(f"./{self.user.id}")
+        if default_storage.exists(path):
+            shutil.rmtree(path)
+
+    def test_server_timing_header(self):
+        """Test that a sampled request reports its hot paths and logs a summary"""
+        with self.assertLogs("lib.instrumentation", "INFO") as logs:
+            res = self.client.get(IMAGES_URL, HTTP_ACCEPT="application/json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        metrics = parse_server_timing(res["Server-Timing"])
+        for name in ("db", "cache", "permissions", "sign", "render", "total"):
+            self.assertIn(name, metrics)
+        self.assertEqual(metrics["permissions"]["desc"], '"1 calls"')
+        summary = logs.records[0].timings
+        self.assertEqual(summary["path"], IMAGES_URL)
+        self.assertEqual(summary["status"], 200)
+        self.assertEqual(summary["spans"]["permissions"]["count"], 1)
+
+    @override_settings(SERVER_TIMING_HEADER=False)
+    def test_header_disabled(self):
+        """Test that the header can be disabled while summaries are still logged"""
+        with self.assertLogs("lib.instrumentation", "INFO"):
+            res = self.client.get(IMAGES_URL)
+
+        self.assertNotIn("Server-Timing", res)
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0.0)
+    def test_not_sampled(self):
+        """Test that requests that are not sampled are not timed"""
+        res = self.client.get(IMAGES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn("Server-Timing", res)
+
+    async def test_async_request(self):
+        """Test that async requests are timed without being run through a thread"""
+
+        async def get_response(request):
+            with span("db"):
+                return HttpResponse()
+
+        middleware = ServerTimingMiddleware(get_response)
+
+        self.assertTrue(iscoroutinefunction(middleware))
+        with self.assertLogs("lib.instrumentation", "INFO"):
+            res = await middleware(RequestFactory().get(IMAGES_URL))
+
+        metrics = parse_server_timing(res["Server-Timing"])
+        self.assertEqual(metrics["db"]["desc"], '"1 calls"')
@@ -0,0 +1,147 @@
+import shutil
+import threading
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.files.storage import default_storage
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from lib.metrics import (
+    REGISTRY,
+    REQUEST_DURATION,
+    Counter,
+    Histogram,
+    MetricsMiddleware,
+    MetricsRegistry,
+)
+from images.models import ExpiringLink
+from .shared import sample_image
+
+METRICS_URL = reverse("metrics")
+
+
+class MetricsRegistryTests(SimpleTestCase):
+    """Test collecting metrics per thread"""
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        self.counter = Counter("test_total", "Test counter.", registry=self.registry)
+        self.histogram = Histogram(
+            "test_seconds", "Test histogram.", buckets=(0.1, 1), registry=self.registry
+        )
+
+    def test_values_merged_across_threads(self):
+        """Test that values recorded by different threads are merged when exposed"""
+
+        def record():
+            for _ in range(100):
+                self.counter.inc(kind="a")
+            self.histogram.observe(0.5)
+
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.counter.inc(2, kind="b")
+
+        # the stores of the ended threads are folded together when the main thread adds its own
+        self.assertEqual(len(self.registry.stores), 1)
+        lines = self.registry.expose().splitlines()
+        self.assertIn('test_total{kind="a"} 400', lines)
+        self.assertIn('test_total{kind="b"} 2', lines)
+        self.assertIn("# TYPE test_seconds histogram", lines)
+        self.assertIn('test_seconds_bucket{le="0.1"} 0', lines)
+        self.assertIn('test_seconds_bucket{le="1"} 4', lines)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 4', lines)
+        self.assertIn("test_seconds_sum 2.0", lines)
+        self.assertIn("test_seconds_count 4", lines)
+
+    def test_stores_of_ended_threads_retired(self):
+        """Test that stores of ended threads are dropped when collected, keeping their values"""
+        self.counter.inc()
+        threads = [threading.Thread(target=self.counter.inc) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+            thread.join()
+
+        for _ in range(2):
+            self.assertEqual(self.registry.collect()[("test_total", ())], 4)
+            self.assertEqual(len(self.registry.stores), 1)
+
+    async def test_async_middleware(self):
+        """Test that async requests are timed without being run through a thread"""
+
+        async def get_response(request):
+            return HttpResponse()
+
+        middleware = MetricsMiddleware(get_response)
+        key = (REQUEST_DURATION.name, (("method", "GET"), ("view", "unresolved")))
+        before = REGISTRY.collect().get(key, [[], 0])
+
+        self.assertTrue(iscoroutinefunction(middleware))
+        res = await middleware(RequestFactory().get("/"))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(sum(REGISTRY.collect()[key][0]), sum(before[0]) + 1)
+
+    def test_label_values_escaped(self):
+        """Test that quotes and backslashes in label values are escaped"""
+        self.counter.inc(path='a"b\\c')
+
+        self.assertIn('test_total{path="a\\"b\\\\c"} 1', self.registry.expose())
+
+
+class MetricsEndpointTests(TestCase):
+    """Test the Prometheus metrics endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="testuser", email="test@test.com", password="testpass"
+        )
+        Group.objects.get(name="EnterpriseTierUsers").user_set.add(self.user)
+        self.client.force_authenticate(self.user)
+        self.image = sample_image(user=self.user)
+
+    def tearDown(self):
+        """Remove media files after each test"""
+        path = default_storage.path(f"./{self.user.id}")
+        if default_storage.exists(path):
+            shutil.rmtree(path)
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_endpoint_disabled(self):
+        """Test that the endpoint is disabled without a token"""
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_token_required(self):
+        """Test that scrapers have to authenticate with the token"""
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION="Bearer wrong")
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics(self):
+        """Test that requests, link cache lookups and served bytes are exposed"""
+        link = ExpiringLink.objects.create(image=self.image, expires_in=300)
+        self.client.get(reverse("images:image-link", args=[link.alias]))
+
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION="Bearer secret")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res["Content-Type"].startswith("text/plain; version=0.0.4"))
+        content = res.content.decode()
+        self.assertIn(
+            'imagify_request_duration_seconds_count{method="GET",view="images:image-link"}',
+            content,
+        )
+        self.assertIn('imagify_expiring_link_cache_total{result="miss"}', content)
+        self.assertIn('imagify_storage_bytes_total{direction="out"}', content)
+        self.assertIn('imagify_storage_bytes_total{direction="in"}', content)
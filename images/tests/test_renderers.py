@@ -0,0 +1,138 @@
+import datetime
+import json
+import shutil
+import uuid
+from decimal import Decimal
+from unittest import mock, skipIf
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.files.storage import default_storage
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from images import renderers
+from images.renderers import NonNullJSONRenderer
+from images.views import UserImagesView
+from .shared import sample_image
+
+IMAGES_URL = reverse("images:images-list")
+
+DATA = {
+    "next": None,
+    "results": [
+        {
+            "id": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+            "uploaded_at": datetime.datetime(2023, 1, 2, 3, 4, 5, 678000),
+            "thumbnail_200": "http://testserver/żółw.png",
+            "thumbnail_400": None,
+            "meta": {"size": Decimal("1.5"), "tags": ["a", None], "link": None},
+            "flags": (True, False, 0, 2.5),
+        }
+    ],
+}
+EXPECTED = {
+    "results": [
+        {
+            "id": "12345678-1234-5678-1234-567812345678",
+            "uploaded_at": "2023-01-02T03:04:05.678000",
+            "thumbnail_200": "http://testserver/żółw.png",
+            "meta": {"size": 1.5, "tags": ["a", None]},
+            "flags": [True, False, 0, 2.5],
+        }
+    ],
+}
+
+
+class NonNullJSONRendererTests(SimpleTestCase):
+    """Test rendering JSON without null values"""
+
+    def render(self, data, media_type="application/json"):
+        return NonNullJSONRenderer().render(data, media_type, {})
+
+    def test_render_stdlib(self):
+        """Test that nulls are omitted from objects at any depth with the standard library encoder"""
+        with mock.patch.object(renderers, "orjson", None):
+            content = self.render(DATA)
+
+        self.assertEqual(json.loads(content), EXPECTED)
+        self.assertNotIn(b" ", content)
+
+    @skipIf(renderers.orjson is None, "orjson is not installed")
+    def test_render_orjson(self):
+        """Test that nulls are omitted from objects at any depth with orjson"""
+        self.assertEqual(json.loads(self.render(DATA)), EXPECTED)
+
+    def test_render_matches_stdlib_renderer(self):
+        """Test that the output matches the output of the stock renderer on data without nulls"""
+        with mock.patch.object(renderers, "orjson", None):
+            content = self.render(DATA)
+
+        self.assertEqual(content, JSONRenderer().render(EXPECTED))
+
+    def test_render_indented(self):
+        """Test that indented output omits nulls too"""
+        content = self.render(DATA, "application/json; indent=4")
+
+        self.assertEqual(json.loads(content), EXPECTED)
+        self.assertIn(b"\n    ", content)
+
+    def test_render_strict(self):
+        """Test that non-finite floats are rejected by the standard library encoder"""
+        with mock.patch.object(renderers, "orjson", None):
+            with self.assertRaises(ValueError):
+                self.render({"value": float("nan")})
+
+    def test_iter_render(self):
+        """Test that data is rendered in chunks of roughly the chunk size"""
+        renderer = NonNullJSONRenderer()
+        renderer.chunk_size = 100
+
+        chunks = list(renderer.iter_render(DATA | {"results": DATA["results"] * 10}))
+
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(
+            json.loads(b"".join(chunks)), {"results": EXPECTED["results"] * 10}
+        )
+
+
+class StreamingListTests(TestCase):
+    """Test streaming large pages of the images list"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="testuser", email="test@test.com", password="testpass"
+        )
+        Group.objects.get(name="BasicTierUsers").user_set.add(self.user)
+        self.client.force_authenticate(self.user)
+        for _ in range(3):
+            sample_image(user=self.user)
+
+    def tearDown(self):
+        """Remove media files after each test"""
+        path = default_storage.path(f"./{self.user.id}")
+        if default_storage.exists(path):
+            shutil.rmtree(path)
+
+    def test_large_page_is_streamed(self):
+        """Test that pages holding many images are streamed"""
+        with mock.patch.object(UserImagesView, "streaming_min_items", 3):
+            res = self.client.get(IMAGES_URL, HTTP_ACCEPT="application/json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res["Content-Type"], "application/json")
+        data = json.loads(b"".join(res.streaming_content))
+        self.assertEqual(len(data["results"]), 3)
+        self.assertNotIn("next", data)
+        self.assertNotIn("thumbnail_400", data["results"][0])
+
+    def test_small_page_is_not_streamed(self):
+        """Test that small pages are rendered at once"""
+        res = self.client.get(IMAGES_URL, HTTP_ACCEPT="application/json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(res.streaming)
+        self.assertEqual(len(res.json()["results"]), 3)
@@ -0,0 +1,215 @@
+import os
+import shutil
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image as PILImage
+from rest_framework import status
+from rest_framework.test import APIClient
+from images.models import Image, UploadSession
+
+UPLOAD_SESSIONS_URL = reverse("images:upload-sessions")
+CHUNK_SIZE = 256
+
+
+def session_url(session_id):
+    return reverse("images:upload-session", args=[session_id])
+
+
+def complete_url(session_id):
+    return reverse("images:upload-session-complete", args=[session_id])
+
+
+@override_settings(RESUMABLE_UPLOAD_CHUNK_SIZE=CHUNK_SIZE)
+class ResumableUploadsApiTests(TestCase):
+    """Test uploading images in chunks"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="testuser", email="test@test.com", password="testpass"
+        )
+        Group.objects.get(name="BasicTierUsers").user_set.add(self.user)
+        self.client.force_authenticate(self.user)
+
+        buffer = BytesIO()
+        PILImage.effect_noise((40, 40), 64).convert("RGB").save(buffer, format="JPEG")
+        self.content = buffer.getvalue()
+        self.chunks = [
+            self.content[i : i + CHUNK_SIZE]
+            for i in range(0, len(self.content), CHUNK_SIZE)
+        ]
+
+    def tearDown(self):
+        """Remove media files after each test"""
+        path = default_storage.path(f"./{self.user.id}")
+        if default_storage.exists(path):
+            shutil.rmtree(path)
+
+    def start(self, size=None):
+        res = self.client.post(
+            UPLOAD_SESSIONS_URL,
+            {
+                "filename": "test.jpg",
+                "content_type": "image/jpeg",
+                "size": size or len(self.content),
+            },
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return res.data
+
+    def put_chunk(self, session, number):
+        url = session["chunks"][number - 1]["url"]
+        res = self.client.put(
+            url, self.chunks[number - 1], content_type="application/octet-stream"
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.has_header("ETag"))
+
+    def test_resumable_upload(self):
+        """Test uploading chunks out of order, resuming from the reported offset and finalizing the upload"""
+        session = self.start()
+        self.assertGreater(len(self.chunks), 2)
+        self.assertEqual(len(session["chunks"]), len(self.chunks))
+
+        self.put_chunk(session, 1)
+        self.put_chunk(session, 3)
+
+        res = self.client.get(session_url(session["id"]))
+        self.assertEqual(res.data["offset"], CHUNK_SIZE)
+        self.assertEqual(res.data["chunks"], [1, 3])
+
+        res = self.client.post(complete_url(session["id"]))
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("2", res.data["chunks"]["missing"])
+
+        for number in range(2, len(self.chunks) + 1):
+            self.put_chunk(session, number)
+        res = self.client.post(complete_url(session["id"]))
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(res.data.get("thumbnail_200"))
+        image = Image.objects.get(id=res.data["id"])
+        with default_storage.open(image.original_file.name) as file:
+            self.assertEqual(file.read(), self.content)
+        self.assertEqual(image.content_type, "image/jpeg")
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_resumable_upload_prewarms_thumbnails(self):
+        """Test that finalizing an upload pre-warms thumbnails of all heights the uploader can access"""
+        session = self.start()
+        for number in range(1, len(self.chunks) + 1):
+            self.put_chunk(session, number)
+
+        with mock.patch("images.views.prewarm_thumbnails") as prewarm:
+            res = self.client.post(complete_url(session["id"]))
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        name = Image.objects.get(id=res.data["id"]).original_file.name
+        prewarm.assert_called_once_with([(name, "200")])
+
+    def test_chunk_over_request_body_limit(self):
+        """Test that chunks of the default size, larger than Django's in-memory request body limit, are accepted"""
+        size = settings.DATA_UPLOAD_MAX_MEMORY_SIZE + 512 * 1024
+        with self.settings(RESUMABLE_UPLOAD_CHUNK_SIZE=8 * 1024 * 1024):
+            session = self.start(size=size)
+            res = self.client.put(
+                session["chunks"][0]["url"],
+                b"\0" * size,
+                content_type="application/octet-stream",
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.get(session_url(session["id"]))
+        self.assertEqual(res.data["offset"], size)
+
+    def test_invalid_chunk_url(self):
+        """Test that chunks sent to an invalid presigned URL are refused"""
+        url = reverse("images:upload-part-local", kwargs={"token": "invalid"})
+
+        res = self.client.put(url, b"data", content_type="application/octet-stream")
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_upload_size_mismatch(self):
+        """Test that chunks not adding up to the announced size are rejected"""
+        session = self.start(size=len(self.content) + 1)
+        for number in range(1, len(self.chunks) + 1):
+            self.put_chunk(session, number)
+
+        res = self.client.post(complete_url(session["id"]))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Image.objects.exists())
+
+    @override_settings(RESUMABLE_UPLOAD_MAX_SIZE=100)
+    def test_upload_too_large(self):
+        """Test that sessions for files over the size limit are refused"""
+        res = self.client.post(
+            UPLOAD_SESSIONS_URL,
+            {"filename": "test.jpg", "content_type": "image/jpeg", "size": 101},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_session_of_other_user(self):
+        """Test that sessions are only accessible to their owner"""
+        session = self.start()
+        other = get_user_model().objects.create_user(username="other", password="pass")
+        self.client.force_authenticate(other)
+
+        res = self.client.get(session_url(session["id"]))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_abort_upload(self):
+        """Test that aborting a session discards its chunks"""
+        session = self.start()
+        self.put_chunk(session, 1)
+        upload_id = UploadSession.objects.get().upload_id
+
+        res = self.client.delete(session_url(session["id"]))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(
+            os.path.exists(os.path.join(settings.MULTIPART_UPLOAD_TEMP_DIR, upload_id))
+        )
+
+    def test_missing_upload_parts(self):
+        """Test that an upload whose parts are gone has no parts and can be aborted again"""
+        self.start()
+        session = UploadSession.objects.get()
+        shutil.rmtree(
+            os.path.join(settings.MULTIPART_UPLOAD_TEMP_DIR, session.upload_id)
+        )
+
+        self.assertEqual(
+            default_storage.list_parts(session.name, session.upload_id), []
+        )
+        default_storage.abort_multipart_upload(session.name, session.upload_id)
+
+    def test_purge_expired_sessions(self):
+        """Test that expired sessions are aborted by the purge command"""
+        self.start()
+        live = self.start()
+        UploadSession.objects.exclude(id=live["id"]).update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        out = StringIO()
+        call_command("purge_upload_sessions", stdout=out)
+
+        self.assertIn("Aborted 1", out.getvalue())
+        self.assertEqual(
+            list(UploadSession.objects.values_list("id", flat=True)), [live["id"]]
+        )
+        self.client.delete(session_url(live["id"]))
@@ -0,0 +1,265 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from rest_framework.test import APIClient
+from unittest import mock
+import shutil
+from images import aws
+from images import thumbnails as thumbnails_module
+from images.models import Image
+from images.thumbnails import (
+    LocalThumbnailBackend,
+    get_queued_thumbnails,
+    prewarm_thumbnails,
+    render_thumbnail,
+)
+from PIL import Image as PILImage
+from io import BytesIO
+from django.core.files.uploadedfile import SimpleUploadedFile
+from .shared import sample_image
+
+IMAGES_URL = reverse("images:images-list")
+
+
+@override_settings(THUMBNAIL_URL_EXPIRES_IN=3600, THUMBNAIL_URL_REUSE_FRACTION=0.5)
+class ThumbnailUrlCacheTests(TestCase):
+    """Test reusing signed thumbnail URLs"""
+
+    def setUp(self):
+        aws._signed_thumbnail_urls.update(period=None, urls={})
+        cache.clear()
+
+    def test_url_reused_within_period(self):
+        """Test that the same URL is handed out within a reuse period"""
+        with mock.patch("images.aws.time.time", return_value=36000.0):
+            url = aws.generate_thumbnail_url("media/1/original/a.jpg", "200")
+        with mock.patch("images.aws.time.time", return_value=37790.0):
+            url2 = aws.generate_thumbnail_url("media/1/original/a.jpg", "200")
+
+        self.assertEqual(url, url2)
+
+    def test_url_reused_across_processes(self):
+        """Test that a URL signed by another process is read from cache"""
+        with mock.patch("images.aws.time.time", return_value=36000.0):
+            url = aws.generate_thumbnail_url("media/1/original/a.jpg", "200")
+            aws._signed_thumbnail_urls.update(period=None, urls={})
+            with mock.patch.object(aws, "_sign_thumbnail_url") as sign:
+                url2 = aws.generate_thumbnail_url("media/1/original/a.jpg", "200")
+
+        sign.assert_not_called()
+        self.assertEqual(url, url2)
+
+    def test_url_resigned_in_next_period(self):
+        """Test that a new URL with the period-aligned expiry is signed once the reuse period ends"""
+        with mock.patch.object(aws, "_sign_thumbnail_url", return_value="url") as sign:
+            with mock.patch("images.aws.time.time", return_value=36000.0):
+                aws.generate_thumbnail_url("media/1/original/a.jpg", "200")
+            with mock.patch("images.aws.time.time", return_value=37800.0):
+                aws.generate_thumbnail_url("media/1/original/a.jpg", "200")
+
+        self.assertEqual(
+            sign.call_args_list,
+            [
+                mock.call("media/1/original/a.jpg", "200", 3600),
+                mock.call("media/1/original/a.jpg", "200", 3600),
+            ],
+        )
+
+    def test_list_signs_page_in_one_batch(self):
+        """Test that thumbnail URLs of a listed page are retrieved with a single batch call"""
+        user = get_user_model().objects.create_user(
+            username="testuser", email="test@test.com", password="testpass"
+        )
+        Group.objects.get(name="PremiumTierUsers").user_set.add(user)
+        for _ in range(3):
+            sample_image(user=user)
+        client = APIClient()
+        client.force_authenticate(user)
+
+        with mock.patch(
+            "images.thumbnails.generate_thumbnail_urls",
+            wraps=aws.generate_thumbnail_urls,
+        ) as generate:
+            res = client.get(IMAGES_URL)
+            res2 = client.get(IMAGES_URL)
+
+        shutil.rmtree(default_storage.path(f"./{user.id}"))
+        self.assertEqual(generate.call_count, 2)
+        self.assertEqual(res.data["results"], res2.data["results"])
+
+
+def sample_jpeg(width=800, height=600, format="JPEG"):
+    """Create and return sample encoded image bytes"""
+    output = BytesIO()
+    PILImage.new("RGB", (width, height), color="red").save(output, format=format)
+    return output.getvalue()
+
+
+@override_settings(
+    THUMBNAIL_BACKEND="images.thumbnails.LocalThumbnailBackend",
+    THUMBNAIL_LOCAL_WORKERS=0,
+)
+class LocalThumbnailBackendTests(TestCase):
+    """Test generating thumbnails with the local backend"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="testuser", email="test@test.com", password="testpass"
+        )
+        Group.objects.get(name="PremiumTierUsers").user_set.add(self.user)
+        self.client.force_authenticate(self.user)
+        self.image = sample_image(
+            user=self.user,
+            original_file=SimpleUploadedFile(
+                "test.jpg", sample_jpeg(), content_type="image/jpeg"
+            ),
+        )
+
+    def tearDown(self):
+        """Remove media files after each test"""
+        path = default_storage.path(f"./{self.user.id}")
+        if default_storage.exists(path):
+            shutil.rmtree(path)
+
+    def test_render_thumbnail(self):
+        """Test rendering thumbnails of JPEG and PNG images"""
+        for format in ("JPEG", "PNG"):
+            thumbnail = PILImage.open(
+                BytesIO(render_thumbnail(sample_jpeg(format=format), 200))
+            )
+
+            self.assertEqual(thumbnail.format, format)
+            self.assertEqual(thumbnail.size, (267, 200))
+
+    def test_render_thumbnail_invalid(self):
+        """Test rendering a thumbnail of data that is not an image"""
+        self.assertIsNone(render_thumbnail(b"file_content", 200))
+
+    def test_retrieve_images(self):
+        """Test that thumbnails are generated to storage and served from there afterwards"""
+        backend = LocalThumbnailBackend()
+        name = backend.get_thumbnail_name(self.image.original_file.name, "400")
+
+        res = self.client.get(IMAGES_URL)
+
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(
+            res.data["results"][0].get("thumbnail_400"), default_storage.url(name)
+        )
+        with default_storage.open(name) as thumbnail:
+            self.assertEqual(PILImage.open(thumbnail).height, 400)
+
+        with mock.patch("images.thumbnails.render_thumbnail") as render:
+            res2 = self.client.get(IMAGES_URL)
+
+        render.assert_not_called()
+        self.assertEqual(res.data["results"], res2.data["results"])
+
+    def test_missing_thumbnails_queued_on_access(self):
+        """Test that listing queues missing thumbnails once instead of rendering them in the request"""
+        backend = LocalThumbnailBackend()
+        original = self.image.original_file.name
+
+        with mock.patch.object(
+            thumbnails_module.generate_thumbnails, "enqueue"
+        ) as enqueue, mock.patch("images.thumbnails.render_thumbnail") as render:
+            res = self.client.get(IMAGES_URL)
+            self.client.get(IMAGES_URL)
+
+        render.assert_not_called()
+        enqueue.assert_called_once()
+        self.assertCountEqual(
+            enqueue.call_args.args[0][0], [(original, "200"), (original, "400")]
+        )
+        self.assertEqual(
+            res.data["results"][0].get("thumbnail_400"),
+            default_storage.url(backend.get_thumbnail_name(original, "400")),
+        )
+
+    @override_settings(THUMBNAIL_LOCAL_WORKERS=1)
+    def test_retrieve_images_process_pool(self):
+        """Test generating thumbnails in a process pool"""
+        res = self.client.get(IMAGES_URL)
+
+        self.assertTrue(res.data["results"][0].get("thumbnail_200"))
+        self.assertTrue(res.data["results"][0].get("thumbnail_400"))
+
+
+@override_settings(
+    THUMBNAIL_BACKEND="images.thumbnails.LocalThumbnailBackend",
+    THUMBNAIL_LOCAL_WORKERS=0,
+    THUMBNAIL_PREWARM=True,
+)
+class ThumbnailPrewarmTests(TestCase):
+    """Test pre-warming thumbnails of uploaded images"""
+
+    setUp = LocalThumbnailBackendTests.setUp
+    tearDown = LocalThumbnailBackendTests.tearDown
+
+    def prewarm(self, thumbnails):
+        """Pre-warm thumbnails, running the queued task eagerly"""
+        with self.captureOnCommitCallbacks(execute=True):
+            prewarm_thumbnails(thumbnails)
+
+    def test_upload_prewarms_granted_heights(self):
+        """Test that an upload pre-warms thumbnails of all heights the uploader can access"""
+        with mock.patch("images.views.prewarm_thumbnails") as prewarm:
+            res = self.client.post(
+                reverse("images:image-upload"),
+                {"original_file": SimpleUploadedFile("test.jpg", sample_jpeg())},
+                format="multipart",
+            )
+
+        self.assertEqual(res.status_code, 201)
+        name = Image.objects.get(id=res.data["id"]).original_file.name
+        prewarm.assert_called_once()
+        self.assertCountEqual(prewarm.call_args.args[0], [(name, "200"), (name, "400")])
+
+    def test_prewarm_generates_thumbnails(self):
+        """Test that pre-warming generates thumbnails to the storage"""
+        backend = LocalThumbnailBackend()
+        original = self.image.original_file.name
+
+        self.prewarm([(original, "200"), (original, "400")])
+
+        for height in ("200", "400"):
+            self.assertTrue(
+                default_storage.exists(backend.get_thumbnail_name(original, height))
+            )
+        self.assertEqual(
+            get_queued_thumbnails([(original, "200"), (original, "400")]), set()
+        )
+
+    def test_prewarm_skips_existing(self):
+        """Test that thumbnails that already exist are not generated again"""
+        original = self.image.original_file.name
+        self.prewarm([(original, "200")])
+
+        with mock.patch("images.thumbnails.render_thumbnail") as render:
+            self.prewarm([(original, "200")])
+
+        render.assert_not_called()
+
+    def test_queued_thumbnails_not_generated_on_access(self):
+        """Test that thumbnails queued for pre-warming are not generated by the listing"""
+        original = self.image.original_file.name
+        with mock.patch.object(thumbnails_module.generate_thumbnails, "enqueue"):
+            self.prewarm([(original, "200"), (original, "400")])
+
+        with mock.patch("images.thumbnails.render_thumbnail") as render:
+            res = self.client.get(IMAGES_URL)
+
+        render.assert_not_called()
+        self.assertTrue(res.data["results"][0].get("thumbnail_200"))
+
+    @override_settings(THUMBNAIL_PREWARM=False)
+    def test_prewarm_disabled(self):
+        """Test that nothing is queued unless pre-warming is enabled"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            prewarm_thumbnails([(self.image.original_file.name, "200")])
+
+        self.assertEqual(callbacks, [])
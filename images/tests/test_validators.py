@@ -0,0 +1,185 @@
+import shutil
+from io import BytesIO, StringIO
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image as PILImage
+from rest_framework import status
+from rest_framework.test import APIClient
+from images.links import get_image_file
+from images.models import Image
+from images.validators import ImageInfo, probe_image
+
+UPLOAD_IMAGE_URL = reverse("images:image-upload")
+
+
+def image_bytes(image_format, size=(30, 20), **kwargs):
+    buffer = BytesIO()
+    PILImage.new("RGB", size).save(buffer, format=image_format, **kwargs)
+    return buffer.getvalue()
+
+
+class ProbeImageTests(SimpleTestCase):
+    """Test reading image format and dimensions from the header"""
+
+    def test_probe_png(self):
+        self.assertEqual(
+            probe_image(BytesIO(image_bytes("PNG"))), ImageInfo("PNG", 30, 20)
+        )
+
+    def test_probe_jpeg(self):
+        self.assertEqual(
+            probe_image(BytesIO(image_bytes("JPEG"))), ImageInfo("JPEG", 30, 20)
+        )
+        self.assertEqual(
+            probe_image(BytesIO(image_bytes("JPEG", progressive=True))),
+            ImageInfo("JPEG", 30, 20),
+        )
+
+    def test_probe_jpeg_with_large_metadata(self):
+        """Test that metadata segments before the frame header are skipped"""
+        data = image_bytes("JPEG", exif=b"Exif\x00\x00" + b"x" * 60000)
+
+        self.assertEqual(probe_image(BytesIO(data)), ImageInfo("JPEG", 30, 20))
+
+    def test_probe_jpeg_orientation(self):
+        """Test that the orientation is read from the EXIF segment"""
+        exif = PILImage.Exif()
+        exif[0x0112] = 6
+
+        self.assertEqual(
+            probe_image(BytesIO(image_bytes("JPEG", exif=exif.tobytes()))),
+            ImageInfo("JPEG", 30, 20, 6),
+        )
+
+    def test_probe_jpeg_malformed_exif(self):
+        """Test that malformed EXIF data is ignored"""
+        data = image_bytes("JPEG", exif=b"Exif\x00\x00II*\x00\xff\xff\xff\xff")
+
+        self.assertEqual(probe_image(BytesIO(data)), ImageInfo("JPEG", 30, 20, 1))
+
+    def test_probe_invalid(self):
+        """Test that non-images and truncated headers are rejected"""
+        self.assertIsNone(probe_image(BytesIO(b"%PDF-1.4")))
+        self.assertIsNone(probe_image(BytesIO(image_bytes("JPEG")[:10])))
+        self.assertIsNone(probe_image(BytesIO(image_bytes("PNG")[:20])))
+
+
+class UploadValidationTests(TestCase):
+    """Test validating uploaded images by their header"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="testuser", email="test@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        """Remove media files after each test"""
+        path = default_storage.path(f"./{self.user.id}")
+        if default_storage.exists(path):
+            shutil.rmtree(path)
+
+    def upload(self, data, name="test.jpg"):
+        file = BytesIO(data)
+        file.name = name
+        return self.client.post(
+            UPLOAD_IMAGE_URL, {"original_file": file}, format="multipart"
+        )
+
+    def test_upload_without_decoding(self):
+        """Test that uploads are validated without decoding the image"""
+        data = image_bytes("JPEG")
+
+        with mock.patch.object(PILImage, "open", side_effect=AssertionError):
+            res = self.upload(data)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_upload_mislabelled(self):
+        """Test that a file with content not matching its extension is rejected"""
+        res = self.upload(image_bytes("PNG"), name="test.jpg")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("does not match", str(res.data["original_file"][0]))
+
+    def test_upload_not_image(self):
+        """Test that a file which is not an image is rejected"""
+        res = self.upload(b"not an image")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_stores_metadata(self):
+        """Test that the format, dimensions, orientation and size are stored and listed"""
+        data = image_bytes("PNG")
+
+        res = self.upload(data, name="test.png")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        image = Image.objects.get()
+        self.assertEqual(
+            (image.format, image.width, image.height, image.size, image.orientation),
+            ("PNG", 30, 20, len(data), 1),
+        )
+        res = self.client.get(reverse("images:images-list"))
+        self.assertEqual(res.data["results"][0]["size"], len(data))
+        self.assertEqual(res.data["results"][0]["format"], "PNG")
+
+    def test_upload_ignores_declared_content_type(self):
+        """Test that the content type is derived from the detected format, not from the one declared by the client"""
+        file = SimpleUploadedFile(
+            "test.png", image_bytes("PNG"), content_type="text/html"
+        )
+
+        res = self.client.post(
+            UPLOAD_IMAGE_URL, {"original_file": file}, format="multipart"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Image.objects.get().content_type, "image/png")
+
+    def test_image_file_from_metadata(self):
+        """Test that an image with stored metadata is served without reading the storage"""
+        self.upload(image_bytes("JPEG"))
+        image = Image.objects.get()
+
+        with mock.patch.object(
+            default_storage, "get_object_metadata", side_effect=AssertionError
+        ):
+            image_file = get_image_file(image)
+
+        self.assertEqual(image_file["size"], image.size)
+        self.assertEqual(image_file["content_type"], "image/jpeg")
+        self.assertEqual(image_file["etag"], f'"{image.content_hash}"')
+
+    def test_backfill_image_metadata(self):
+        """Test that metadata of images uploaded before it was stored is read from the storage"""
+        data = image_bytes("JPEG")
+        self.upload(data)
+        self.upload(image_bytes("PNG"), name="test.png")
+        Image.objects.update(
+            format="", width=None, height=None, size=None, orientation=None
+        )
+        out = StringIO()
+
+        call_command("backfill_image_metadata", batch_size=1, stdout=out)
+
+        self.assertIn("Updated 2 images", out.getvalue())
+        self.assertEqual(
+            set(Image.objects.values_list("format", "width", "height")),
+            {("JPEG", 30, 20), ("PNG", 30, 20)},
+        )
+        self.assertFalse(Image.objects.filter(size__isnull=True).exists())
+
+    @override_settings(IMAGE_MAX_PIXELS=500)
+    def test_upload_too_many_pixels(self):
+        """Test that images over the pixel limit are rejected"""
+        res = self.upload(image_bytes("JPEG", size=(30, 20)))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("too large", str(res.data["original_file"][0]))
@@ -0,0 +1,301 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils.module_loading import import_string
+from PIL import Image as PILImage, UnidentifiedImageError
+from tasks.base import task
+from .aws import generate_thumbnail_urls, get_thumbnail_url_period
+
+THUMBNAIL_CACHE_KEY = "thumbnail:{name}"
+# Cache flag of thumbnails queued for generation
+THUMBNAIL_QUEUED_CACHE_KEY = "thumbnail-queued:{name}@{height}"
+
+_process_pool = None
+
+
+def get_thumbnail_backend():
+    """Return an instance of the thumbnail backend configured with `THUMBNAIL_BACKEND` setting."""
+    return import_string(settings.THUMBNAIL_BACKEND)()
+
+
+class BaseThumbnailBackend:
+    """Base class for thumbnail backends.
+
+    A backend maps `(original file name, thumbnail height)` pairs to URLs of the thumbnails. File names are names of
+    original images in the default storage.
+    """
+
+    def get_urls(self, thumbnails):
+        """Retrieve URLs for many thumbnails at once.
+
+        Args:
+            thumbnails (iterable): pairs of original file name and thumbnail height
+
+        Returns:
+            dict: URLs for the thumbnails keyed by `(name, height)` pairs, None for thumbnails that are not available
+        """
+        raise NotImplementedError(
+            "subclasses of BaseThumbnailBackend must provide a get_urls() method"
+        )
+
+    def get_url(self, name, height):
+        return self.get_urls([(name, height)])[(name, height)]
+
+    def get_urls_version(self):
+        """Return a value that changes whenever URLs retrieved for the same thumbnails change, e.g. because they are
+        signed anew. The base implementation returns an empty string, for backends handing out permanent URLs.
+        """
+        return ""
+
+    def prewarm(self, thumbnails):
+        """Make thumbnails ready to be served before they are first requested.
+
+        The base implementation retrieves their URLs, which generates missing thumbnails with backends generating them
+        on retrieval. Thumbnails that already exist are skipped by the backends.
+
+        Args:
+            thumbnails (list): pairs of original file name and thumbnail height
+        """
+        self.get_urls(thumbnails)
+
+
+class ObjectLambdaThumbnailBackend(BaseThumbnailBackend):
+    """Thumbnail backend generating thumbnails lazily with the S3 Object Lambda access point on first access.
+
+    The access point renders thumbnails on every access, pre-warming only signs their URLs ahead of the first listing.
+    """
+
+    def get_urls(self, thumbnails):
+        keys = {
+            (os.path.join(settings.PUBLIC_MEDIA_LOCATION, name), height): (name, height)
+            for name, height in thumbnails
+        }
+        urls = generate_thumbnail_urls(keys.keys())
+        return {keys[pair]: url for pair, url in urls.items()}
+
+    def get_urls_version(self):
+        """Return the current reuse period of signed thumbnail URLs, see `get_thumbnail_url_period`."""
+        period, _, _ = get_thumbnail_url_period()
+        return str(period)
+
+
+class LocalThumbnailBackend(BaseThumbnailBackend):
+    """Thumbnail backend generating thumbnails in-process with Pillow.
+
+    Missing thumbnails are generated by the `generate_thumbnails` background task, never while handing out their URLs.
+    The task renders them in a process pool of `THUMBNAIL_LOCAL_WORKERS` workers (inline when set to 0) and writes
+    them through the default storage next to the original, from where they are served afterwards.
+    """
+
+    def get_thumbnail_name(self, name, height):
+        """Return the storage name of a thumbnail, e.g. `1/thumbnails/<uuid>@200.jpg` for `1/original/<uuid>.jpg`."""
+        directory, filename = os.path.split(name)
+        stem, extension = os.path.splitext(filename)
+        directory = os.path.join(os.path.dirname(directory), "thumbnails")
+        return os.path.join(directory, f"{stem}@{height}{extension}")
+
+    def get_urls(self, thumbnails):
+        """Retrieve URLs for many thumbnails at once, queueing generation of missing ones.
+
+        URLs of missing thumbnails are returned right away and serve the thumbnails once the queued task has written
+        them, see `queue_thumbnails`.
+        """
+        names, missing = self.find_missing(thumbnails)
+        queue_thumbnails(missing)
+        return {pair: default_storage.url(name) for pair, name in names.items()}
+
+    def prewarm(self, thumbnails):
+        _, missing = self.find_missing(thumbnails)
+        self.generate(missing)
+
+    def find_missing(self, thumbnails):
+        """Find thumbnails not known to be generated, by their cache flags.
+
+        Args:
+            thumbnails (iterable): pairs of original file name and thumbnail height
+
+        Returns:
+            tuple: storage names of the thumbnails keyed by `(name, height)` pairs, and the list of missing pairs
+        """
+        names = {pair: self.get_thumbnail_name(*pair) for pair in thumbnails}
+        cached = cache.get_many(
+            THUMBNAIL_CACHE_KEY.format(name=name) for name in names.values()
+        )
+        missing = [
+            pair
+            for pair, name in names.items()
+            if THUMBNAIL_CACHE_KEY.format(name=name) not in cached
+        ]
+        return names, missing
+
+    def generate(self, thumbnails):
+        """Generate thumbnails missing in the storage.
+
+        Args:
+            thumbnails (list): pairs of original file name and thumbnail height
+
+        Returns:
+            list: flags telling whether each thumbnail is available
+        """
+        available = [False] * len(thumbnails)
+        pending = {}
+        for index, (name, height) in enumerate(thumbnails):
+            thumbnail_name = self.get_thumbnail_name(name, height)
+            if default_storage.exists(thumbnail_name):
+                available[index] = True
+                continue
+            try:
+                with default_storage.open(name) as original:
+                    data = original.read()
+            except OSError:
+                continue
+            pending[index] = (thumbnail_name, data, int(height))
+
+        rendered = self.render_many(
+            [(data, height) for _, data, height in pending.values()]
+        )
+        for (index, (thumbnail_name, _, _)), content in zip(pending.items(), rendered):
+            if content is None:
+                continue
+            default_storage.save(thumbnail_name, ContentFile(content))
+            available[index] = True
+
+        cache.set_many(
+            {
+                THUMBNAIL_CACHE_KEY.format(name=self.get_thumbnail_name(*pair)): True
+                for pair, exists in zip(thumbnails, available)
+                if exists
+            },
+            timeout=None,
+        )
+        return available
+
+    def render_many(self, jobs):
+        """Render thumbnails, in a process pool unless `THUMBNAIL_LOCAL_WORKERS` is 0.
+
+        Args:
+            jobs (list): pairs of original image bytes and thumbnail height
+
+        Returns:
+            list: encoded thumbnails, None for images that could not be rendered
+        """
+        if not jobs:
+            return []
+        if settings.THUMBNAIL_LOCAL_WORKERS == 0:
+            return [render_thumbnail(data, height) for data, height in jobs]
+
+        global _process_pool
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=settings.THUMBNAIL_LOCAL_WORKERS
+            )
+        return list(_process_pool.map(render_thumbnail, *zip(*jobs)))
+
+
+def prewarm_thumbnails(thumbnails):
+    """Queue generation of thumbnails once the current transaction commits, if `THUMBNAIL_PREWARM` is set.
+
+    Args:
+        thumbnails (list): pairs of original file name and thumbnail height
+    """
+    if not settings.THUMBNAIL_PREWARM or not thumbnails:
+        return
+    transaction.on_commit(lambda: queue_thumbnails(thumbnails), robust=True)
+
+
+def queue_thumbnails(thumbnails):
+    """Queue the `generate_thumbnails` task for thumbnails not queued yet.
+
+    Thumbnails are flagged in cache while queued, for at most `THUMBNAIL_QUEUE_TIMEOUT` seconds, so that listing them
+    again before they are generated does not queue them again.
+
+    Args:
+        thumbnails (iterable): pairs of original file name and thumbnail height
+    """
+    pending = list(dict.fromkeys(thumbnails))
+    queued = get_queued_thumbnails(pending)
+    pending = [pair for pair in pending if pair not in queued]
+    if not pending:
+        return
+    cache.set_many(
+        {
+            THUMBNAIL_QUEUED_CACHE_KEY.format(name=name, height=height): True
+            for name, height in pending
+        },
+        timeout=settings.THUMBNAIL_QUEUE_TIMEOUT,
+    )
+    generate_thumbnails.enqueue((pending,))
+
+
+def get_queued_thumbnails(thumbnails):
+    """Find thumbnails queued for generation.
+
+    Args:
+        thumbnails (iterable): pairs of original file name and thumbnail height
+
+    Returns:
+        set: pairs queued for generation
+    """
+    keys = {
+        THUMBNAIL_QUEUED_CACHE_KEY.format(name=name, height=height): (name, height)
+        for name, height in thumbnails
+    }
+    if not keys:
+        return set()
+    return {keys[key] for key in cache.get_many(keys)}
+
+
+@task
+def generate_thumbnails(thumbnails):
+    """Background task generating thumbnails with the configured backend, see `queue_thumbnails`.
+
+    Args:
+        thumbnails (list): pairs of original file name and thumbnail height
+    """
+    thumbnails = [tuple(pair) for pair in thumbnails]
+    try:
+        get_thumbnail_backend().prewarm(thumbnails)
+    finally:
+        cache.delete_many(
+            [
+                THUMBNAIL_QUEUED_CACHE_KEY.format(name=name, height=height)
+                for name, height in thumbnails
+            ]
+        )
+
+
+def render_thumbnail(data, height):
+    """Render a thumbnail of an image scaled down to the given height.
+
+    JPEG images are scaled by the decoder with `draft()`, so only a fraction of the pixels is decoded. Other images
+    are first shrunk by an integer factor with `reduce()` and then resampled to the exact size.
+
+    Args:
+        data (bytes): encoded original image
+        height (int): height of the thumbnail
+
+    Returns:
+        bytes: thumbnail encoded in the format of the original, or None if the data is not a supported image
+    """
+    try:
+        with PILImage.open(BytesIO(data)) as image:
+            image_format = image.format
+            width = max(round(image.width * height / image.height), 1)
+            if image.height > height:
+                if image_format == "JPEG":
+                    image.draft(image.mode, (width, height))
+                factor = image.height // (height * 2)
+                if factor > 1:
+                    image = image.reduce(factor)
+                image = image.resize((width, height), PILImage.LANCZOS)
+
+            output = BytesIO()
+            image.save(output, format=image_format)
+            return output.getvalue()
+    except (UnidentifiedImageError, OSError, ValueError):
+        return None
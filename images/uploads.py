@@ -0,0 +1,311 @@
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import serializers
+from lib.uploadhandler import hash_file
+from tasks.base import task
+from .metrics import UPLOAD_SIZE
+from .models import Image, ImageBlob, UploadSession, blob_path, original_image_path
+from .validators import IMAGE_CONTENT_TYPES, validate_stored_image
+
+logger = logging.getLogger(__name__)
+
+_thread_pool = None
+
+
+def _save_file(name, file):
+    try:
+        return default_storage.save(name, file)
+    except Exception as e:
+        return e
+
+
+def save_files(files):
+    """Write files to the default storage concurrently, in a bounded thread pool.
+
+    Storage writes are network bound, so a batch of files is uploaded in roughly the time of the slowest one rather
+    than the sum of all of them.
+
+    Args:
+        files (list): pairs of name to store the file under and the file
+
+    Returns:
+        list: for each file, the name it has been stored under or the exception it failed with
+    """
+    if len(files) <= 1:
+        return [_save_file(name, file) for name, file in files]
+
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(
+            max_workers=settings.BATCH_UPLOAD_WORKERS,
+            thread_name_prefix="batch-upload",
+        )
+
+    return list(_thread_pool.map(_save_file, *zip(*files)))
+
+
+def acquire_blobs(counts):
+    """Add references to stored blobs with the given content hashes.
+
+    Args:
+        counts (dict): content hash to the number of references to add
+
+    Returns:
+        dict: content hash to the storage name of the blobs referenced, blobs not stored yet are left out
+    """
+    existing = dict(
+        ImageBlob.objects.filter(content_hash__in=counts).values_list(
+            "content_hash", "name"
+        )
+    )
+    names = {}
+    for content_hash, name in existing.items():
+        # blobs released in the meantime are stored again
+        if ImageBlob.objects.filter(content_hash=content_hash).update(
+            ref_count=F("ref_count") + counts[content_hash]
+        ):
+            names[content_hash] = name
+    return names
+
+
+def register_blob(content_hash, name, size, count=1):
+    """Register a newly stored file as the blob of its content hash.
+
+    If a concurrent upload has registered the same content first, its blob is referenced instead and the newly stored
+    file is removed once the transaction commits, see `delete_stored_file`, unless both uploads stored the file under
+    the same content-addressed name, which the blob then points to.
+
+    Args:
+        content_hash (str): SHA-256 hex digest of the file
+        name (str): name of the file in the default storage
+        size (int): size of the file in bytes
+        count (int, optional): number of references to add
+
+    Returns:
+        str: storage name of the blob
+    """
+    while True:
+        blob, created = ImageBlob.objects.get_or_create(
+            content_hash=content_hash,
+            defaults={"name": name, "size": size, "ref_count": count},
+        )
+        if created:
+            return name
+        if ImageBlob.objects.filter(content_hash=content_hash).update(
+            ref_count=F("ref_count") + count
+        ):
+            if name != blob.name:
+                delete_stored_file.delay(name)
+            return blob.name
+
+
+@task
+def delete_stored_file(name):
+    """Background task removing a file from the default storage, queued once the transaction commits.
+
+    Args:
+        name (str): name of the file in the default storage
+    """
+    default_storage.delete(name)
+
+
+def release_blob(content_hash):
+    """Drop a reference to a blob, removing the blob and its file once the last reference goes away.
+
+    Args:
+        content_hash (str): SHA-256 hex digest of the blob
+    """
+    with transaction.atomic():
+        blob = (
+            ImageBlob.objects.select_for_update()
+            .filter(content_hash=content_hash)
+            .first()
+        )
+        if blob is None:
+            return
+        if blob.ref_count > 1:
+            ImageBlob.objects.filter(content_hash=content_hash).update(
+                ref_count=F("ref_count") - 1
+            )
+            return
+        blob.delete()
+        delete_stored_file.delay(blob.name)
+
+
+def store_originals(uploads):
+    """Store original files of new images, deduplicated by content.
+
+    Files are hashed (see `hash_file`), files matching a stored blob reference it instead of being stored again, and
+    the remaining files are written to the storage concurrently, one per distinct content, under content-addressed
+    names (see `blob_path`). The `original_file` and `content_hash` fields of the images are set accordingly, as well
+    as the file metadata fields from the `image_info` probed while validating the files. The images themselves are not
+    saved: call this in the transaction saving them, so the blob references are dropped if saving them fails.
+
+    Args:
+        uploads (list): pairs of the unsaved image and its uploaded file, validated by `validate_image_content`
+
+    Returns:
+        list: for each upload, None if the file has been stored or the exception storing it failed with
+    """
+    hashes = [hash_file(file) for _, file in uploads]
+    for _, file in uploads:
+        UPLOAD_SIZE.observe(file.size, method="form")
+    counts = Counter(hashes)
+    names = acquire_blobs(counts)
+
+    pending = {}
+    for (image, file), content_hash in zip(uploads, hashes):
+        if content_hash not in names and content_hash not in pending:
+            pending[content_hash] = (blob_path(content_hash, file.name), file)
+
+    errors = {}
+    stored = save_files(list(pending.values()))
+    for (content_hash, (_, file)), name in zip(pending.items(), stored):
+        if isinstance(name, Exception):
+            errors[content_hash] = name
+        else:
+            names[content_hash] = register_blob(
+                content_hash, name, file.size, counts[content_hash]
+            )
+
+    for (image, file), content_hash in zip(uploads, hashes):
+        if content_hash in names:
+            image.original_file.name = names[content_hash]
+            image.content_hash = content_hash
+            image.set_file_metadata(file.image_info, file.size)
+    return [errors.get(content_hash) for content_hash in hashes]
+
+
+def start_upload_session(user, filename, content_type, size):
+    """Start a resumable upload of an image, backed by a multipart upload of the default storage.
+
+    Expired sessions of the user are aborted on the way, see `purge_upload_sessions`.
+
+    Args:
+        user (User): user uploading the image
+        filename (str): name of the uploaded file
+        content_type (str): media type of the image
+        size (int): size of the image in bytes
+
+    Returns:
+        UploadSession: the created session
+    """
+    purge_upload_sessions(
+        UploadSession.objects.filter(user=user, expires_at__lte=timezone.now())
+    )
+
+    name = original_image_path(Image(user=user), filename)
+    upload_id = default_storage.create_multipart_upload(name, content_type)
+    return UploadSession.objects.create(
+        user=user,
+        name=name,
+        content_type=content_type,
+        size=size,
+        chunk_size=settings.RESUMABLE_UPLOAD_CHUNK_SIZE,
+        upload_id=upload_id,
+        expires_at=timezone.now()
+        + timedelta(seconds=settings.RESUMABLE_UPLOAD_EXPIRES_IN),
+    )
+
+
+def get_chunk_urls(session):
+    """Generate presigned URLs for uploading the chunks of a session, valid until the session expires.
+
+    Returns:
+        list: dicts with `number` of each chunk, starting at 1, and its `url`
+    """
+    expires_in = max(int((session.expires_at - timezone.now()).total_seconds()), 1)
+    return [
+        {
+            "number": number,
+            "url": default_storage.generate_presigned_part_url(
+                session.name, session.upload_id, number, expires_in
+            ),
+        }
+        for number in range(1, session.chunk_count + 1)
+    ]
+
+
+def get_upload_offset(session, parts):
+    """Count the bytes of a session received without gaps from the start of the file.
+
+    Args:
+        session (UploadSession): upload session
+        parts (list): parts received so far, as returned by the storage's `list_parts`
+
+    Returns:
+        int: offset of the first byte missing
+    """
+    offset = 0
+    for expected, part in enumerate(parts, start=1):
+        if part["number"] != expected:
+            break
+        offset += part["size"]
+    return min(offset, session.size)
+
+
+def complete_upload_session(session):
+    """Assemble the chunks of a session into the image file and create the image.
+
+    Raises:
+        ValidationError: If chunks are missing or have unexpected sizes, or the file is not a valid image.
+
+    Returns:
+        Image: the created image
+    """
+    parts = default_storage.list_parts(session.name, session.upload_id)
+    numbers = [part["number"] for part in parts]
+    if numbers != list(range(1, session.chunk_count + 1)):
+        missing = sorted(set(range(1, session.chunk_count + 1)) - set(numbers))
+        raise serializers.ValidationError({"chunks": {"missing": missing}})
+    if any(part["size"] != session.chunk_size for part in parts[:-1]) or (
+        sum(part["size"] for part in parts) != session.size
+    ):
+        raise serializers.ValidationError(
+            {"chunks": "Chunk sizes do not add up to the size of the file."}
+        )
+
+    name = default_storage.complete_multipart_upload(
+        session.name, session.upload_id, parts
+    )
+    session.delete()
+    image_info, size = validate_stored_image(name, settings.RESUMABLE_UPLOAD_MAX_SIZE)
+    UPLOAD_SIZE.observe(size, method="resumable")
+    image = Image(
+        user=session.user,
+        original_file=name,
+        content_type=IMAGE_CONTENT_TYPES[image_info.format],
+    )
+    image.set_file_metadata(image_info, size)
+    image.save()
+    return image
+
+
+def abort_upload_session(session):
+    """Abort a session, discarding the chunks received so far."""
+    default_storage.abort_multipart_upload(session.name, session.upload_id)
+    session.delete()
+
+
+def purge_upload_sessions(queryset):
+    """Abort upload sessions of the queryset, see `abort_upload_session`.
+
+    Returns:
+        int: number of aborted sessions
+    """
+    count = 0
+    for session in queryset.iterator():
+        try:
+            abort_upload_session(session)
+        except Exception:
+            logger.exception("Could not abort upload session %s", session.pk)
+            continue
+        count += 1
+    return count
@@ -1,16 +1,68 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
+    BatchImageUploadView,
+    BulkGenerateExpiringLinksView,
+    DirectUploadCompleteView,
+    DirectUploadView,
+    LocalDirectUploadView,
+    LocalPresignedMediaView,
+    LocalUploadPartView,
+    UploadSessionCompleteView,
+    UploadSessionsView,
+    UploadSessionView,
+    SignedExpiringLinkView,
     ExpiringLinkRedirectView,
     GenerateExpiringLinkView,
     ImageUploadView,
     UserImagesView,
 )
 
+if settings.IMAGES_ASYNC_VIEWS:
+    from .async_views import (
+        AsyncExpiringLinkRedirectView as ExpiringLinkRedirectView,
+        AsyncGenerateExpiringLinkView as GenerateExpiringLinkView,
+        AsyncUserImagesView as UserImagesView,
+    )
+
 app_name = "images"
 
 urlpatterns = [
     path("", UserImagesView.as_view(), name="images-list"),
     path("upload/", ImageUploadView.as_view(), name="image-upload"),
+    path("upload/batch/", BatchImageUploadView.as_view(), name="batch-upload"),
+    path("upload/direct/", DirectUploadView.as_view(), name="direct-upload"),
+    path(
+        "upload/direct/complete/",
+        DirectUploadCompleteView.as_view(),
+        name="direct-upload-complete",
+    ),
+    path(
+        "upload/direct/local/",
+        LocalDirectUploadView.as_view(),
+        name="direct-upload-local",
+    ),
+    path("upload/sessions/", UploadSessionsView.as_view(), name="upload-sessions"),
+    path(
+        "upload/sessions/<uuid:session_id>/",
+        UploadSessionView.as_view(),
+        name="upload-session",
+    ),
+    path(
+        "upload/sessions/<uuid:session_id>/complete/",
+        UploadSessionCompleteView.as_view(),
+        name="upload-session-complete",
+    ),
+    path(
+        "upload/sessions/local/<str:token>/",
+        LocalUploadPartView.as_view(),
+        name="upload-part-local",
+    ),
+    path(
+        "generate-link/bulk/",
+        BulkGenerateExpiringLinksView.as_view(),
+        name="generate-links",
+    ),
     path(
         "generate-link/<uuid:image_id>/",
         GenerateExpiringLinkView.as_view(),
@@ -21,4 +73,14 @@ urlpatterns = [
         ExpiringLinkRedirectView.as_view(),
         name="image-link",
     ),
+    path(
+        "link/s/<str:token>/",
+        SignedExpiringLinkView.as_view(),
+        name="signed-image-link",
+    ),
+    path(
+        "media/local/<str:token>/",
+        LocalPresignedMediaView.as_view(),
+        name="presigned-media-local",
+    ),
 ]
@@ -1,5 +1,45 @@
+from collections import namedtuple
+from django.conf import settings
+from django.core.files.storage import default_storage
 from rest_framework import serializers
 import os
+import struct
+
+IMAGE_SIGNATURES = {
+    "JPEG": b"\xff\xd8\xff",
+    "PNG": b"\x89PNG\r\n\x1a\n",
+}
+IMAGE_EXTENSIONS = {
+    ".jpg": "JPEG",
+    ".jpeg": "JPEG",
+    ".png": "PNG",
+}
+IMAGE_CONTENT_TYPES = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+}
+IMAGE_HEADER_SIZE = max(len(signature) for signature in IMAGE_SIGNATURES.values())
+# Upper bound of bytes read when probing image dimensions, leaving room for EXIF and ICC profile segments of JPEGs
+IMAGE_PROBE_MAX_BYTES = 1024 * 1024
+
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+JPEG_STANDALONE_MARKERS = frozenset(range(0xD0, 0xD8)) | {0x01}
+JPEG_END_MARKERS = frozenset({0xD8, 0xD9, 0xDA})
+JPEG_APP1_MARKER = 0xE1
+EXIF_HEADER = b"Exif\x00\x00"
+EXIF_ORIENTATION_TAG = 0x0112
+
+ImageInfo = namedtuple(
+    "ImageInfo", ["format", "width", "height", "orientation"], defaults=(1,)
+)
+ImageInfo.__doc__ = """Format and dimensions of an image, read from its header.
+
+    Attributes:
+        format (str): image format, e.g. `JPEG`
+        width (int): width of the stored pixels
+        height (int): height of the stored pixels
+        orientation (int): EXIF orientation, from 1 to 8; 1 for upright images and images without EXIF data
+    """
 
 
 def validate_image_file_extension(value):
@@ -9,3 +49,211 @@ def validate_image_file_extension(value):
         raise serializers.ValidationError(
             "Unsupported file extension. Supported file extensions are .jpg, .jpeg, .png"
         )
+
+
+def sniff_image_format(header):
+    """Detect image format from the leading bytes of a file.
+
+    Args:
+        header (bytes): leading bytes of the file, at least `IMAGE_HEADER_SIZE` long
+
+    Returns:
+        str: image format, or None if the bytes do not start a supported image
+    """
+    for image_format, signature in IMAGE_SIGNATURES.items():
+        if header.startswith(signature):
+            return image_format
+    return None
+
+
+def probe_image(file):
+    """Read format and dimensions of an image from its header, without decoding any pixel data.
+
+    PNG dimensions are read from the `IHDR` chunk right after the signature. JPEG segments are skipped by their
+    length up to the first start-of-frame marker, reading at most `IMAGE_PROBE_MAX_BYTES` bytes. The orientation of
+    JPEGs is read from the EXIF segment on the way.
+
+    Args:
+        file (file-like): file positioned at its first byte
+
+    Returns:
+        ImageInfo: format and dimensions of the image, or None if the file does not start a supported image
+    """
+    reader = _HeaderReader(file)
+    try:
+        image_format = sniff_image_format(reader.peek(IMAGE_HEADER_SIZE))
+        if image_format == "PNG":
+            return _probe_png(reader)
+        if image_format == "JPEG":
+            return _probe_jpeg(reader)
+    except (ValueError, struct.error):
+        pass
+    return None
+
+
+def _probe_png(reader):
+    reader.read(len(IMAGE_SIGNATURES["PNG"]))
+    length, chunk_type, width, height = struct.unpack(">I4sII", reader.read(16))
+    if chunk_type != b"IHDR" or length != 13:
+        return None
+    return ImageInfo("PNG", width, height)
+
+
+def _probe_jpeg(reader):
+    reader.read(2)
+    orientation = 1
+    while True:
+        if reader.read(1) != b"\xff":
+            return None
+        marker = reader.read(1)[0]
+        while marker == 0xFF:
+            marker = reader.read(1)[0]
+        if marker in JPEG_STANDALONE_MARKERS:
+            continue
+        if marker in JPEG_END_MARKERS:
+            return None
+
+        (length,) = struct.unpack(">H", reader.read(2))
+        if marker in JPEG_SOF_MARKERS:
+            _, height, width = struct.unpack(">BHH", reader.read(5))
+            return ImageInfo("JPEG", width, height, orientation)
+        if marker == JPEG_APP1_MARKER:
+            orientation = _read_exif_orientation(reader.read(length - 2)) or orientation
+        else:
+            reader.skip(length - 2)
+
+
+def _read_exif_orientation(segment):
+    """Read the orientation tag from the first IFD of an EXIF segment.
+
+    Returns:
+        int: orientation, or None if the segment is not EXIF data or has no valid orientation
+    """
+    if not segment.startswith(EXIF_HEADER):
+        return None
+    tiff = segment[len(EXIF_HEADER) :]
+    byte_order = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if byte_order is None:
+        return None
+    # malformed EXIF data does not make the image itself invalid
+    try:
+        (offset,) = struct.unpack(byte_order + "I", tiff[4:8])
+        (count,) = struct.unpack(byte_order + "H", tiff[offset : offset + 2])
+        for index in range(count):
+            start = offset + 2 + index * 12
+            tag, _, _, value = struct.unpack(
+                byte_order + "HHIH", tiff[start : start + 10]
+            )
+            if tag == EXIF_ORIENTATION_TAG:
+                return value if 1 <= value <= 8 else None
+    except struct.error:
+        pass
+    return None
+
+
+class _HeaderReader:
+    """Reads exact byte counts from the start of a file, up to `IMAGE_PROBE_MAX_BYTES` bytes in total."""
+
+    def __init__(self, file):
+        self.file = file
+        self.buffer = b""
+        self.remaining = IMAGE_PROBE_MAX_BYTES
+
+    def peek(self, size):
+        self.buffer = self.read(size)
+        return self.buffer
+
+    def read(self, size):
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        missing = size - len(data)
+        if missing:
+            if missing > self.remaining:
+                raise ValueError("Image header is too long")
+            data += self.file.read(missing)
+            self.remaining -= missing
+        if len(data) != size:
+            raise ValueError("Unexpected end of file")
+        return data
+
+    def skip(self, size):
+        while size > 0:
+            chunk = min(size, 64 * 1024)
+            self.read(chunk)
+            size -= chunk
+
+
+def validate_image_header(name, file):
+    """Validate that the header of a file is a supported image matching its extension, within the allowed size.
+
+    Only the header is read, see `probe_image`. The pixel count is limited by the `IMAGE_MAX_PIXELS` setting, which
+    guards the thumbnail renderer against decompression bombs.
+
+    Args:
+        name (str): file name
+        file (file-like): file positioned at its first byte
+
+    Raises:
+        ValidationError: If the content is not a supported image, does not match the extension or is too large.
+
+    Returns:
+        ImageInfo: format and dimensions of the image
+    """
+    info = probe_image(file)
+    if info is None:
+        raise serializers.ValidationError("File is not a supported image.")
+
+    ext = os.path.splitext(name)[1].lower()
+    if IMAGE_EXTENSIONS.get(ext) != info.format:
+        raise serializers.ValidationError("File content does not match its extension.")
+    if not info.width or not info.height:
+        raise serializers.ValidationError("Image has no pixels.")
+    if info.width * info.height > settings.IMAGE_MAX_PIXELS:
+        raise serializers.ValidationError(
+            f"Image is too large. Images may have at most {settings.IMAGE_MAX_PIXELS} pixels."
+        )
+    return info
+
+
+def validate_image_content(value):
+    """Validate an uploaded file by its header, see `validate_image_header`.
+
+    Files with an unsupported extension are left to `validate_image_file_extension`. The probed `ImageInfo` is set as
+    the `image_info` attribute of the file.
+    """
+    ext = os.path.splitext(value.name)[1].lower()
+    if ext not in IMAGE_EXTENSIONS:
+        return
+
+    value.seek(0)
+    try:
+        value.image_info = validate_image_header(value.name, value)
+    finally:
+        value.seek(0)
+
+
+def validate_stored_image(name, max_size):
+    """Validate an image file uploaded to the default storage by its size and header, removing it if invalid.
+
+    Args:
+        name (str): name of the file in the default storage
+        max_size (int): maximum size of the file in bytes
+
+    Raises:
+        ValidationError: If the file is too large or not a valid image, see `validate_image_header`.
+
+    Returns:
+        tuple: `ImageInfo` with format and dimensions of the image, and size of the file in bytes
+    """
+    try:
+        size = default_storage.size(name)
+        if not 0 < size <= max_size:
+            raise serializers.ValidationError("File size is out of the allowed range.")
+
+        header = default_storage.open_range(name, 0, IMAGE_PROBE_MAX_BYTES - 1)
+        try:
+            return validate_image_header(name, header), size
+        finally:
+            header.close()
+    except serializers.ValidationError:
+        default_storage.delete(name)
+        raise
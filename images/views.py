@@ -1,6 +1,10 @@
-from django.http import FileResponse
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404
-from django.core.cache import cache
 from rest_framework import generics
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -8,14 +12,109 @@ from rest_framework import status
 from rest_framework.reverse import reverse
 from rest_framework.renderers import BrowsableAPIRenderer
 from .renderers import NonNullJSONRenderer
+from .pagination import ImagePagination
 from .permissions import HasExpiringLinkPermission
-from .models import ExpiringLink, Image
+from .models import ExpiringLink, Image, UploadSession, original_image_path
+from .validators import IMAGE_CONTENT_TYPES
+from .links import (
+    LinkRecord,
+    build_link_record,
+    cache_link_record,
+    cache_link_records,
+    get_cached_image_file,
+    get_cached_image_files,
+    get_link_record,
+)
+from .listing import bump_image_list_versions, get_image_list_version
+from .thumbnails import get_thumbnail_backend, prewarm_thumbnails
+from .uploads import (
+    abort_upload_session,
+    complete_upload_session,
+    get_chunk_urls,
+    get_upload_offset,
+    start_upload_session,
+    store_originals,
+)
+from .signed_links import (
+    ExpiredSignedLink,
+    InvalidSignedLink,
+    audit_link,
+    audit_links,
+    sign_link,
+    verify_link,
+)
 from .serializers import (
+    BulkExpiringLinkSerializer,
+    DIRECT_UPLOAD_SALT,
+    DirectUploadCompleteSerializer,
+    DirectUploadSerializer,
     ImageSerializer,
     ExpiringLinkSerializer,
+    UploadSessionSerializer,
 )
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.parsers import MultiPartParser
+from rest_framework.exceptions import NotFound, ValidationError
+from django.conf import settings
+from django.db import transaction
+import hashlib
+import mimetypes
+import time
+from datetime import timedelta
+from io import BytesIO
+from django.core import signing
 from django.core.files.storage import default_storage
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils import timezone
+from django.utils.http import http_date
+from lib.http import RangeNotSatisfiable, aiter_file, iter_file, parse_range_header
+from lib.metrics import STORAGE_BYTES
+from lib.shared import UserGroupPermissions
+from vercel_app.storage_backends import PresignedRequestDenied
+from asgiref.sync import sync_to_async
+
+
+class StreamingRenderMixin:
+    """Mixin for API views streaming large responses with renderers supporting `iter_render`.
+
+    Successful responses whose data holds a list of at least `streaming_min_items` items, directly or under a
+    `results` key, are rendered into a `StreamingHttpResponse` as they are sent instead of into a single bytes object.
+    """
+
+    streaming_min_items = 100
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if not self.should_stream(response):
+            return response
+
+        streaming_response = StreamingHttpResponse(
+            self.get_streaming_content(response),
+            status=response.status_code,
+            content_type=response.accepted_media_type,
+        )
+        for key, value in response.items():
+            if key.lower() != "content-type":
+                streaming_response[key] = value
+        streaming_response.data = response.data
+        return streaming_response
+
+    def get_streaming_content(self, response):
+        """Returns the iterator rendering the data of the response in chunks."""
+        return response.accepted_renderer.iter_render(
+            response.data, response.accepted_media_type, response.renderer_context
+        )
+
+    def should_stream(self, response):
+        """Tells if the response is to be streamed."""
+        if not isinstance(response, Response) or response.exception:
+            return False
+        if not hasattr(getattr(response, "accepted_renderer", None), "iter_render"):
+            return False
+        data = response.data
+        if isinstance(data, dict):
+            data = data.get("results")
+        return isinstance(data, list) and len(data) >= self.streaming_min_items
 
 
 class BaseImageView:
@@ -32,20 +131,369 @@ class ImageUploadView(BaseImageView, generics.CreateAPIView):
     queryset = Image.objects.all()
 
     def perform_create(self, serializer):
-        """Saves the uploaded image with the requesting user as the owner."""
-        serializer.save(user=self.request.user)
+        """Saves the uploaded image with the requesting user as the owner, pre-warming thumbnails the user can access."""
+        image = serializer.save(user=self.request.user)
+        prewarm_thumbnails(serializer.get_thumbnails(image))
+
+
+class BatchImageUploadView(BaseImageView, generics.GenericAPIView):
+    """A view for uploading several images with a single multipart request.
+
+    The files are sent as repeated `original_files` fields, at most `BATCH_UPLOAD_MAX_FILES` of them. Each file is
+    validated on its own, the valid ones are deduplicated by content, written to the storage concurrently and
+    inserted with a single query, in the transaction adding the blob references.
+
+    The response contains a `results` list with an entry per file, in the order of the request, holding the
+    `filename`, the per-file `status` code and either the created `image` or the `errors`. The response status is
+    201 Created if all files have been uploaded, or 207 Multi-Status otherwise.
+    """
+
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, *args, **kwargs):
+        """Handles POST requests uploading a batch of images.
+
+        Returns:
+            Response: The HTTP response object.
+        """
+        files = request.FILES.getlist("original_files")
+        if not files:
+            raise ValidationError({"original_files": "No files were submitted."})
+        if len(files) > settings.BATCH_UPLOAD_MAX_FILES:
+            raise ValidationError(
+                {
+                    "original_files": f"Ensure this field has no more than {settings.BATCH_UPLOAD_MAX_FILES} files."
+                }
+            )
+
+        results = [{"filename": file.name} for file in files]
+        valid = []
+        for result, file in zip(results, files):
+            serializer = self.get_serializer(data={"original_file": file})
+            if not serializer.is_valid():
+                result.update(
+                    status=status.HTTP_400_BAD_REQUEST, errors=serializer.errors
+                )
+                continue
+            file = serializer.validated_data["original_file"]
+            image = Image(
+                user=request.user,
+                content_type=IMAGE_CONTENT_TYPES[file.image_info.format],
+            )
+            valid.append((result, image, file))
+
+        with transaction.atomic():
+            errors = store_originals([(image, file) for _, image, file in valid])
+            images = []
+            for (result, image, _), error in zip(valid, errors):
+                if error is not None:
+                    result.update(
+                        status=status.HTTP_502_BAD_GATEWAY,
+                        errors={"original_file": ["The file could not be stored."]},
+                    )
+                    continue
+                images.append((result, image))
+
+            Image.objects.bulk_create(image for _, image in images)
+            bump_image_list_versions(request.user.pk)
+        serializer = ImageSerializer(
+            [image for _, image in images],
+            many=True,
+            context=self.get_serializer_context(),
+        )
+        prewarm_thumbnails(
+            [
+                pair
+                for _, image in images
+                for pair in serializer.child.get_thumbnails(image)
+            ]
+        )
+        data = serializer.data
+        for (result, _), image_data in zip(images, data):
+            result.update(status=status.HTTP_201_CREATED, image=image_data)
+
+        return Response(
+            {"results": results},
+            status=(
+                status.HTTP_201_CREATED
+                if len(images) == len(files)
+                else status.HTTP_207_MULTI_STATUS
+            ),
+        )
+
+
+class DirectUploadView(generics.GenericAPIView):
+    """API view issuing a presigned POST policy for uploading an image directly to the storage.
+
+    The view expects a POST request with `filename` and `content_type` of the image. The response contains the `url`
+    and form `fields` the client submits the file with (as the `file` field), and a `token` to pass to the completion
+    endpoint once the upload has finished.
+    """
+
+    serializer_class = DirectUploadSerializer
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        """Handles POST requests issuing a presigned POST policy.
+
+        Returns:
+            Response: The HTTP response object.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        name = original_image_path(Image(user=request.user), data["filename"])
+        presigned_post = default_storage.generate_presigned_post(
+            name,
+            data["content_type"],
+            settings.DIRECT_UPLOAD_MAX_SIZE,
+            settings.DIRECT_UPLOAD_EXPIRES_IN,
+        )
+        token = signing.dumps(
+            {"name": name, "user": request.user.pk}, salt=DIRECT_UPLOAD_SALT
+        )
+
+        return Response(
+            {
+                "url": request.build_absolute_uri(presigned_post["url"]),
+                "fields": presigned_post["fields"],
+                "token": token,
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class DirectUploadCompleteView(BaseImageView, generics.CreateAPIView):
+    """A view for finalizing direct uploads, creating the image from the object uploaded to the storage."""
+
+    serializer_class = DirectUploadCompleteSerializer
+
+    def create(self, request, *args, **kwargs):
+        """Validates the uploaded object and responds with the created image, pre-warming thumbnails the user can access."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        image = serializer.save(user=request.user)
+
+        image_serializer = ImageSerializer(image, context=self.get_serializer_context())
+        prewarm_thumbnails(image_serializer.get_thumbnails(image))
+        return Response(image_serializer.data, status=status.HTTP_201_CREATED)
+
+
+class LocalDirectUploadView(APIView):
+    """API view standing in for S3 when accepting presigned POST uploads to `LocalMediaStorage`."""
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    parser_classes = [MultiPartParser]
+    renderer_classes = [NonNullJSONRenderer]
+
+    def post(self, request, *args, **kwargs):
+        """Handles POST requests storing the uploaded file.
+
+        Returns:
+            Response: A response object with a `204 No Content` status if the file has been stored.
+        """
+        if not hasattr(default_storage, "accept_presigned_post"):
+            raise NotFound()
 
+        file = request.data.get("file")
+        if file is None:
+            raise ValidationError({"file": "No file was submitted."})
 
-class UserImagesView(BaseImageView, generics.ListAPIView):
-    """View to handle the listing of images owned by the requesting user."""
+        try:
+            default_storage.accept_presigned_post(request.data, file)
+        except PresignedRequestDenied as e:
+            raise ValidationError({"file": str(e)})
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UploadSessionsView(generics.GenericAPIView):
+    """API view starting a resumable upload of an image in chunks.
+
+    The view expects a POST request with `filename`, `content_type` and `size` of the image. The response contains
+    the `id` of the upload session, the `chunk_size` the file is split into and a presigned `url` for each of the
+    numbered `chunks`. Each chunk is uploaded with a PUT request of its bytes to its URL, in any order and retried as
+    needed, and the upload is finalized with the `images:upload-session-complete` endpoint.
+    """
+
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        """Handles POST requests starting an upload session.
+
+        Returns:
+            Response: The HTTP response object.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        session = start_upload_session(request.user, **serializer.validated_data)
+
+        chunks = get_chunk_urls(session)
+        for chunk in chunks:
+            chunk["url"] = request.build_absolute_uri(chunk["url"])
+        return Response(
+            {
+                "id": session.id,
+                "chunk_size": session.chunk_size,
+                "expires_at": session.expires_at,
+                "chunks": chunks,
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class UploadSessionMixin:
+    """A mixin for views operating on an unexpired upload session of the requesting user."""
+
+    def get_session(self):
+        return get_object_or_404(
+            UploadSession,
+            id=self.kwargs.get("session_id"),
+            user=self.request.user,
+            expires_at__gt=timezone.now(),
+        )
+
+
+class UploadSessionView(UploadSessionMixin, APIView):
+    """API view reporting the progress of an upload session, or aborting it.
+
+    A GET request responds with the `offset` of the first byte missing and the numbers of the `chunks` received so
+    far, so that an interrupted upload can be resumed. A DELETE request aborts the session.
+    """
+
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [NonNullJSONRenderer, BrowsableAPIRenderer]
+
+    def get(self, request, *args, **kwargs):
+        session = self.get_session()
+        parts = default_storage.list_parts(session.name, session.upload_id)
+        return Response(
+            {
+                "id": session.id,
+                "size": session.size,
+                "chunk_size": session.chunk_size,
+                "offset": get_upload_offset(session, parts),
+                "chunks": [part["number"] for part in parts],
+                "expires_at": session.expires_at,
+            }
+        )
+
+    def delete(self, request, *args, **kwargs):
+        abort_upload_session(self.get_session())
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UploadSessionCompleteView(
+    UploadSessionMixin, BaseImageView, generics.GenericAPIView
+):
+    """A view for finalizing upload sessions, assembling the chunks and creating the image."""
+
+    def post(self, request, *args, **kwargs):
+        """Assembles the uploaded chunks and responds with the created image, pre-warming thumbnails the user can access."""
+        image = complete_upload_session(self.get_session())
+        serializer = self.get_serializer(image)
+        prewarm_thumbnails(serializer.get_thumbnails(image))
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class LocalUploadPartView(APIView):
+    """API view standing in for S3 when accepting chunks of resumable uploads to `LocalMediaStorage`."""
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    renderer_classes = [NonNullJSONRenderer]
+
+    def put(self, request, *args, **kwargs):
+        """Handles PUT requests storing the chunk sent as the request body.
+
+        The body is streamed to the storage rather than read with `request.body`, which is limited to
+        `DATA_UPLOAD_MAX_MEMORY_SIZE` and would reject chunks of the default size.
+
+        Returns:
+            Response: A response object with the `ETag` of the stored chunk.
+        """
+        if not hasattr(default_storage, "accept_presigned_part"):
+            raise NotFound()
+
+        try:
+            etag = default_storage.accept_presigned_part(
+                self.kwargs.get("token"), request.stream or BytesIO()
+            )
+        except PresignedRequestDenied:
+            return Response(status=status.HTTP_403_FORBIDDEN)
+        return Response(headers={"ETag": etag})
+
+
+class UserImagesView(StreamingRenderMixin, BaseImageView, generics.ListAPIView):
+    """View to handle the listing of images owned by the requesting user.
+
+    Images are paginated with keyset pagination, newest first. See `ImagePagination` for details. Large pages are
+    streamed to the client as they are rendered. Lists carry an ETag, and requests for a list that has not changed
+    since the client fetched it are answered with 304 Not Modified before any image is queried or serialized.
+    """
+
+    pagination_class = ImagePagination
+
+    def get(self, request, *args, **kwargs):
+        """Lists the images, or responds with 304 Not Modified if they have not changed since the client listed them.
+
+        Returns:
+            HttpResponse: The HTTP response object.
+        """
+        etag = self.get_etag(request)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = self.list(request, *args, **kwargs)
+        return self.set_etag(response, etag)
+
+    def get_etag(self, request):
+        """Computes the ETag of the list without touching the images.
+
+        The ETag is derived from the version stamp of the user's images, see `get_image_list_version`, the user's
+        permissions, which decide the thumbnails and original files listed, the fields and thumbnails selected in the
+        request, the version of thumbnail URLs handed out by the thumbnail backend, and the requested URL and media
+        type. The selection is validated first, so an invalid one is rejected even for a client holding a current ETag.
+
+        Returns:
+            str: strong ETag (quoted)
+
+        Raises:
+            ValidationError: If the `fields` or `thumbnails` query parameters are invalid.
+        """
+        serializer = self.get_serializer()
+        heights = serializer.selected_heights
+        permissions = UserGroupPermissions.for_request(request)
+        parts = [
+            get_image_list_version(request.user.pk),
+            *sorted(permissions.permissions),
+            ",".join(sorted(serializer.fields)),
+            "*" if heights is None else ",".join(sorted(heights, key=int)),
+            get_thumbnail_backend().get_urls_version(),
+            request.get_full_path(),
+            request.accepted_media_type,
+        ]
+        digest = hashlib.sha256("\n".join(parts).encode()).hexdigest()
+        return f'"{digest[:32]}"'
+
+    def set_etag(self, response, etag):
+        """Sets the ETag of the list on the response, requiring caches to revalidate the list on every use."""
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
 
     def get_queryset(self):
         """Filters the Image queryset to return only images owned by the requesting user.
 
+        Only the columns needed for the fields selected in the request are loaded, see `ImageSerializer.select_fields`.
+
         Returns:
             QuerySet: A queryset of Image objects owned by the requesting user.
         """
-        return Image.objects.filter(user=self.request.user)
+        fields = self.get_serializer().get_loaded_fields()
+        return Image.objects.filter(user=self.request.user).only(*fields)
 
 
 class GenerateExpiringLinkView(generics.CreateAPIView):
@@ -72,10 +520,15 @@ class GenerateExpiringLinkView(generics.CreateAPIView):
 
         Additionally, this view accepts a query parameter `image_id` for specifying the image for which the link should be generated.
 
+        With `EXPIRING_LINK_FORMAT` set to `"signed"`, a stateless signed link is generated instead, see `create_signed`.
+
         Returns:
             Response: The HTTP response object.
         """
 
+        if settings.EXPIRING_LINK_FORMAT == "signed":
+            return self.create_signed(request)
+
         response = super().create(request, *args, **kwargs)
         if response.status_code == status.HTTP_201_CREATED:
             alias = response.data.get("alias")
@@ -86,20 +539,278 @@ class GenerateExpiringLinkView(generics.CreateAPIView):
     def perform_create(self, serializer):
         """Save the expiring link object to the database and sets the cache.
 
-        The method saves the expiring link object to the database, and sets a cache with a timeout as specified in the request data.
+        The method saves the expiring link object to the database, and caches the record needed to serve the link with a timeout as specified in the request data.
         """
 
-        data = serializer.validated_data
         image = get_object_or_404(Image, id=self.kwargs.get("image_id"))
         obj = serializer.save(image=image)
-        cache.set(str(obj.alias), "valid", timeout=data.get("expires_in"))
+        cache_link_record(obj.alias, build_link_record(obj, image))
 
+    def create_signed(self, request):
+        """Generates a stateless link signed with the current signing key.
 
-class ExpiringLinkRedirectView(APIView):
+        The link is validated without cache or database access. It is recorded in the `ExpiringLink` audit log
+        asynchronously, off the request path.
+
+        Returns:
+            Response: The HTTP response object.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        expires_in = serializer.validated_data["expires_in"]
+        image = get_object_or_404(
+            Image.objects.only("id"), id=self.kwargs.get("image_id")
+        )
+
+        token, alias = sign_link(image.id, int(time.time()) + expires_in)
+        audit_link(alias, image.id, expires_in)
+
+        url = reverse(
+            "images:signed-image-link", kwargs={"token": token}, request=request
+        )
+        return Response({"url": url}, status=status.HTTP_201_CREATED)
+
+
+class BulkGenerateExpiringLinksView(generics.GenericAPIView):
+    """
+    API view that generates expiring links for several images of the user at once.
+
+    The view expects a POST request with a JSON payload containing the following fields:
+    - `image_ids`: the list of ids of the images, at most `EXPIRING_LINK_BULK_MAX_IMAGES` of them
+    - `expires_in`: the number of seconds until the links should expire
+
+    The response will be a JSON object with a `urls` field mapping each image id to its generated link.
+
+    The images are checked for ownership with a single query, the links are inserted with a single query and their
+    records are cached in one batch. If any of the images does not exist or belongs to another user, no links are
+    generated and a 400 Bad Request response listing the ids will be returned.
+    """
+
+    serializer_class = BulkExpiringLinkSerializer
+    permission_classes = [HasExpiringLinkPermission]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        image_ids = serializer.validated_data["image_ids"]
+        expires_in = serializer.validated_data["expires_in"]
+
+        images = {
+            image.id: image
+            for image in Image.objects.filter(id__in=image_ids, user=request.user)
+        }
+        missing = [str(image_id) for image_id in image_ids if image_id not in images]
+        if missing:
+            raise ValidationError({"image_ids": {"not_found": missing}})
+
+        if settings.EXPIRING_LINK_FORMAT == "signed":
+            urls = self.create_signed(image_ids, expires_in)
+        else:
+            urls = self.create_links(
+                [images[image_id] for image_id in image_ids], expires_in
+            )
+        return Response({"urls": urls}, status=status.HTTP_201_CREATED)
+
+    def create_links(self, images, expires_in):
+        """Inserts links to the images and caches their records.
+
+        Returns:
+            dict: image id to the URL of its link
+        """
+        expires_at = timezone.now() + timedelta(seconds=expires_in)
+        links = ExpiringLink.objects.bulk_create(
+            ExpiringLink(image=image, expires_in=expires_in, expires_at=expires_at)
+            for image in images
+        )
+        image_files = get_cached_image_files(images)
+        cache_link_records(
+            {
+                link.alias: LinkRecord(
+                    expires_at=link.expires_at.timestamp(),
+                    delivery=link.delivery,
+                    **image_files[link.image_id],
+                )
+                for link in links
+            }
+        )
+        return {
+            str(link.image_id): reverse(
+                "images:image-link", kwargs={"alias": link.alias}, request=self.request
+            )
+            for link in links
+        }
+
+    def create_signed(self, image_ids, expires_in):
+        """Signs stateless links to the images and records them in the audit log in one batch.
+
+        Returns:
+            dict: image id to the URL of its link
+        """
+        expires_at = int(time.time()) + expires_in
+        urls, aliases = {}, {}
+        for image_id in image_ids:
+            token, alias = sign_link(image_id, expires_at)
+            aliases[alias] = image_id
+            urls[str(image_id)] = reverse(
+                "images:signed-image-link",
+                kwargs={"token": token},
+                request=self.request,
+            )
+        audit_links(aliases, expires_in)
+        return urls
+
+
+class StorageFileView(APIView):
+    """A base view class for serving files from the default storage.
+
+    Files are served with a strong ETag taken from the storage object metadata. Conditional requests are answered with
+    `304 Not Modified` and single byte ranges are served with `206 Partial Content`, reading only the requested bytes
+    from the storage.
+    """
+
+    def serve(self, request, name, content_type, metadata=None):
+        """Serves a stored file, honouring conditional and range requests.
+
+        Args:
+            request (Request): request object
+            name (str): name of the file in the default storage
+            content_type (str): media type of the file
+            metadata (dict, optional): `size`, `etag` and `last_modified` of the file, read from the storage if not given
+
+        Returns:
+            HttpResponseBase: response with the file, a part of it, or a conditional response
+        """
+        if metadata is None:
+            metadata = default_storage.get_object_metadata(name)
+
+        response, byte_range = self.evaluate_request(request, metadata)
+        if response is not None:
+            return response
+
+        if byte_range is None:
+            response = FileResponse(
+                default_storage.open(name), content_type=content_type
+            )
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                iter_file(default_storage.open_range(name, start, end)),
+                content_type=content_type,
+            )
+        return self.finalize_file_response(response, metadata, byte_range)
+
+    async def aserve(self, request, name, content_type, metadata=None):
+        """Async variant of `serve`, streaming the file from the storage without blocking the event loop.
+
+        Returns:
+            HttpResponseBase: response with the file, a part of it, or a conditional response
+        """
+        if metadata is None:
+            metadata = await sync_to_async(
+                default_storage.get_object_metadata, thread_sensitive=False
+            )(name)
+
+        response, byte_range = self.evaluate_request(request, metadata)
+        if response is not None:
+            return response
+
+        start, end = byte_range or (0, None)
+        file = await sync_to_async(default_storage.open_range, thread_sensitive=False)(
+            name, start, end
+        )
+        response = StreamingHttpResponse(aiter_file(file), content_type=content_type)
+        return self.finalize_file_response(response, metadata, byte_range)
+
+    def evaluate_request(self, request, metadata):
+        """Evaluates conditional and range headers of a request for a file.
+
+        Args:
+            request (Request): request object
+            metadata (dict): `size`, `etag` and `last_modified` of the file
+
+        Returns:
+            tuple: response to return instead of the file (`304`, `412` or `416`) or None, and the byte range to serve
+                or None for the full file
+        """
+        etag = metadata["etag"]
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=metadata["last_modified"]
+        )
+        if response is not None:
+            response.headers["ETag"] = etag
+            return response, None
+
+        try:
+            byte_range = parse_range_header(
+                request.META.get("HTTP_RANGE"), metadata["size"]
+            )
+        except RangeNotSatisfiable:
+            response = HttpResponse(
+                status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+            )
+            response.headers["Content-Range"] = f"bytes */{metadata['size']}"
+            return response, None
+
+        if_range = request.META.get("HTTP_IF_RANGE")
+        if if_range and if_range != etag:
+            byte_range = None
+        return None, byte_range
+
+    def finalize_file_response(self, response, metadata, byte_range):
+        """Sets the status and headers of a response serving a file or a byte range of it.
+
+        The served bytes are counted in the `imagify_storage_bytes_total` metric.
+
+        Returns:
+            HttpResponseBase: the response
+        """
+        if byte_range is None:
+            response.headers["Content-Length"] = metadata["size"]
+        else:
+            start, end = byte_range
+            response.status_code = status.HTTP_206_PARTIAL_CONTENT
+            response.headers["Content-Length"] = end - start + 1
+            response.headers["Content-Range"] = (
+                f"bytes {start}-{end}/{metadata['size']}"
+            )
+        STORAGE_BYTES.inc(int(response.headers["Content-Length"]), direction="out")
+
+        response.headers["ETag"] = metadata["etag"]
+        response.headers["Last-Modified"] = http_date(metadata["last_modified"])
+        response.headers["Accept-Ranges"] = "bytes"
+        return response
+
+
+class LocalPresignedMediaView(StorageFileView):
+    """API view standing in for S3 when serving presigned URLs generated by `LocalMediaStorage`."""
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        """Handles GET requests serving the file the presigned URL points to."""
+        if not hasattr(default_storage, "resolve_presigned_url"):
+            raise NotFound()
+
+        try:
+            name, content_type = default_storage.resolve_presigned_url(
+                self.kwargs.get("token")
+            )
+        except PresignedRequestDenied:
+            return Response(status=status.HTTP_403_FORBIDDEN)
+
+        return self.serve(request, name, content_type or mimetypes.guess_type(name)[0])
+
+
+class ExpiringLinkRedirectView(StorageFileView):
     """API view to handle the redirection to the original image file via an expiring link.
 
     This view extracts the alias from the URL, checks the cache to see if the link is still valid,
     and either redirects the client to the original image file or responds with a `410 Gone` status if the link has expired.
+
+    Depending on the delivery mode of the link (see `EXPIRING_LINK_DELIVERY` setting), the file is either proxied
+    through this view or the client is redirected to a presigned storage URL expiring together with the link.
     """
 
     def get(self, request, *args, **kwargs):
@@ -107,17 +818,76 @@ class ExpiringLinkRedirectView(APIView):
 
         Returns:
             FileResponse: A response object with the original image file if the link is valid.
+            HttpResponseRedirect: A response object redirecting to a presigned storage URL of the original image file.
+            StreamingHttpResponse: A response object with the requested range of the original image file.
+            HttpResponse: A response object with a `304 Not Modified` or `416 Range Not Satisfiable` status.
             Response: A response object with a `410 Gone` status if the link has expired.
         """
 
-        alias = self.kwargs.get("alias")
-        if cache.get(alias):
-            link = get_object_or_404(ExpiringLink, alias=alias)
-            image = link.image
+        record = self.get_record()
+        if record is None:
+            return self.expired()
 
-            return FileResponse(
-                default_storage.open(image.original_file.name),
-                content_type="image/jpeg",
+        if self.get_delivery(record) == ExpiringLink.Delivery.REDIRECT:
+            return self.redirect(record)
+        return self.serve(
+            request, record.name, record.content_type, metadata=record._asdict()
+        )
+
+    def get_delivery(self, record):
+        """Returns the delivery mode of the link, falling back to the `EXPIRING_LINK_DELIVERY` setting."""
+        return record.delivery or settings.EXPIRING_LINK_DELIVERY
+
+    def redirect(self, record):
+        """Redirects to a presigned storage URL of the original image file, expiring no later than the link.
+
+        Returns:
+            HttpResponseRedirect: A response object redirecting to the presigned storage URL.
+            Response: A response object with a `410 Gone` status if the link has expired.
+        """
+        expires_in = min(
+            int(record.expires_at - time.time()),
+            settings.EXPIRING_LINK_REDIRECT_MAX_EXPIRES_IN,
+        )
+        if expires_in <= 0:
+            return self.expired()
+        return HttpResponseRedirect(
+            default_storage.generate_presigned_url(
+                record.name,
+                expires_in=expires_in,
+                content_type=record.content_type,
             )
-        else:
-            return Response({"msg": "Link has expired"}, status=status.HTTP_410_GONE)
+        )
+
+    def get_record(self):
+        """Resolves the link into the record needed to serve it.
+
+        Returns:
+            LinkRecord: record of the link, or None if the link has expired
+        """
+        return get_link_record(self.kwargs.get("alias"))
+
+    def expired(self):
+        """Responds with a `410 Gone` status, notifying that the link has expired."""
+        return Response({"msg": "Link has expired"}, status=status.HTTP_410_GONE)
+
+
+class SignedExpiringLinkView(ExpiringLinkRedirectView):
+    """API view to handle the redirection to the original image file via a stateless signed expiring link.
+
+    The link is validated by its signature and expiry alone. The original image file is looked up by the image id
+    encoded in the link, through the cache.
+    """
+
+    def get_record(self):
+        try:
+            image_id, expires_at, _ = verify_link(self.kwargs.get("token"))
+        except ExpiredSignedLink:
+            return None
+        except InvalidSignedLink:
+            raise NotFound()
+
+        image_file = get_cached_image_file(image_id)
+        if image_file is None:
+            return None
+        return LinkRecord(expires_at=expires_at, delivery="", **image_file)
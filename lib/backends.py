@@ -0,0 +1,20 @@
+from django.contrib.auth.backends import ModelBackend
+from .shared import UserGroupPermissions
+
+
+class CachedPermissionsBackend(ModelBackend):
+    """Authentication backend resolving user and group permissions from the cached user tier.
+
+    Superusers are still resolved by `ModelBackend`, since they implicitly have every permission.
+    """
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if user_obj.is_superuser:
+            return super().get_all_permissions(user_obj, obj)
+        if not hasattr(user_obj, "_perm_cache"):
+            user_obj._perm_cache = set(
+                UserGroupPermissions.get_user_permissions(user_obj).permissions
+            )
+        return user_obj._perm_cache
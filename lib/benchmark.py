@@ -0,0 +1,101 @@
+import statistics
+import time
+import tracemalloc
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+# percentiles of request latencies reported by `measure`
+PERCENTILES = (50, 90, 99)
+
+
+def measure(func, iterations, warmup=1, traced_iterations=10):
+    """Measures latency, database queries and memory allocations of calls to a function.
+
+    Latencies and queries are measured over `iterations` calls after `warmup` calls. Allocations are measured over
+    additional calls with `tracemalloc` enabled, since tracing slows every allocation down and would skew latencies.
+
+    Args:
+        func (Callable[[], None]): function to measure, e.g. sending one request
+        iterations (int): number of measured calls
+        warmup (int, optional): number of calls made before measuring, filling caches and connections
+        traced_iterations (int, optional): number of calls made with allocation tracing
+
+    Returns:
+        dict: `p50`, `p90` and `p99` latencies and `mean` latency in milliseconds, median number of `queries` per call
+            and median `peak_kib` of memory allocated during a call
+    """
+    for _ in range(warmup):
+        func()
+
+    latencies = []
+    queries = []
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            func()
+            latencies.append((time.perf_counter() - start) * 1000)
+        queries.append(len(context.captured_queries))
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(traced_iterations):
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            func()
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    finally:
+        tracemalloc.stop()
+
+    result = {
+        f"p{percentile}": latency
+        for percentile, latency in zip(PERCENTILES, percentiles(latencies))
+    }
+    result["mean"] = statistics.fmean(latencies)
+    result["queries"] = statistics.median_low(queries)
+    result["peak_kib"] = statistics.median(peaks) / 1024 if peaks else 0
+    return result
+
+
+def percentiles(values):
+    """Returns the `PERCENTILES` of the values, interpolated between the closest ones.
+
+    Returns:
+        list: percentiles in the order of `PERCENTILES`
+    """
+    if len(values) == 1:
+        return [values[0]] * len(PERCENTILES)
+    cut_points = statistics.quantiles(values, n=100, method="inclusive")
+    return [cut_points[percentile - 1] for percentile in PERCENTILES]
+
+
+def compare(baseline, results, threshold):
+    """Compares benchmark results with a baseline, flagging regressions.
+
+    Median latency and allocations regress when they grow by more than the given fraction of the baseline, as they vary
+    between runs. The number of queries is deterministic, so any growth is a regression.
+
+    Args:
+        baseline (dict): results of the baseline run, by benchmark name
+        results (dict): results of the current run, by benchmark name
+        threshold (float): tolerated relative growth of latency and allocations
+
+    Returns:
+        list: descriptions of the regressions
+    """
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in ("p50", "peak_kib"):
+            if previous[metric] and result[metric] > previous[metric] * (1 + threshold):
+                regressions.append(
+                    f"{name}: {metric} {previous[metric]:.2f} -> {result[metric]:.2f} "
+                    f"(+{(result[metric] / previous[metric] - 1) * 100:.0f}%)"
+                )
+        if result["queries"] > previous["queries"]:
+            regressions.append(
+                f"{name}: queries {previous['queries']} -> {result['queries']}"
+            )
+    return regressions
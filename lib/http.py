@@ -0,0 +1,73 @@
+from asgiref.sync import sync_to_async
+import re
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised when a requested byte range lies outside of the resource."""
+
+
+def parse_range_header(header, size):
+    """Parses a single byte range from a `Range` header.
+
+    Only single ranges are supported. Multiple ranges and malformed headers are ignored, so the full resource is served
+    as RFC 7233 allows.
+
+    Args:
+        header (str): value of the `Range` header
+        size (int): size of the resource in bytes
+
+    Raises:
+        RangeNotSatisfiable: If the range does not overlap the resource.
+
+    Returns:
+        tuple: offsets of the first and the last byte of the range (inclusive), or None to serve the full resource
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ("", ""):
+        return None
+
+    first, last = match.groups()
+    if not first:
+        suffix_length = int(last)
+        if suffix_length == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(size - suffix_length, 0), size - 1
+
+    start = int(first)
+    if last and start > int(last):
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+def iter_file(file, chunk_size=64 * 1024):
+    """Iterates over a file in chunks, closing it once exhausted or when the iteration is closed."""
+    try:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        file.close()
+
+
+async def aiter_file(file, chunk_size=64 * 1024):
+    """Asynchronously iterates over a file in chunks, see `iter_file`.
+
+    Each chunk is read in a worker thread, so a slow storage read does not block the event loop and one process can
+    stream many files concurrently.
+    """
+    read = sync_to_async(file.read, thread_sensitive=False)
+    try:
+        while True:
+            chunk = await read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        await sync_to_async(file.close, thread_sensitive=False)()
@@ -0,0 +1,248 @@
+import functools
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django_redis.cache import RedisCache
+from lib.metrics import BACKEND_DURATION, STORAGE_BYTES
+
+logger = logging.getLogger(__name__)
+
+# timings of the request being handled, None when the request is not sampled
+_request_timings = ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """Total durations and counts of the spans recorded while handling a request.
+
+    Spans are named by the kind of work they time, e.g. `db` or `cache`. A span nested in a span of the same name is not
+    recorded, so wrapping methods that call each other does not count the same time twice.
+    """
+
+    def __init__(self):
+        self.spans = {}
+        self.active = set()
+
+    def add(self, name, duration):
+        """Records a span of the given duration in seconds."""
+        total, count = self.spans.get(name, (0.0, 0))
+        self.spans[name] = (total + duration, count + 1)
+
+    def get_server_timing(self, total):
+        """Returns the value of the `Server-Timing` header, one metric per span name and the total duration.
+
+        Args:
+            total (float): duration of the whole request in seconds
+
+        Returns:
+            str: header value
+        """
+        metrics = [
+            f'{name};dur={duration * 1000:.2f};desc="{count} calls"'
+            for name, (duration, count) in self.spans.items()
+        ]
+        metrics.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(metrics)
+
+    def get_summary(self, request, response, total):
+        """Returns the structured summary of the request that is logged.
+
+        Returns:
+            dict: request method, path, response status, total duration and spans with durations in milliseconds
+        """
+        return {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 2),
+            "spans": {
+                name: {"ms": round(duration * 1000, 2), "count": count}
+                for name, (duration, count) in self.spans.items()
+            },
+        }
+
+
+@contextmanager
+def span(name):
+    """Times the wrapped block as a span of the given name, if the current request is sampled.
+
+    Args:
+        name (str): name of the span, e.g. `storage`
+    """
+    timings = _request_timings.get()
+    if timings is None or name in timings.active:
+        yield
+        return
+
+    timings.active.add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+        timings.active.discard(name)
+
+
+def timed(name):
+    """Decorator timing calls of a function as spans of the given name, see `span`."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def time_query(execute, sql, params, many, context):
+    """Database execute wrapper timing queries as `db` spans."""
+    with span("db"):
+        return execute(sql, params, many, context)
+
+
+def instrument_connection(connection, **kwargs):
+    """Installs the `time_query` execute wrapper on a database connection, once."""
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+def instrument_methods(cls, name, method_names):
+    """Wraps methods inherited by a mixin class from the classes following it in the MRO in spans of the given name.
+
+    Args:
+        cls (type): mixin class
+        name (str): name of the spans
+        method_names (Iterable[str]): names of the methods
+    """
+
+    def wrap(method_name):
+        def method(self, *args, **kwargs):
+            with span(name):
+                return getattr(super(cls, self), method_name)(*args, **kwargs)
+
+        method.__name__ = method_name
+        return method
+
+    for method_name in method_names:
+        setattr(cls, method_name, wrap(method_name))
+
+
+class InstrumentedCacheMixin:
+    """Mixin for cache backends timing cache calls as `cache` spans."""
+
+
+instrument_methods(
+    InstrumentedCacheMixin,
+    "cache",
+    (
+        "get",
+        "get_many",
+        "set",
+        "set_many",
+        "add",
+        "touch",
+        "delete",
+        "delete_many",
+        "incr",
+    ),
+)
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    """`LocMemCache` timing cache calls, see `InstrumentedCacheMixin`."""
+
+
+class InstrumentedRedisCache(InstrumentedCacheMixin, RedisCache):
+    """`RedisCache` of django-redis timing cache calls, see `InstrumentedCacheMixin`."""
+
+
+class InstrumentedStorageMixin:
+    """Mixin for storages timing file I/O as `storage` spans and URL generation as `sign` spans.
+
+    Only the methods of the `Storage` API are wrapped; storages time their own methods with the `timed` decorator.
+    Bytes written are counted in `STORAGE_BYTES`.
+    """
+
+    def _save(self, name, content):
+        with span("storage"):
+            name = super()._save(name, content)
+        STORAGE_BYTES.inc(content.size, direction="in")
+        return name
+
+
+instrument_methods(
+    InstrumentedStorageMixin, "storage", ("_open", "delete", "exists", "size")
+)
+instrument_methods(InstrumentedStorageMixin, "sign", ("url",))
+
+
+class ServerTimingMiddleware:
+    """Middleware timing the hot paths of sampled requests.
+
+    A sampled request collects spans of database queries, cache calls, storage I/O, URL signing, permission resolution
+    and rendering. Their totals are sent in the `Server-Timing` header, when `SERVER_TIMING_HEADER` is set, and logged
+    as a structured summary. `SERVER_TIMING_SAMPLE_RATE` sets the fraction of requests sampled; requests that are not
+    sampled only pay for a random draw and a context variable lookup per span.
+
+    The middleware supports both sync and async requests, so requests to async views are not run through a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        connection_created.connect(instrument_connection)
+        for connection in connections.all(initialized_only=True):
+            instrument_connection(connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if random.random() >= settings.SERVER_TIMING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        timings = RequestTimings()
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_timings.reset(token)
+        return self.report(request, response, timings, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if random.random() >= settings.SERVER_TIMING_SAMPLE_RATE:
+            return await self.get_response(request)
+
+        timings = RequestTimings()
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_timings.reset(token)
+        return self.report(request, response, timings, time.perf_counter() - start)
+
+    def report(self, request, response, timings, total):
+        """Records the spans of a sampled request, sets the `Server-Timing` header and logs the summary."""
+        for name, (duration, _) in timings.spans.items():
+            BACKEND_DURATION.observe(duration, backend=name)
+        if settings.SERVER_TIMING_HEADER:
+            response["Server-Timing"] = timings.get_server_timing(total)
+        summary = timings.get_summary(request, response, total)
+        logger.info(json.dumps(summary), extra={"timings": summary})
+        return response
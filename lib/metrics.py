@@ -0,0 +1,261 @@
+import bisect
+import math
+import threading
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+
+# default histogram buckets for durations in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class MetricsRegistry:
+    """Registry of metrics collected per thread and merged when exposed.
+
+    Every thread updates its own store of metric values, so recording a value takes no lock and never contends with
+    other threads. The lock is only taken when a thread records its first value and when the stores are merged.
+    Servers may run every request in a new thread, so the stores of threads that have ended are folded into a retained
+    total whenever the stores are merged or a new one is added, keeping their number bounded by the live threads.
+    Values are kept per process; every process of the server exposes its own.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.stores = []
+        self.retired = {}
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        """Registers a metric, returning the already registered one of the same name if any."""
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def get_store(self):
+        """Returns the store of metric values of the current thread, keyed by metric name and labels."""
+        store = getattr(self.local, "store", None)
+        if store is None:
+            store = self.local.store = {}
+            with self.lock:
+                self.retire_stores()
+                self.stores.append((threading.current_thread(), store))
+        return store
+
+    def retire_stores(self):
+        """Folds the stores of threads that have ended into the retained total, with the lock held.
+
+        Ended threads no longer write to their stores, so they are merged without copying.
+        """
+        live = []
+        for thread, store in self.stores:
+            if thread.is_alive():
+                live.append((thread, store))
+            else:
+                self.merge_into(self.retired, store)
+        self.stores = live
+
+    def merge_into(self, merged, store):
+        for key, value in store.items():
+            merged[key] = self.metrics[key[0]].merge(merged.get(key), value)
+
+    def collect(self):
+        """Merges the values recorded by all threads, including the ones that have ended.
+
+        Returns:
+            dict: values keyed by `(metric name, labels)` pairs
+        """
+        merged = {}
+        with self.lock:
+            self.retire_stores()
+            self.merge_into(merged, self.retired)
+            stores = [store for _, store in self.stores]
+        for store in stores:
+            self.merge_into(merged, store.copy())
+        return merged
+
+    def expose(self):
+        """Renders all metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: metrics
+        """
+        values = self.collect()
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            for (metric_name, labels), value in sorted(values.items()):
+                if metric_name == name:
+                    lines.extend(metric.expose(labels, value))
+        return "\n".join(lines) + "\n"
+
+
+class Counter:
+    """Monotonically increasing counter, e.g. of requests or bytes.
+
+    Args:
+        name (str): name of the metric
+        documentation (str): description of the metric
+        registry (MetricsRegistry, optional): registry of the metric, the default one if not given
+    """
+
+    type = "counter"
+
+    def __init__(self, name, documentation, registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.registry = registry or REGISTRY
+        self.registry.register(self)
+
+    def inc(self, amount=1, **labels):
+        """Increments the counter of the given labels."""
+        store = self.registry.get_store()
+        key = (self.name, tuple(sorted(labels.items())))
+        store[key] = store.get(key, 0) + amount
+
+    def merge(self, merged, value):
+        return value if merged is None else merged + value
+
+    def expose(self, labels, value):
+        return [f"{self.name}{format_labels(labels)} {format_value(value)}"]
+
+
+class Histogram:
+    """Histogram of observed values, e.g. latencies or sizes, counted in cumulative buckets.
+
+    Args:
+        name (str): name of the metric
+        documentation (str): description of the metric
+        buckets (tuple): upper bounds of the buckets, in ascending order
+        registry (MetricsRegistry, optional): registry of the metric, the default one if not given
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, buckets=DURATION_BUCKETS, registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.registry = registry or REGISTRY
+        self.registry.register(self)
+
+    def observe(self, value, **labels):
+        """Records a value observed for the given labels."""
+        store = self.registry.get_store()
+        key = (self.name, tuple(sorted(labels.items())))
+        entry = store.get(key)
+        if entry is None:
+            # counts per bucket, the last one past the highest bound, and the sum of the values
+            entry = store[key] = [[0] * (len(self.buckets) + 1), 0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def merge(self, merged, value):
+        counts, total = value
+        if merged is None:
+            return [list(counts), total]
+        return [[a + b for a, b in zip(merged[0], counts)], merged[1] + total]
+
+    def expose(self, labels, value):
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            bucket_labels = labels + (("le", format_value(bound)),)
+            lines.append(
+                f"{self.name}_bucket{format_labels(bucket_labels)} {cumulative}"
+            )
+        lines.append(f"{self.name}_sum{format_labels(labels)} {format_value(total)}")
+        lines.append(f"{self.name}_count{format_labels(labels)} {cumulative}")
+        return lines
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def format_value(value):
+    return "+Inf" if value == math.inf else repr(value)
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_DURATION = Histogram(
+    "imagify_request_duration_seconds",
+    "Duration of requests by view and method.",
+)
+BACKEND_DURATION = Histogram(
+    "imagify_backend_duration_seconds",
+    "Time spent per request in a backend (db, cache, storage, sign, permissions, render), of timed requests only.",
+)
+STORAGE_BYTES = Counter(
+    "imagify_storage_bytes_total",
+    "Bytes of files written to (in) and served from (out) the media storage by the API.",
+)
+
+
+class MetricsMiddleware:
+    """Middleware recording the duration of every request in `REQUEST_DURATION`, labelled by the resolved view.
+
+    The middleware supports both sync and async requests, so requests to async views are not run through a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self.observe(request, start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self.observe(request, start)
+        return response
+
+    def observe(self, request, start):
+        resolver_match = getattr(request, "resolver_match", None)
+        REQUEST_DURATION.observe(
+            time.perf_counter() - start,
+            view=resolver_match.view_name if resolver_match else "unresolved",
+            method=request.method,
+        )
+
+
+def metrics_view(request):
+    """Exposes the metrics of this process to Prometheus.
+
+    The endpoint is only enabled when `METRICS_TOKEN` is set, and scrapers authenticate with it as a bearer token.
+
+    Raises:
+        Http404: If the endpoint is disabled.
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        raise Http404()
+    if not constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    ):
+        return HttpResponse(status=401, headers={"WWW-Authenticate": "Bearer"})
+    return HttpResponse(
+        REGISTRY.expose(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
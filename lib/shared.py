@@ -1,28 +1,124 @@
-from typing import Any
+import time
+from django.conf import settings
 from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.db.models import Q
+from lib.instrumentation import timed
+
+USER_PERMISSIONS_CACHE_KEY = "user-permissions:{user_id}"
+USER_PERMISSIONS_VERSION_CACHE_KEY = "user-permissions-version:{user_id}"
+USER_PERMISSIONS_GENERATION_CACHE_KEY = "user-permissions:generation"
 
 
 class UserGroupPermissions:
-    """Helper class for checking user permissions including permissions from groups."""
+    """Helper class for checking user permissions including permissions from groups.
+
+    A resolved instance represents the user's tier. It is kept in the configured cache together with the stamp it was
+    resolved under: a generation counter shared by all users, bumped when any group's permissions change, and a
+    version counter of the user, bumped when the user's groups or permissions change. Entries are only used while
+    both counters still match, so a request that loaded permissions before a change can write them back afterwards
+    without them ever being used.
+    """
 
-    def __init__(self, permissions):
-        self.permissions = permissions
+    def __init__(self, permissions, generation=0):
+        self.permissions = frozenset(permissions)
+        self.generation = generation
 
     @classmethod
+    @timed("permissions")
     def get_user_permissions(cls, user):
         """Gets all permissions for a user including permissions from groups.
 
+        The resolved permissions are read from cache when available and loaded with a single query otherwise. The
+        counters are read before the permissions are loaded, so permissions loaded before a change are stamped with
+        the counters from before the change.
+
         Args:
             user (User): user object
 
         Returns:
-            Set: set of permission dicts
+            UserGroupPermissions: resolved permissions of the user
         """
-        user_permissions = user.user_permissions.all()
-        group_permissions = Permission.objects.filter(group__user=user)
-        all_permissions = set(user_permissions) | set(group_permissions)
+        if not user or not user.is_authenticated:
+            return cls(())
 
-        return cls(all_permissions)
+        key = USER_PERMISSIONS_CACHE_KEY.format(user_id=user.pk)
+        version_key = USER_PERMISSIONS_VERSION_CACHE_KEY.format(user_id=user.pk)
+        cached = cache.get_many(
+            [key, version_key, USER_PERMISSIONS_GENERATION_CACHE_KEY]
+        )
+        generation = cached.get(USER_PERMISSIONS_GENERATION_CACHE_KEY)
+        if generation is None:
+            generation = _seed_counter(USER_PERMISSIONS_GENERATION_CACHE_KEY)
+        version = cached.get(version_key)
+        if version is None:
+            version = _seed_counter(version_key)
+        entry = cached.get(key)
+        if entry is not None and entry[0] == (generation, version):
+            return cls(entry[1], generation)
+
+        permissions = cls.load_permissions(user)
+        cache.set(
+            key,
+            ((generation, version), tuple(permissions)),
+            timeout=settings.USER_PERMISSIONS_CACHE_TIMEOUT,
+        )
+        return cls(permissions, generation)
+
+    @classmethod
+    def for_request(cls, request):
+        """Gets permissions of the requesting user, resolving them at most once per request.
+
+        Args:
+            request (Request): request object
+
+        Returns:
+            UserGroupPermissions: resolved permissions of the requesting user
+        """
+        permissions = getattr(request, "_user_group_permissions", None)
+        if permissions is None:
+            permissions = cls.get_user_permissions(request.user)
+            request._user_group_permissions = permissions
+        return permissions
+
+    @staticmethod
+    def load_permissions(user):
+        """Loads all permissions of a user from the database in one query.
+
+        Args:
+            user (User): user object
+
+        Returns:
+            set: set of permission names in `app_label.codename` format
+        """
+        permissions = (
+            Permission.objects.filter(Q(user=user) | Q(group__user=user))
+            .values_list("content_type__app_label", "codename")
+            .distinct()
+        )
+        return {f"{app_label}.{codename}" for app_label, codename in permissions}
+
+    @staticmethod
+    def invalidate(*user_ids):
+        """Bumps the version counters of the given users, which invalidates their cached permissions."""
+        for user_id in user_ids:
+            _bump_counter(USER_PERMISSIONS_VERSION_CACHE_KEY.format(user_id=user_id))
+
+    @staticmethod
+    def invalidate_all():
+        """Bumps the generation counter, which invalidates cached permissions of all users."""
+        _bump_counter(USER_PERMISSIONS_GENERATION_CACHE_KEY)
+
+    def has_perm(self, perm):
+        """Checks if a permission exists in permissions set.
+
+        Args:
+            perm (str): permission name in `app_label.codename` format
+
+        Returns:
+            bool: True if the permission exists, False otherwise
+        """
+        return perm in self.permissions
 
     def contains(self, value):
         """Checks if a permission exists in permissions set.
@@ -33,7 +129,7 @@ class UserGroupPermissions:
         Returns:
             bool: True if the permission exists, False otherwise
         """
-        return any(perm.codename == value for perm in self.permissions)
+        return any(perm.split(".", 1)[1] == value for perm in self.permissions)
 
     def startswith(self, value):
         """Return permissions that start with the given value.
@@ -42,6 +138,27 @@ class UserGroupPermissions:
             value (str): permission codename prefix
 
         Returns:
-            tuple: permissions that start with the given value
+            generator: permission codenames that start with the given value
         """
-        return (perm for perm in self.permissions if perm.codename.startswith(value))
+        return (
+            codename
+            for codename in (perm.split(".", 1)[1] for perm in self.permissions)
+            if codename.startswith(value)
+        )
+
+
+def _seed_counter(key):
+    """Store a new invalidation counter unless one exists, and return the current value.
+
+    Counters are seeded with the current time in milliseconds rather than 0 or 1, so a counter evicted from cache
+    does not start over at a value entries were already stamped with.
+    """
+    cache.add(key, int(time.time() * 1000), timeout=None)
+    return cache.get(key)
+
+
+def _bump_counter(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        _seed_counter(key)
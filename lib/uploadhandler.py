@@ -0,0 +1,63 @@
+import hashlib
+from django.core.files.uploadhandler import (
+    MemoryFileUploadHandler,
+    TemporaryFileUploadHandler,
+)
+
+
+def hash_file(file, chunk_size=64 * 1024):
+    """Returns the SHA-256 hex digest of a file.
+
+    Files received by the hashing upload handlers were hashed while streaming in, other files are read once.
+
+    Args:
+        file (File): file to hash
+        chunk_size (int, optional): size of the chunks the file is read in
+
+    Returns:
+        str: hex digest of the file content
+    """
+    content_hash = getattr(file, "content_hash", None)
+    if content_hash is None:
+        hasher = hashlib.sha256()
+        for chunk in file.chunks(chunk_size):
+            hasher.update(chunk)
+        file.seek(0)
+        content_hash = file.content_hash = hasher.hexdigest()
+    return content_hash
+
+
+class HashingUploadHandlerMixin:
+    """Mixin for upload handlers computing the SHA-256 digest of files while they stream in.
+
+    Only chunks consumed by the handler itself are hashed, so chaining several hashing handlers hashes every file once.
+    The digest is set as the `content_hash` attribute of the uploaded file.
+    """
+
+    def new_file(self, *args, **kwargs):
+        self.hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        data = super().receive_data_chunk(raw_data, start)
+        if data is None:
+            self.hasher.update(raw_data)
+        return data
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.content_hash = self.hasher.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(
+    HashingUploadHandlerMixin, MemoryFileUploadHandler
+):
+    """`MemoryFileUploadHandler` hashing uploaded files, see `HashingUploadHandlerMixin`."""
+
+
+class HashingTemporaryFileUploadHandler(
+    HashingUploadHandlerMixin, TemporaryFileUploadHandler
+):
+    """`TemporaryFileUploadHandler` hashing uploaded files, see `HashingUploadHandlerMixin`."""
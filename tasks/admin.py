@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import QueuedTask
+
+
+@admin.register(QueuedTask)
+class QueuedTaskAdmin(admin.ModelAdmin):
+    readonly_fields = ("task", "args", "kwargs", "attempts", "created_at", "error")
+    list_display = ("task", "status", "attempts", "run_at", "created_at")
+    list_filter = ("status", "task")
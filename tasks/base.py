@@ -0,0 +1,112 @@
+import json
+import uuid
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+# tasks by name, see `task`
+registry = {}
+
+
+class Task:
+    """Function run in the background by task workers, see `task`.
+
+    Calling the task runs the function right away. `delay` queues it with the configured broker instead, once the
+    current transaction commits. Arguments of queued tasks are serialized as JSON, so the function receives UUIDs and
+    datetimes as strings and tuples as lists.
+
+    Args:
+        func (Callable): function run by the task
+        max_attempts (int, optional): number of attempts before the task is given up, `TASKS_MAX_ATTEMPTS` if not given
+        retry_backoff (float, optional): delay of the first retry in seconds, doubled for every further one,
+            `TASKS_RETRY_BACKOFF` if not given
+    """
+
+    def __init__(self, func, max_attempts=None, retry_backoff=None):
+        self.func = func
+        self.name = f"{func.__module__}.{func.__qualname__}"
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        """Queue the task once the current transaction commits, or right away outside of a transaction.
+
+        Failing to queue the task is logged and does not fail the transaction.
+        """
+        transaction.on_commit(lambda: self.enqueue(args, kwargs), robust=True)
+
+    def enqueue(self, args=(), kwargs=None, eta=None):
+        """Queue the task with the configured broker.
+
+        With `TASKS_EAGER` set, due tasks are then run in the current thread, see `Worker.run`.
+
+        Args:
+            args (tuple, optional): positional arguments of the function
+            kwargs (dict, optional): keyword arguments of the function
+            eta (float, optional): UNIX timestamp the task is run at the earliest, right away if not given
+        """
+        from .brokers import get_broker
+        from .worker import run_eagerly
+
+        broker = get_broker()
+        broker.enqueue(self.get_message(args, kwargs), eta)
+        if settings.TASKS_EAGER:
+            run_eagerly(broker)
+
+    def get_message(self, args=(), kwargs=None):
+        """Return the message queued for running the task with the given arguments, see `BaseBroker`."""
+        message = {
+            "id": uuid.uuid4().hex,
+            "task": self.name,
+            "args": args,
+            "kwargs": kwargs or {},
+            "attempts": 0,
+        }
+        return json.loads(json.dumps(message, cls=DjangoJSONEncoder))
+
+    def get_max_attempts(self):
+        return self.max_attempts or settings.TASKS_MAX_ATTEMPTS
+
+    def get_retry_delay(self, attempt):
+        """Return the delay before retrying the task after the given attempt failed, growing exponentially.
+
+        Args:
+            attempt (int): number of the failed attempt, starting at 1
+
+        Returns:
+            float: delay in seconds, at most `TASKS_RETRY_BACKOFF_MAX`
+        """
+        backoff = self.retry_backoff or settings.TASKS_RETRY_BACKOFF
+        return min(backoff * 2 ** (attempt - 1), settings.TASKS_RETRY_BACKOFF_MAX)
+
+
+def task(func=None, **options):
+    """Decorator turning a module-level function into a `Task`, registered under the dotted path of the function.
+
+    Can be used bare or with the options of `Task`, e.g. `@task(max_attempts=3)`.
+    """
+
+    def decorator(func):
+        instance = Task(func, **options)
+        registry[instance.name] = instance
+        return instance
+
+    return decorator if func is None else decorator(func)
+
+
+def get_task(name):
+    """Return the task of the given name, importing the module defining it if needed.
+
+    Raises:
+        ImportError: If there is no task of the given name.
+    """
+    if name not in registry:
+        obj = import_string(name)
+        if not isinstance(obj, Task):
+            raise ImportError(f"{name} is not a task")
+    return registry[name]
@@ -0,0 +1,256 @@
+import heapq
+import itertools
+import json
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import QueuedTask
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Return the broker configured with the `TASKS_BROKER` setting, shared by the whole process."""
+    global _broker
+    if _broker is None or _broker.path != settings.TASKS_BROKER:
+        with _broker_lock:
+            if _broker is None or _broker.path != settings.TASKS_BROKER:
+                broker = import_string(settings.TASKS_BROKER)()
+                broker.path = settings.TASKS_BROKER
+                _broker = broker
+    return _broker
+
+
+class BaseBroker:
+    """Base class for task brokers.
+
+    A broker queues messages describing a task run: the `id` of the message, the name of the `task`, its `args` and
+    `kwargs` and the number of `attempts` made so far. Workers fetch messages and acknowledge them once the task has
+    run, or hand them back for a retry or as failed.
+    """
+
+    def enqueue(self, message, eta=None):
+        """Queue a message.
+
+        Args:
+            message (dict): message, serializable as JSON
+            eta (float, optional): UNIX timestamp the message is delivered at the earliest, right away if not given
+        """
+        raise NotImplementedError(
+            "subclasses of BaseBroker must provide an enqueue() method"
+        )
+
+    def fetch(self, timeout):
+        """Claim the next due message, waiting up to the given number of seconds for one.
+
+        Returns:
+            dict: message, or None if no message became due in time
+        """
+        raise NotImplementedError(
+            "subclasses of BaseBroker must provide a fetch() method"
+        )
+
+    def ack(self, message):
+        """Drop a message whose task has run."""
+
+    def retry(self, message, eta, error):
+        """Queue a message again after its task failed, counting the attempt.
+
+        Args:
+            message (dict): message
+            eta (float): UNIX timestamp of the retry
+            error (str): error the attempt failed with
+        """
+        self.enqueue({**message, "attempts": message["attempts"] + 1}, eta)
+
+    def fail(self, message, error):
+        """Give up a message whose task failed too many times or does not exist."""
+        raise NotImplementedError(
+            "subclasses of BaseBroker must provide a fail() method"
+        )
+
+
+class InMemoryBroker(BaseBroker):
+    """Broker keeping messages in the memory of the process, for tests, benchmarks and deployments without workers.
+
+    Unless `TASKS_EAGER` is set, messages are run by `TASKS_IN_PROCESS_WORKERS` daemon threads, started with the first
+    message. Queued messages are lost when the process exits.
+    """
+
+    def __init__(self):
+        self.queue = []
+        self.failed = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.threads = []
+
+    def enqueue(self, message, eta=None):
+        with self.condition:
+            heapq.heappush(
+                self.queue, (eta or time.time(), next(self.counter), message)
+            )
+            self.condition.notify()
+        if not settings.TASKS_EAGER and not self.threads:
+            self.start_workers()
+
+    def fetch(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                if self.queue and self.queue[0][0] <= time.time():
+                    return heapq.heappop(self.queue)[2]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                if self.queue:
+                    remaining = min(remaining, self.queue[0][0] - time.time())
+                self.condition.wait(remaining)
+
+    def fail(self, message, error):
+        self.failed.append({**message, "error": error})
+
+    def start_workers(self):
+        from .worker import Worker
+
+        with self.condition:
+            if self.threads:
+                return
+            for index in range(settings.TASKS_IN_PROCESS_WORKERS):
+                thread = threading.Thread(
+                    target=Worker(self).run,
+                    name=f"tasks-worker-{index}",
+                    daemon=True,
+                )
+                thread.start()
+                self.threads.append(thread)
+
+
+class DatabaseBroker(BaseBroker):
+    """Broker queueing messages in the `QueuedTask` table, polled by workers every `TASKS_POLL_INTERVAL` seconds.
+
+    Messages are claimed with a conditional UPDATE rather than row locks, so workers never block each other. A claimed
+    message is delivered again if it is not acknowledged within `TASKS_VISIBILITY_TIMEOUT` seconds, e.g. because its
+    worker died: tasks run at least once and should be idempotent.
+    """
+
+    def enqueue(self, message, eta=None):
+        QueuedTask.objects.create(
+            task=message["task"],
+            args=message["args"],
+            kwargs=message["kwargs"],
+            attempts=message["attempts"],
+            run_at=timezone.now() if eta is None else to_datetime(eta),
+        )
+
+    def fetch(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            message = self.claim()
+            remaining = deadline - time.monotonic()
+            if message is not None or remaining <= 0:
+                return message
+            time.sleep(min(settings.TASKS_POLL_INTERVAL, remaining))
+
+    def claim(self):
+        """Claim one of the due messages, if any.
+
+        Returns:
+            dict: message, or None if no message is due
+        """
+        now = timezone.now()
+        candidates = (
+            QueuedTask.objects.filter(
+                status__in=[QueuedTask.Status.QUEUED, QueuedTask.Status.RUNNING],
+                run_at__lte=now,
+            )
+            .order_by("run_at")
+            .values_list("pk", "run_at")[:10]
+        )
+        for pk, run_at in candidates:
+            claimed = QueuedTask.objects.filter(pk=pk, run_at=run_at).update(
+                status=QueuedTask.Status.RUNNING,
+                run_at=now + timedelta(seconds=settings.TASKS_VISIBILITY_TIMEOUT),
+                attempts=F("attempts") + 1,
+            )
+            if claimed:
+                queued = QueuedTask.objects.get(pk=pk)
+                return {
+                    "id": queued.pk,
+                    "task": queued.task,
+                    "args": queued.args,
+                    "kwargs": queued.kwargs,
+                    "attempts": queued.attempts - 1,
+                }
+        return None
+
+    def ack(self, message):
+        QueuedTask.objects.filter(pk=message["id"]).delete()
+
+    def retry(self, message, eta, error):
+        QueuedTask.objects.filter(pk=message["id"]).update(
+            status=QueuedTask.Status.QUEUED, run_at=to_datetime(eta), error=error
+        )
+
+    def fail(self, message, error):
+        QueuedTask.objects.filter(pk=message["id"]).update(
+            status=QueuedTask.Status.FAILED, error=error
+        )
+
+
+class RedisBroker(BaseBroker):
+    """Broker queueing messages in Redis, through the connection of the default django-redis cache.
+
+    Due messages are kept in a list workers block on, delayed messages in a sorted set by their due time, from which
+    workers move them to the list once due. Messages are removed from Redis when fetched, so the task of a message
+    whose worker dies is lost.
+    """
+
+    queue_key = "tasks:queue"
+    scheduled_key = "tasks:scheduled"
+    failed_key = "tasks:failed"
+    # number of failed messages kept for inspection
+    failed_limit = 1000
+
+    def get_connection(self):
+        from django_redis import get_redis_connection
+
+        return get_redis_connection("default")
+
+    def enqueue(self, message, eta=None):
+        connection = self.get_connection()
+        data = json.dumps(message)
+        if eta is None or eta <= time.time():
+            connection.lpush(self.queue_key, data)
+        else:
+            connection.zadd(self.scheduled_key, {data: eta})
+
+    def fetch(self, timeout):
+        connection = self.get_connection()
+        for data in connection.zrangebyscore(
+            self.scheduled_key, 0, time.time(), start=0, num=100
+        ):
+            # only the worker removing a message from the set queues it
+            if connection.zrem(self.scheduled_key, data):
+                connection.lpush(self.queue_key, data)
+
+        if timeout <= 0:
+            data = connection.rpop(self.queue_key)
+        else:
+            item = connection.brpop(self.queue_key, timeout=math.ceil(timeout))
+            data = None if item is None else item[1]
+        return None if data is None else json.loads(data)
+
+    def fail(self, message, error):
+        connection = self.get_connection()
+        connection.lpush(self.failed_key, json.dumps({**message, "error": error}))
+        connection.ltrim(self.failed_key, 0, self.failed_limit - 1)
+
+
+def to_datetime(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
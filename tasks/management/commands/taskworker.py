@@ -0,0 +1,80 @@
+import multiprocessing
+import os
+import signal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from tasks.worker import Worker
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs queued background tasks in a pool of worker processes, until interrupted. Tasks are fetched from the "
+        "broker configured with TASKS_BROKER, which has to be shared between processes (the database or Redis one)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of worker processes, each running one task at a time.",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once no task is due instead of waiting for more.",
+        )
+
+    def handle(self, *args, **options):
+        if options["processes"] < 1:
+            raise CommandError("--processes must be positive")
+
+        if options["processes"] == 1:
+            processed = run_worker(options["burst"])
+            self.stdout.write(self.style.SUCCESS(f"Processed {processed} tasks"))
+            return
+
+        # forked workers open their own connections
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        workers = [
+            context.Process(target=run_worker, args=(options["burst"],))
+            for _ in range(options["processes"])
+        ]
+        for worker in workers:
+            worker.start()
+
+        def terminate(signum, frame):
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+
+        signal.signal(signal.SIGTERM, terminate)
+        signal.signal(signal.SIGINT, terminate)
+        for worker in workers:
+            worker.join()
+        self.stdout.write(
+            self.style.SUCCESS(f"Stopped {len(workers)} worker processes")
+        )
+
+
+def run_worker(burst=False):
+    """Run a worker in the current process, stopping it gracefully on SIGTERM and SIGINT.
+
+    Returns:
+        int: number of messages processed
+    """
+    worker = Worker()
+
+    def stop(signum, frame):
+        worker.stop()
+
+    handlers = {
+        signum: signal.signal(signum, stop)
+        for signum in (signal.SIGTERM, signal.SIGINT)
+    }
+    try:
+        return worker.run(burst=burst)
+    finally:
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
@@ -0,0 +1,45 @@
+from django.db import models
+
+
+class QueuedTask(models.Model):
+    """Model representing a task queued with the `DatabaseBroker`.
+
+    Queued tasks are claimed by moving their `run_at` past the visibility timeout, so a task whose worker died is
+    delivered again once the timeout has passed. Tasks are deleted once they have run, failed tasks are kept.
+
+    Attributes:
+        task (CharField): The name of the task, see `tasks.base.task`.
+        args (JSONField): The positional arguments of the task.
+        kwargs (JSONField): The keyword arguments of the task.
+        status (CharField): Whether the task is queued, claimed by a worker or has failed.
+        attempts (PositiveIntegerField): The number of times the task has been claimed.
+        run_at (DateTimeField): The time at which the task is delivered to a worker.
+        created_at (DateTimeField): The time at which the task was queued.
+        error (TextField): The error the last attempt failed with.
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = "queued", "Queued"
+        RUNNING = "running", "Running"
+        FAILED = "failed", "Failed"
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "run_at"], name="queuedtask_status_run_at_idx"
+            ),
+        ]
+
+    task = models.CharField(max_length=255)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.QUEUED
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    run_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"{self.task} ({self.status})"
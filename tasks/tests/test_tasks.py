@@ -0,0 +1,169 @@
+import time
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from tasks.base import get_task, task
+from tasks.brokers import DatabaseBroker, InMemoryBroker
+from tasks.models import QueuedTask
+from tasks.worker import Worker
+
+calls = []
+
+
+@task
+def record(value):
+    calls.append(value)
+
+
+@task(max_attempts=2, retry_backoff=10)
+def fail(value):
+    raise ValueError(value)
+
+
+class TaskTests(TestCase):
+    """Test defining and queueing tasks"""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_delay_runs_after_commit(self):
+        """Test that a delayed task is queued once the transaction commits and run eagerly in tests"""
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            record.delay(1)
+            self.assertEqual(calls, [])
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(calls, [1])
+
+    def test_arguments_serialized_as_json(self):
+        """Test that arguments are passed the way they are queued, as JSON"""
+        message = record.get_message(((1, 2),), {"at": timezone.now()})
+
+        self.assertEqual(message["task"], "tasks.tests.test_tasks.record")
+        self.assertEqual(message["args"], [[1, 2]])
+        self.assertIsInstance(message["kwargs"]["at"], str)
+
+    def test_get_task(self):
+        """Test that tasks are resolved by name"""
+        self.assertIs(get_task("tasks.tests.test_tasks.record"), record)
+        with self.assertRaises(ImportError):
+            get_task("tasks.tests.test_tasks.calls")
+
+    @override_settings(TASKS_RETRY_BACKOFF=5, TASKS_RETRY_BACKOFF_MAX=30)
+    def test_retry_delay(self):
+        """Test that retries back off exponentially up to the maximum"""
+        self.assertEqual(
+            [record.get_retry_delay(attempt) for attempt in range(1, 6)],
+            [5, 10, 20, 30, 30],
+        )
+        self.assertEqual(fail.get_retry_delay(2), 20)
+
+
+class InMemoryBrokerTests(SimpleTestCase):
+    """Test running tasks queued in memory"""
+
+    def setUp(self):
+        calls.clear()
+        self.broker = InMemoryBroker()
+
+    def test_run_due_tasks(self):
+        """Test that due tasks are run in order and delayed ones are kept"""
+        self.broker.enqueue(record.get_message((1,)))
+        self.broker.enqueue(record.get_message((2,)))
+        self.broker.enqueue(record.get_message((3,)), eta=2**32)
+
+        processed = Worker(self.broker).run(burst=True)
+
+        self.assertEqual(processed, 2)
+        self.assertEqual(calls, [1, 2])
+        self.assertEqual(len(self.broker.queue), 1)
+
+    def test_retry_then_fail(self):
+        """Test that a failing task is retried with backoff and failed once its attempts are used up"""
+        self.broker.enqueue(fail.get_message(("boom",)))
+
+        with self.assertLogs("tasks.worker", "WARNING"):
+            Worker(self.broker).run(burst=True)
+
+        eta, _, message = self.broker.queue[0]
+        self.assertAlmostEqual(eta, time.time() + 10, delta=1)
+        self.assertEqual(message["attempts"], 1)
+
+        self.broker.queue[0] = (0, 0, message)
+        with self.assertLogs("tasks.worker", "ERROR"):
+            Worker(self.broker).run(burst=True)
+
+        self.assertEqual(self.broker.queue, [])
+        self.assertEqual(self.broker.failed[0]["error"], "ValueError: boom")
+
+    def test_unknown_task(self):
+        """Test that a message of an unknown task is failed"""
+        self.broker.enqueue({**record.get_message(), "task": "tasks.missing"})
+
+        with self.assertLogs("tasks.worker", "ERROR"):
+            Worker(self.broker).run(burst=True)
+
+        self.assertEqual(self.broker.failed[0]["error"], "Unknown task")
+
+
+class DatabaseBrokerTests(TestCase):
+    """Test running tasks queued in the database"""
+
+    def setUp(self):
+        calls.clear()
+        self.broker = DatabaseBroker()
+
+    def test_run_task(self):
+        """Test that a task is claimed, run and removed"""
+        self.broker.enqueue(record.get_message((1,)))
+
+        Worker(self.broker).run(burst=True)
+
+        self.assertEqual(calls, [1])
+        self.assertFalse(QueuedTask.objects.exists())
+
+    def test_claimed_task_redelivered(self):
+        """Test that a claimed task is delivered again once its visibility timeout has passed"""
+        self.broker.enqueue(record.get_message((1,)))
+        message = self.broker.fetch(0)
+
+        self.assertIsNone(self.broker.fetch(0))
+        QueuedTask.objects.update(run_at=timezone.now() - timedelta(seconds=1))
+
+        redelivered = self.broker.fetch(0)
+        self.assertEqual(redelivered["id"], message["id"])
+        self.assertEqual(redelivered["attempts"], 1)
+
+    def test_retry_then_fail(self):
+        """Test that a failing task is queued again with backoff and kept as failed once its attempts are used up"""
+        self.broker.enqueue(fail.get_message(("boom",)))
+
+        with self.assertLogs("tasks.worker", "WARNING"):
+            Worker(self.broker).run(burst=True)
+
+        queued = QueuedTask.objects.get()
+        self.assertEqual(queued.status, QueuedTask.Status.QUEUED)
+        self.assertGreater(queued.run_at, timezone.now() + timedelta(seconds=5))
+        self.assertEqual(queued.error, "ValueError: boom")
+
+        QueuedTask.objects.update(run_at=timezone.now())
+        with self.assertLogs("tasks.worker", "ERROR"):
+            Worker(self.broker).run(burst=True)
+
+        queued = QueuedTask.objects.get()
+        self.assertEqual(queued.status, QueuedTask.Status.FAILED)
+        self.assertEqual(queued.attempts, 2)
+
+    @override_settings(TASKS_BROKER="tasks.brokers.DatabaseBroker", TASKS_EAGER=False)
+    def test_taskworker_command(self):
+        """Test that the worker command runs queued tasks"""
+        record.enqueue((1,))
+        record.enqueue((2,))
+        out = StringIO()
+
+        call_command("taskworker", processes=1, burst=True, stdout=out)
+
+        self.assertIn("Processed 2 tasks", out.getvalue())
+        self.assertEqual(sorted(calls), [1, 2])
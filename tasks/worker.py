@@ -0,0 +1,108 @@
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections
+from .base import get_task
+from .brokers import get_broker
+
+logger = logging.getLogger(__name__)
+
+# set while due tasks are run eagerly in the current thread, see `run_eagerly`
+_eager = threading.local()
+
+
+class Worker:
+    """Runs tasks fetched from a broker, one at a time.
+
+    A failed task is retried with exponential backoff until its attempts are used up, see `Task.get_retry_delay`, and
+    handed back to the broker as failed afterwards.
+
+    Args:
+        broker (BaseBroker, optional): broker, the configured one if not given
+        poll_interval (float, optional): seconds to wait for a task before checking whether to stop,
+            `TASKS_POLL_INTERVAL` if not given
+    """
+
+    def __init__(self, broker=None, poll_interval=None):
+        self.broker = broker or get_broker()
+        self.poll_interval = poll_interval or settings.TASKS_POLL_INTERVAL
+        self.stopping = False
+
+    def run(self, burst=False):
+        """Run tasks until stopped, or until no task is due with `burst` set.
+
+        Long running workers close database connections that have expired or broken between tasks, like Django does
+        between requests, and outlive errors of the broker. Bursts run in the thread and connection they are called
+        from, e.g. eagerly in a request.
+
+        Returns:
+            int: number of messages processed
+        """
+        processed = 0
+        while not self.stopping:
+            if burst:
+                message = self.broker.fetch(0)
+                if message is None:
+                    break
+                self.process(message)
+                processed += 1
+                continue
+
+            close_old_connections()
+            try:
+                message = self.broker.fetch(self.poll_interval)
+                if message is not None:
+                    self.process(message)
+                    processed += 1
+            except Exception:
+                logger.exception("Could not process tasks of %s", self.broker)
+                time.sleep(self.poll_interval)
+        return processed
+
+    def stop(self):
+        """Stop once the running task has finished."""
+        self.stopping = True
+
+    def process(self, message):
+        """Run the task of a message, then acknowledge, retry or fail the message."""
+        try:
+            task = get_task(message["task"])
+        except ImportError:
+            logger.error("Unknown task %s", message["task"])
+            self.broker.fail(message, "Unknown task")
+            return
+
+        attempt = message["attempts"] + 1
+        try:
+            task(*message["args"], **message["kwargs"])
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if attempt >= task.get_max_attempts():
+                logger.exception("Task %s failed after %d attempts", task.name, attempt)
+                self.broker.fail(message, error)
+            else:
+                delay = task.get_retry_delay(attempt)
+                logger.warning(
+                    "Task %s failed, retrying in %.0f seconds: %s",
+                    task.name,
+                    delay,
+                    error,
+                )
+                self.broker.retry(message, time.time() + delay, error)
+        else:
+            self.broker.ack(message)
+
+
+def run_eagerly(broker):
+    """Run due tasks of a broker in the current thread, unless they are being run already by an outer call.
+
+    Tasks queued by eagerly run tasks are picked up by the outer call.
+    """
+    if getattr(_eager, "running", False):
+        return
+    _eager.running = True
+    try:
+        Worker(broker).run(burst=True)
+    finally:
+        _eager.running = False
@@ -14,6 +14,7 @@ from pathlib import Path
 import os
 import pymysql
 import sys
+import tempfile
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -31,6 +32,9 @@ DEBUG = True
 
 ALLOWED_HOSTS = ["127.0.0.1", ".vercel.app"]
 
+# Tests and benchmarks run against sqlite, the local file system storage and the local memory cache
+LOCAL_BACKENDS = "test" in sys.argv or "benchmark" in sys.argv
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -45,6 +49,7 @@ INSTALLED_APPS = [
     "storages",
     "django_advance_thumbnail",
     "images",
+    "tasks",
 ]
 
 
@@ -62,10 +67,10 @@ REST_FRAMEWORK = {
     ],
 }
 
-if not "test" in sys.argv:
+if not LOCAL_BACKENDS:
     CACHES = {
         "default": {
-            "BACKEND": "django_redis.cache.RedisCache",
+            "BACKEND": "lib.instrumentation.InstrumentedRedisCache",
             "LOCATION": os.environ.get("REDIS_URL"),
             "OPTIONS": {
                 "CLIENT_CLASS": "django_redis.client.DefaultClient",
@@ -75,9 +80,32 @@ if not "test" in sys.argv:
             "KEY_PREFIX": "hexocean",
         }
     }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "lib.instrumentation.InstrumentedLocMemCache",
+        }
+    }
+
+# Fraction of requests timed by `lib.instrumentation.ServerTimingMiddleware`, which logs a summary of each timed request
+# and sends its timings in the `Server-Timing` header when enabled
+SERVER_TIMING_SAMPLE_RATE = float(os.environ.get("SERVER_TIMING_SAMPLE_RATE", "0.1"))
+SERVER_TIMING_HEADER = os.environ.get("SERVER_TIMING_HEADER", "1") == "1"
+
+# Bearer token of the Prometheus metrics endpoint (`metrics/`), which is disabled when not set
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+# Resolved user tiers (user and group permissions) are cached and invalidated on permission changes
+USER_PERMISSIONS_CACHE_TIMEOUT = 60 * 60 * 24
+
+AUTHENTICATION_BACKENDS = [
+    "lib.backends.CachedPermissionsBackend",
+]
 
 
 MIDDLEWARE = [
+    "lib.metrics.MetricsMiddleware",
+    "lib.instrumentation.ServerTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -113,7 +141,7 @@ WSGI_APPLICATION = "vercel_app.wsgi.app"
 # Note: Django modules for using databases are not support in serverless
 # environments like Vercel. You can use a database over HTTP, hosted elsewhere.
 
-if "test" in sys.argv:
+if LOCAL_BACKENDS:
     DATABASES = {
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
@@ -172,13 +200,13 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/4.1/howto/static-files/
 
 
-if "test" in sys.argv:
+if LOCAL_BACKENDS:
     STATIC_URL = "static/"
     STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles_build", "static")
     MEDIA_URL = "/media/"
     PUBLIC_MEDIA_LOCATION = "media"
     MEDIA_ROOT = os.path.join(BASE_DIR, "media")
-    DEFAULT_FILE_STORAGE = "django.core.files.storage.FileSystemStorage"
+    DEFAULT_FILE_STORAGE = "vercel_app.storage_backends.LocalMediaStorage"
 else:
     AWS_ACCESS_KEY_ID = os.environ.get("AWS_ACCESS_KEY_ID")
     AWS_SECRET_ACCESS_KEY = os.environ.get("AWS_SECRET_ACCESS_KEY")
@@ -200,3 +228,98 @@ AWS_THUMBNAIL_ACCESS_POINT_ARN = "arn:aws:s3-object-lambda:eu-central-1:84328433
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Pagination of the images list
+IMAGES_PAGE_SIZE = 100
+IMAGES_MAX_PAGE_SIZE = 1000
+# Number of seconds version stamps of users' images, from which ETags of images lists are derived, are cached for
+IMAGE_LIST_VERSION_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Signed thumbnail URLs are reused until the given fraction of their lifetime (in seconds) has passed
+THUMBNAIL_URL_EXPIRES_IN = 60 * 60
+THUMBNAIL_URL_REUSE_FRACTION = 0.5
+
+# Thumbnail backend: "images.thumbnails.ObjectLambdaThumbnailBackend" or "images.thumbnails.LocalThumbnailBackend"
+THUMBNAIL_BACKEND = "images.thumbnails.ObjectLambdaThumbnailBackend"
+# Number of processes rendering thumbnails with the local backend (None for CPU count, 0 to render inline)
+THUMBNAIL_LOCAL_WORKERS = None
+# Pre-warm thumbnails of uploaded images the uploader can access with a background task once the upload commits,
+# instead of queueing them when first listed
+THUMBNAIL_PREWARM = os.environ.get("THUMBNAIL_PREWARM") == "1"
+# Number of seconds thumbnails stay marked as queued for generation, so they are not queued again meanwhile
+THUMBNAIL_QUEUE_TIMEOUT = 60 * 10
+
+# Direct uploads to the storage: maximum object size in bytes and lifetime of upload policies in seconds
+DIRECT_UPLOAD_MAX_SIZE = 50 * 1024 * 1024
+DIRECT_UPLOAD_EXPIRES_IN = 60 * 15
+
+# Delivery of images via expiring links: "proxy" streams the file through the API, "redirect" responds with a redirect
+# to a presigned storage URL valid for the remaining lifetime of the link, capped at the given number of seconds
+EXPIRING_LINK_DELIVERY = "proxy"
+EXPIRING_LINK_REDIRECT_MAX_EXPIRES_IN = 60 * 60
+# Number of seconds expired and unknown links are remembered in cache
+EXPIRING_LINK_NEGATIVE_CACHE_TIMEOUT = 60
+
+# Number of seconds metadata of original image files is cached for serving them
+IMAGE_FILE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Format of generated expiring links: "alias" links are validated through cache, "signed" links are stateless and
+# validated by their HMAC signature. Signed links are signed with the key of the given id; keep retired keys around
+# until the links they signed have expired.
+EXPIRING_LINK_FORMAT = "alias"
+EXPIRING_LINK_SIGNING_KEYS = {
+    "1": os.environ.get("EXPIRING_LINK_SIGNING_KEY") or f"expiring-link:{SECRET_KEY}",
+}
+EXPIRING_LINK_SIGNING_KEY_ID = "1"
+# Consult the revocation list in cache when validating signed links
+EXPIRING_LINK_REVOCATION_CHECK = False
+# Record signed links in the ExpiringLink audit log
+EXPIRING_LINK_AUDIT = True
+
+# Maximum number of images expiring links can be generated for with a single request
+EXPIRING_LINK_BULK_MAX_IMAGES = 1000
+
+# Maximum number of images uploaded with a single batch upload request
+BATCH_UPLOAD_MAX_FILES = 50
+# Number of threads writing files of batch uploads to the storage concurrently
+BATCH_UPLOAD_WORKERS = 8
+
+# Background tasks: broker queueing them, "tasks.brokers.InMemoryBroker" runs them in threads of the process queueing
+# them, "tasks.brokers.RedisBroker" and "tasks.brokers.DatabaseBroker" in processes of the `taskworker` command.
+# Eager tasks are run in the thread queueing them, in tests and benchmarks. Deployments default to the database broker:
+# serverless instances are frozen or recycled between requests, losing tasks kept in memory, so a `taskworker` has to
+# run alongside them. Only use the in-memory broker for long-running servers that can afford to lose queued tasks.
+TASKS_BROKER = os.environ.get("TASKS_BROKER") or (
+    "tasks.brokers.InMemoryBroker" if LOCAL_BACKENDS else "tasks.brokers.DatabaseBroker"
+)
+TASKS_EAGER = LOCAL_BACKENDS
+TASKS_IN_PROCESS_WORKERS = 2
+# Attempts of a failing task, and delay of its first retry in seconds, doubled for every further retry up to the maximum
+TASKS_MAX_ATTEMPTS = 5
+TASKS_RETRY_BACKOFF = 5
+TASKS_RETRY_BACKOFF_MAX = 60 * 60
+# Seconds workers wait for tasks between checks, and seconds after which tasks claimed from the database are delivered
+# again if their worker has not finished them
+TASKS_POLL_INTERVAL = 1
+TASKS_VISIBILITY_TIMEOUT = 60 * 10
+
+# Serve images listing, expiring link generation and expiring links with async views. Enable when running under an
+# ASGI server (vercel_app.asgi), under WSGI every async view would be run in its own event loop.
+IMAGES_ASYNC_VIEWS = os.environ.get("IMAGES_ASYNC_VIEWS") == "1"
+
+# Upload handlers hashing uploaded files while they stream in, for deduplication of stored images
+FILE_UPLOAD_HANDLERS = [
+    "lib.uploadhandler.HashingMemoryFileUploadHandler",
+    "lib.uploadhandler.HashingTemporaryFileUploadHandler",
+]
+
+# Maximum number of pixels of uploaded images, checked from the image header (Pillow's decompression bomb threshold)
+IMAGE_MAX_PIXELS = 89_478_485
+
+# Resumable uploads: maximum image size in bytes, size of chunks in bytes (S3 requires at least 5 MiB for all chunks
+# but the last one) and lifetime of upload sessions in seconds
+RESUMABLE_UPLOAD_MAX_SIZE = 200 * 1024 * 1024
+RESUMABLE_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+RESUMABLE_UPLOAD_EXPIRES_IN = 60 * 60 * 24
+# Directory keeping chunks of resumable uploads to LocalMediaStorage until the upload is finalized
+MULTIPART_UPLOAD_TEMP_DIR = os.path.join(tempfile.gettempdir(), "imagify-multipart")
@@ -1,5 +1,39 @@
+import os
+import shutil
+import tempfile
+import time
+import uuid
 from django.conf import settings
+from django.core import signing
+from django.core.exceptions import SuspiciousOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.urls import reverse
 from storages.backends.s3boto3 import S3Boto3Storage
+from storages.utils import clean_name
+from lib.instrumentation import InstrumentedStorageMixin, timed
+
+
+class PresignedRequestDenied(SuspiciousOperation):
+    """Raised by `LocalMediaStorage` for presigned requests that are invalid, expired or violate their policy."""
+
+
+class FileRange:
+    """File-like object reading at most `length` bytes of an underlying file from its current position."""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
 
 
 class StaticStorage(S3Boto3Storage):
@@ -7,7 +41,399 @@ class StaticStorage(S3Boto3Storage):
     default_acl = "public-read"
 
 
-class PublicMediaStorage(S3Boto3Storage):
+class PublicMediaStorage(InstrumentedStorageMixin, S3Boto3Storage):
     location = "media"
     default_acl = "public-read"
     file_overwrite = False
+
+    @timed("storage")
+    def get_object_metadata(self, name):
+        """Retrieve metadata of a stored object with a single HEAD request.
+
+        Args:
+            name (str): name of the object
+
+        Returns:
+            dict: `size` in bytes, strong `etag` (quoted) and `last_modified` UNIX timestamp of the object
+        """
+        obj = self.bucket.Object(self._normalize_name(clean_name(name)))
+        return {
+            "size": obj.content_length,
+            "etag": obj.e_tag,
+            "last_modified": int(obj.last_modified.timestamp()),
+        }
+
+    @timed("storage")
+    def open_range(self, name, start, end=None):
+        """Open a byte range of a stored object, reading only the requested bytes from S3.
+
+        Args:
+            name (str): name of the object
+            start (int): offset of the first byte
+            end (int, optional): offset of the last byte, inclusive; defaults to the end of the object
+
+        Returns:
+            file-like: stream of the requested bytes
+        """
+        byte_range = f"bytes={start}-{'' if end is None else end}"
+        obj = self.bucket.Object(self._normalize_name(clean_name(name)))
+        return obj.get(Range=byte_range)["Body"]
+
+    @timed("sign")
+    def generate_presigned_url(self, name, expires_in, content_type=None):
+        """Generate a presigned URL allowing a client to download an object directly from S3.
+
+        Args:
+            name (str): name of the object
+            expires_in (int): lifetime of the URL in seconds
+            content_type (str, optional): content type S3 should respond with
+
+        Returns:
+            str: presigned URL of the object
+        """
+        params = {
+            "Bucket": self.bucket.name,
+            "Key": self._normalize_name(clean_name(name)),
+        }
+        if content_type:
+            params["ResponseContentType"] = content_type
+        return self.bucket.meta.client.generate_presigned_url(
+            ClientMethod="get_object", Params=params, ExpiresIn=expires_in
+        )
+
+    @timed("sign")
+    def generate_presigned_post(self, name, content_type, max_size, expires_in):
+        """Generate a presigned POST policy allowing a client to upload an object directly to S3.
+
+        Args:
+            name (str): name the object will be stored under
+            content_type (str): required content type of the object
+            max_size (int): maximum size of the object in bytes
+            expires_in (int): lifetime of the policy in seconds
+
+        Returns:
+            dict: `url` to POST the form to and `fields` to include in it
+        """
+        fields = {"acl": self.default_acl, "Content-Type": content_type}
+        conditions = [
+            {"acl": self.default_acl},
+            {"Content-Type": content_type},
+            ["content-length-range", 1, max_size],
+        ]
+        return self.bucket.meta.client.generate_presigned_post(
+            Bucket=self.bucket.name,
+            Key=self._normalize_name(clean_name(name)),
+            Fields=fields,
+            Conditions=conditions,
+            ExpiresIn=expires_in,
+        )
+
+    @timed("storage")
+    def create_multipart_upload(self, name, content_type):
+        """Start a multipart upload of an object, uploaded in parts that are assembled once all of them arrive.
+
+        Args:
+            name (str): name the object will be stored under
+            content_type (str): content type of the object
+
+        Returns:
+            str: id of the multipart upload
+        """
+        response = self.bucket.meta.client.create_multipart_upload(
+            Bucket=self.bucket.name,
+            Key=self._normalize_name(clean_name(name)),
+            ContentType=content_type,
+            ACL=self.default_acl,
+        )
+        return response["UploadId"]
+
+    @timed("sign")
+    def generate_presigned_part_url(self, name, upload_id, number, expires_in):
+        """Generate a presigned URL allowing a client to PUT a part of a multipart upload directly to S3.
+
+        Args:
+            name (str): name of the object
+            upload_id (str): id of the multipart upload
+            number (int): number of the part, starting at 1
+            expires_in (int): lifetime of the URL in seconds
+
+        Returns:
+            str: presigned URL of the part
+        """
+        return self.bucket.meta.client.generate_presigned_url(
+            ClientMethod="upload_part",
+            Params={
+                "Bucket": self.bucket.name,
+                "Key": self._normalize_name(clean_name(name)),
+                "UploadId": upload_id,
+                "PartNumber": number,
+            },
+            ExpiresIn=expires_in,
+        )
+
+    @timed("storage")
+    def list_parts(self, name, upload_id):
+        """List parts of a multipart upload received so far.
+
+        Args:
+            name (str): name of the object
+            upload_id (str): id of the multipart upload
+
+        Returns:
+            list: parts ordered by number, as dicts with `number`, `size` and `etag`
+        """
+        paginator = self.bucket.meta.client.get_paginator("list_parts")
+        pages = paginator.paginate(
+            Bucket=self.bucket.name,
+            Key=self._normalize_name(clean_name(name)),
+            UploadId=upload_id,
+        )
+        return [
+            {"number": part["PartNumber"], "size": part["Size"], "etag": part["ETag"]}
+            for page in pages
+            for part in page.get("Parts", [])
+        ]
+
+    @timed("storage")
+    def complete_multipart_upload(self, name, upload_id, parts):
+        """Assemble the object from the parts of a multipart upload.
+
+        Args:
+            name (str): name of the object
+            upload_id (str): id of the multipart upload
+            parts (list): parts to assemble, as returned by `list_parts`
+
+        Returns:
+            str: name of the stored object
+        """
+        self.bucket.meta.client.complete_multipart_upload(
+            Bucket=self.bucket.name,
+            Key=self._normalize_name(clean_name(name)),
+            UploadId=upload_id,
+            MultipartUpload={
+                "Parts": [
+                    {"PartNumber": part["number"], "ETag": part["etag"]}
+                    for part in parts
+                ]
+            },
+        )
+        return name
+
+    @timed("storage")
+    def abort_multipart_upload(self, name, upload_id):
+        """Abort a multipart upload, discarding the parts received so far.
+
+        Args:
+            name (str): name of the object
+            upload_id (str): id of the multipart upload
+        """
+        self.bucket.meta.client.abort_multipart_upload(
+            Bucket=self.bucket.name,
+            Key=self._normalize_name(clean_name(name)),
+            UploadId=upload_id,
+        )
+
+
+class LocalMediaStorage(InstrumentedStorageMixin, FileSystemStorage):
+    """Filesystem storage supporting the same direct upload flow as `PublicMediaStorage`.
+
+    Presigned POST policies and presigned URLs are signed with Django's signing framework and accepted by the
+    `images:direct-upload-local`, `images:presigned-media-local` and `images:upload-part-local` endpoints, which stand
+    in for S3. Parts of multipart uploads are kept as temporary files in `MULTIPART_UPLOAD_TEMP_DIR` until the upload
+    is completed or aborted.
+    """
+
+    presigned_post_salt = "vercel_app.storage_backends.LocalMediaStorage.presigned_post"
+    presigned_url_salt = "vercel_app.storage_backends.LocalMediaStorage.presigned_url"
+    presigned_part_salt = "vercel_app.storage_backends.LocalMediaStorage.presigned_part"
+
+    @timed("storage")
+    def get_object_metadata(self, name):
+        stat = os.stat(self.path(name))
+        return {
+            "size": stat.st_size,
+            "etag": f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+            "last_modified": int(stat.st_mtime),
+        }
+
+    @timed("storage")
+    def open_range(self, name, start, end=None):
+        file = self.open(name)
+        file.seek(start)
+        if end is None:
+            return file
+        return FileRange(file, end - start + 1)
+
+    @timed("sign")
+    def generate_presigned_url(self, name, expires_in, content_type=None):
+        token = signing.dumps(
+            {
+                "name": name,
+                "content_type": content_type,
+                "expires_at": time.time() + expires_in,
+            },
+            salt=self.presigned_url_salt,
+        )
+        return reverse("images:presigned-media-local", kwargs={"token": token})
+
+    def resolve_presigned_url(self, token):
+        """Resolve the token of a presigned URL.
+
+        Args:
+            token (str): token of the presigned URL
+
+        Raises:
+            PresignedRequestDenied: If the token is invalid or expired.
+
+        Returns:
+            tuple: name and content type of the file
+        """
+        try:
+            url = signing.loads(token, salt=self.presigned_url_salt)
+        except signing.BadSignature:
+            raise PresignedRequestDenied("Invalid presigned URL")
+
+        if url["expires_at"] < time.time():
+            raise PresignedRequestDenied("Presigned URL has expired")
+        return url["name"], url["content_type"]
+
+    @timed("sign")
+    def generate_presigned_post(self, name, content_type, max_size, expires_in):
+        policy = {
+            "name": name,
+            "content_type": content_type,
+            "max_size": max_size,
+            "expires_at": time.time() + expires_in,
+        }
+        return {
+            "url": reverse("images:direct-upload-local"),
+            "fields": {
+                "policy": signing.dumps(policy, salt=self.presigned_post_salt),
+            },
+        }
+
+    def accept_presigned_post(self, fields, file):
+        """Store a file uploaded with a presigned POST policy.
+
+        Args:
+            fields (dict): form fields sent along with the file
+            file (UploadedFile): uploaded file
+
+        Raises:
+            PresignedRequestDenied: If the policy is invalid or expired, or the file violates it.
+
+        Returns:
+            str: name of the stored file
+        """
+        try:
+            policy = signing.loads(
+                fields.get("policy", ""), salt=self.presigned_post_salt
+            )
+        except signing.BadSignature:
+            raise PresignedRequestDenied("Invalid upload policy")
+
+        if policy["expires_at"] < time.time():
+            raise PresignedRequestDenied("Upload policy has expired")
+        if not 0 < file.size <= policy["max_size"]:
+            raise PresignedRequestDenied("File size is out of the allowed range")
+        if file.content_type != policy["content_type"]:
+            raise PresignedRequestDenied("File content type does not match the policy")
+        if self.exists(policy["name"]):
+            raise PresignedRequestDenied("File already exists")
+
+        return self.save(policy["name"], file)
+
+    def get_multipart_upload_dir(self, upload_id):
+        if not upload_id.isalnum():
+            raise SuspiciousOperation("Invalid multipart upload id")
+        return os.path.join(settings.MULTIPART_UPLOAD_TEMP_DIR, upload_id)
+
+    @timed("storage")
+    def create_multipart_upload(self, name, content_type):
+        upload_id = uuid.uuid4().hex
+        os.makedirs(self.get_multipart_upload_dir(upload_id))
+        return upload_id
+
+    @timed("sign")
+    def generate_presigned_part_url(self, name, upload_id, number, expires_in):
+        token = signing.dumps(
+            {
+                "upload_id": upload_id,
+                "number": number,
+                "expires_at": time.time() + expires_in,
+            },
+            salt=self.presigned_part_salt,
+        )
+        return reverse("images:upload-part-local", kwargs={"token": token})
+
+    def accept_presigned_part(self, token, stream):
+        """Store a part of a multipart upload uploaded with a presigned URL.
+
+        The part is copied from the stream in chunks, so parts are not limited by the memory of the process.
+
+        Args:
+            token (str): token of the presigned URL
+            stream (file-like): content of the part
+
+        Raises:
+            PresignedRequestDenied: If the token is invalid or expired, or the upload does not exist.
+
+        Returns:
+            str: ETag of the part
+        """
+        try:
+            part = signing.loads(token, salt=self.presigned_part_salt)
+        except signing.BadSignature:
+            raise PresignedRequestDenied("Invalid presigned URL")
+
+        if part["expires_at"] < time.time():
+            raise PresignedRequestDenied("Presigned URL has expired")
+        directory = self.get_multipart_upload_dir(part["upload_id"])
+        if not os.path.isdir(directory):
+            raise PresignedRequestDenied("Multipart upload does not exist")
+
+        path = os.path.join(directory, str(part["number"]))
+        with open(path, "wb") as file:
+            shutil.copyfileobj(stream, file, settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        return self.get_part_etag(path)
+
+    def get_part_etag(self, path):
+        stat = os.stat(path)
+        return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+    @timed("storage")
+    def list_parts(self, name, upload_id):
+        directory = self.get_multipart_upload_dir(upload_id)
+        if not os.path.isdir(directory):
+            # completed or aborted already
+            return []
+
+        parts = []
+        for filename in os.listdir(directory):
+            path = os.path.join(directory, filename)
+            parts.append(
+                {
+                    "number": int(filename),
+                    "size": os.path.getsize(path),
+                    "etag": self.get_part_etag(path),
+                }
+            )
+        return sorted(parts, key=lambda part: part["number"])
+
+    @timed("storage")
+    def complete_multipart_upload(self, name, upload_id, parts):
+        directory = self.get_multipart_upload_dir(upload_id)
+        with tempfile.TemporaryFile(
+            dir=settings.MULTIPART_UPLOAD_TEMP_DIR
+        ) as assembled:
+            for part in parts:
+                with open(os.path.join(directory, str(part["number"])), "rb") as file:
+                    shutil.copyfileobj(file, assembled)
+            assembled.seek(0)
+            name = self.save(name, File(assembled))
+        shutil.rmtree(directory)
+        return name
+
+    @timed("storage")
+    def abort_multipart_upload(self, name, upload_id):
+        shutil.rmtree(self.get_multipart_upload_dir(upload_id), ignore_errors=True)
@@ -5,6 +5,7 @@ from django.conf import settings
 from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework import permissions
+from lib.metrics import metrics_view
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -30,6 +31,7 @@ urlpatterns = [
     path("admin/", admin.site.urls),
     path("images/", include("images.urls")),
     path("api-auth/", include("rest_framework.urls", namespace="rest_framework")),
+    path("metrics/", metrics_view, name="metrics"),
 ]
 
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)